@@ -1,18 +1,72 @@
+import logging
+import os
+
+# installed before the other imports, so the startup report covers every module the app loads
+from src.startup import import_timer, warm_up
+import_timer.install()
+
 import gradio as gr
+from src.clients import get_cohere_client, get_embeddings, get_qa_llm, get_translator
 from src.document_utils import (
-    summarize,
-    question_answer,
-    generate_questions,
+    get_qa_prompt,
+    stream_summarize,
+    stream_question_answer,
+    stream_upload_question_answer,
+    index_upload,
+    stream_generate_questions,
     load_history,
     load_science,
-    paraphrase
+    stream_paraphrase
 )
-from src.wiki_search import cross_lingual_document_search, translate_text
+from src.wiki_search import (
+    cross_lingual_document_search,
+    full_text_search_available,
+    get_embedding_cache,
+    get_full_text_index,
+    get_index,
+    translate_text,
+)
+from src.examples import get_example_artifacts
 from src.theme import CustomTheme
+from src.concurrency import EndpointLimiter
+from src.constants import (
+    ENDPOINT_LIMITS,
+    EXAMPLE_SUMMARY_EXTRACTIVENESS,
+    EXAMPLE_SUMMARY_TEMPERATURE,
+    METRICS_PORT,
+    QUEUE_MAX_SIZE,
+    TRACE_FILE_PATH,
+)
+from src.namespaces import delete_orphaned_namespaces
+from src.questions import NoQuestionsError
+from src.telemetry import configure_tracing, registry, start_metrics_server
+from src.uploads import get_upload
 
 
 max_search_results = 3
 
+# each endpoint gets its own concurrency limit and bounded waiting line, so a burst on one
+# endpoint (e.g. a class asking questions at once) cannot starve the others
+limiters = {
+    name: EndpointLimiter(name, max_concurrency, max_waiting, busy_error=gr.Error)
+    for name, (max_concurrency, max_waiting) in ENDPOINT_LIMITS.items()
+}
+
+
+def endpoint_stats():
+    return {
+        (("endpoint", name), ("stat", stat)): value
+        for name, limiter in limiters.items()
+        for stat, value in limiter.stats().items()
+    }
+
+
+registry.register_gauge(
+    "omowe_endpoint",
+    "Running, waiting and rejected calls and recent wait/execution percentiles (seconds) per endpoint.",
+    endpoint_stats,
+)
+
 
 def reset_chatbot():
     return gr.update(value="")
@@ -22,12 +76,73 @@ def get_user_input(input_question, history):
     return "", history + [[input_question, None]]
 
 
-def study_doc_qa_bot(input_document, history):
-    bot_message = question_answer(input_document, history)
-    history[-1][1] = bot_message
-    return history
+def upload_document(file):
+    # indexing runs in the background, so this returns as soon as the file is hashed
+    if file is None:
+        return None, ""
+    try:
+        upload_key = index_upload(file.name)
+    except ValueError as e:
+        raise gr.Error(str(e))
+    return upload_key, get_upload(upload_key).status()
+
+
+def upload_status(upload_key):
+    upload = get_upload(upload_key)
+    return upload.status() if upload is not None else ""
+
+
+@limiters["qa"].wrap
+def study_doc_qa_bot(input_document, upload_key, history):
+    # questions are about the uploaded file unless a document was pasted
+    if upload_key and not input_document.strip():
+        answers = stream_upload_question_answer(upload_key, history)
+    else:
+        answers = stream_question_answer(input_document, history)
+    # stream the answer into the last chat message as tokens arrive
+    for bot_message in answers:
+        history[-1][1] = bot_message
+        yield history
     
 
+def document_search(user_query, num_results, languages, text_match):
+    # an empty full-text index finds nothing, so fused results would silently be plain vector search
+    if text_match and len(get_full_text_index()) == 0:
+        raise gr.Error(
+            "Full Text Search is not available, as no articles were indexed for it. Untick it to search by meaning."
+        )
+    return cross_lingual_document_search(user_query, num_results, languages, text_match)
+
+
+def generate_practice_questions(document):
+    # raised inside the generator, so it is turned into a message the UI shows instead of a generic "Error"
+    try:
+        yield from stream_generate_questions(document)
+    except NoQuestionsError as e:
+        raise gr.Error(str(e))
+
+
+def summarize_document(document, summary_length, summary_format, extractiveness, temperature):
+    # gradio 3.x cannot inspect the `Optional` annotations of `stream_summarize`, so it gets a plain wrapper
+    yield from stream_summarize(
+        document, summary_length, summary_format, extractiveness, temperature
+    )
+
+
+# clients, indexes and libraries that are only loaded on first use, warmed up right after launch
+WARM_UP_TASKS = {
+    "cohere client": get_cohere_client,
+    "langchain": lambda: (get_embeddings(), get_qa_llm(), get_qa_prompt()),
+    "wiki index": get_index,
+    "embedding cache": get_embedding_cache,
+    "full-text index": lambda: get_full_text_index().query("warm up"),
+    "translator": get_translator,
+    "examples": get_example_artifacts,
+    # Q&A namespaces only live in memory, so those a previous run left in the index are deleted here
+    "orphaned namespaces": delete_orphaned_namespaces,
+}
+
+
 custom_theme = CustomTheme()
 
 
@@ -37,6 +152,8 @@ with gr.Blocks(theme=custom_theme) as demo:
     )
 
     qa_bot_state = gr.State(value=[])
+    # key of the index of the file uploaded for Q&A
+    upload_state = gr.State(value=None)
 
     with gr.Tabs():
         
@@ -49,8 +166,9 @@ with gr.Blocks(theme=custom_theme) as demo:
             )
 
             with gr.Row():
+                # only offered when there is a full-text index, e.g. not on Pinecone before `src.ingest` wrote one
                 text_match = gr.CheckboxGroup(
-                    ["Full Text Search"], label="find exact text in documents", visible=False
+                    ["Full Text Search"], label="find exact text in documents", visible=full_text_search_available()
                 )
 
             with gr.Row():
@@ -162,7 +280,8 @@ with gr.Blocks(theme=custom_theme) as demo:
             with gr.Row():
                 with gr.Column():
                     input_document = gr.Text(label="Copy your document here", lines=2)
-                    input_document_pdf = gr.inputs.File(label="Uplaod file")
+                    input_document_pdf = gr.inputs.File(label="Upload a PDF, DOCX or text file")
+                    upload_status_text = gr.Text(label="Upload status", interactive=False)
 
 
                 with gr.Column():
@@ -216,12 +335,12 @@ with gr.Blocks(theme=custom_theme) as demo:
                             label="Extractiveness",
                             info="Controls how close to the original text the summary is.",
                             visible=False,
-                            value="high",
+                            value=EXAMPLE_SUMMARY_EXTRACTIVENESS,
                         )
                         temperature = gr.Slider(
                             minimum=0,
                             maximum=5.0,
-                            value=0.64,
+                            value=EXAMPLE_SUMMARY_TEMPERATURE,
                             step=0.1,
                             interactive=True,
                             visible=False,
@@ -288,11 +407,18 @@ with gr.Blocks(theme=custom_theme) as demo:
         [input_question, chatbot],
         [input_question, chatbot],
         queue=False,
-    ).then(study_doc_qa_bot, [input_document, chatbot], chatbot)
+    ).then(study_doc_qa_bot, [input_document, upload_state, chatbot], chatbot).then(
+        upload_status, upload_state, upload_status_text, queue=False
+    )
 
     # reset the chatbot Q&A history when input document changes
     input_document.change(fn=reset_chatbot, inputs=[], outputs=chatbot)
 
+    # start indexing an uploaded file in the background, questions can be asked while it runs
+    input_document_pdf.change(
+        upload_document, input_document_pdf, [upload_state, upload_status_text]
+    ).then(reset_chatbot, [], chatbot, queue=False)
+
     # Loading examples on click for Q&A module
     example_1.click(
         load_history,
@@ -324,25 +450,23 @@ with gr.Blocks(theme=custom_theme) as demo:
     )
 
     # generate summary corresponding to document submitted by the user.
+    # generation endpoints stream partial output, which requires the queue
     generate_summary.click(
-        summarize,
+        limiters["summarize"].wrap(summarize_document),
         [summary_input, summary_length, summary_format, extractiveness, temperature],
         [summary_output],
-        queue=False,
     )
 
     generate_questions_btn.click(
-        generate_questions,
+        limiters["summarize"].wrap(generate_practice_questions),
         [summary_input],
         [generate_output],
-        queue=False,
     )
 
     generate_paraphrase.click(
-        paraphrase,
+        limiters["paraphrase"].wrap(stream_paraphrase),
         [paraphrase_input],
         [paraphrase_output],
-        queue=False,
     )
 
     # clear the chatbot Q&A history when this button is clicked by the user
@@ -350,34 +474,43 @@ with gr.Blocks(theme=custom_theme) as demo:
 
     # run search if user submits query
     user_query.submit(
-        cross_lingual_document_search,
+        limiters["search"].wrap(document_search),
         [user_query, num_search_results, lang_choices, text_match],
         [query_match_out_1, query_match_out_2, query_match_out_3, \
             source_res_1,source_res_2,source_res_3],
-        queue=False,
     )
 
 
     # translate results corresponding to 1st search result obtained if user clicks 'Translate'
     translate_btn_1.click(
-        translate_text,
+        limiters["translate"].wrap(translate_text),
         [query_match_out_1],
         [translate_res_1],
-        queue=False,
     )
     translate_btn_2.click(
-        translate_text,
+        limiters["translate"].wrap(translate_text),
         [query_match_out_2],
         [translate_res_2],
-        queue=False,
     )
     translate_btn_3.click(
-        translate_text,
+        limiters["translate"].wrap(translate_text),
         [query_match_out_3],
         [translate_res_3],
-        queue=False,
     )
 
 
 if __name__ == "__main__":
-    demo.launch(debug=True)
+    # per-call queue wait and execution times are logged by the endpoint limiters
+    logging.basicConfig(level=logging.INFO)
+    # stage latencies are scraped from http://<host>:METRICS_PORT/metrics
+    configure_tracing(os.getenv("TRACE_FILE", TRACE_FILE_PATH))
+    start_metrics_server(int(os.getenv("METRICS_PORT", METRICS_PORT)))
+    # enough queue workers for every endpoint's running and waiting calls, so calls blocked
+    # on one endpoint's limit never hold up another endpoint
+    demo.queue(
+        concurrency_count=sum(sum(limits) for limits in ENDPOINT_LIMITS.values()),
+        max_size=QUEUE_MAX_SIZE,
+    ).launch(prevent_thread_lock=True)
+    # the UI is served from here on; clients and indexes load in the background and a startup report is logged
+    warm_up(WARM_UP_TASKS)
+    demo.block_thread()
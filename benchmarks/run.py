@@ -0,0 +1,280 @@
+"""
+Offline benchmarks for the search, Q&A, summarization, question generation, paraphrase and translation pipelines.
+
+The network clients are replaced by the deterministic stand-ins in `benchmarks/stubs.py`, so no API keys are
+needed. Each scenario reports per-call latency percentiles, throughput, CPU time and peak traced allocations, and
+the results are written as JSON so runs from two commits can be compared.
+
+Example:
+    python -m benchmarks.run --output bench_results.json
+    python -m benchmarks.run --output new.json --compare bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+sys.path.append(os.path.abspath("."))
+
+from benchmarks.stubs import (
+    Latency,
+    StubCohereClient,
+    StubEmbeddings,
+    StubIndex,
+    StubLLM,
+    StubTranslator,
+)
+from src import document_utils, translation, wiki_search
+from src.cache import EmbeddingCache
+from src.clients import override_clients
+from src.document_index import DocumentIndexCache
+from src.full_text import FullTextIndex
+from src.outbound import set_rate_limits
+
+SAMPLE_TEXT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "sample_text.txt")
+
+
+def make_document(words: int, variant: int = 0) -> str:
+    """A document of roughly `words` words built from the bundled sample text. `variant` makes it unique."""
+    with open(SAMPLE_TEXT_PATH, "r") as file:
+        sample = file.read().split()
+    repeated = (sample * (words // len(sample) + 1))[:words]
+    return " ".join(repeated) + f" Variant {variant}."
+
+
+def install_stubs(latency: Latency, corpus_size: int) -> None:
+    client = StubCohereClient(latency)
+    wiki_index = StubIndex(latency, corpus_size)
+    full_text_index = FullTextIndex()
+    full_text_index.upsert(zip(wiki_index.index.ids, wiki_index.index.metadata))
+    # the stand-ins answer locally, so the API rate limits would only measure the token buckets
+    set_rate_limits({}, default=(1e9, 10**9))
+    override_clients(
+        cohere=client,
+        embeddings=StubEmbeddings(client),
+        qa_llm=StubLLM(client=client),
+        wiki_index=wiki_index,
+        full_text_index=full_text_index,
+        translator=StubTranslator(latency),
+        # memory-only, so runs never read or write the on-disk embedding cache
+        embedding_cache=EmbeddingCache(wiki_search.MODEL_NAME),
+    )
+
+
+def reset_caches() -> None:
+    wiki_search.search_results.clear()
+    override_clients(embedding_cache=EmbeddingCache(wiki_search.MODEL_NAME))
+    document_utils.document_indexes = DocumentIndexCache()
+    document_utils.summary_cache.clear()
+    document_utils.answer_cache.clear()
+    document_utils.question_banks.clear()
+    translation.translations.clear()
+
+
+def measure(
+    name: str,
+    size: int,
+    call: Callable[[int], object],
+    iterations: int,
+    concurrency: int,
+    setup: Optional[Callable[[], None]] = None,
+) -> Dict:
+    """Runs `call(i)` for i in range(iterations) and returns latency, throughput, CPU and allocation figures."""
+    if setup is not None:
+        setup()
+
+    def timed(i: int) -> float:
+        start = time.perf_counter()
+        call(i)
+        return time.perf_counter() - start
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(timed, range(iterations)))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    # allocations are traced on one extra call, since tracing slows every call down
+    tracemalloc.start()
+    call(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "name": name,
+        "size": size,
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        "mean_ms": 1000 * statistics.mean(latencies),
+        "throughput_per_s": iterations / wall,
+        "cpu_ms_per_call": 1000 * cpu / iterations,
+        "peak_alloc_kb": peak / 1024,
+    }
+
+
+def run_benchmarks(sizes: List[int], iterations: int, concurrency: int) -> List[Dict]:
+    results = []
+    # search results would otherwise start background translations that skew the timings
+    wiki_search.PREFETCH_TRANSLATIONS = False
+    languages = ["Yoruba", "Hausa"]
+
+    results.append(
+        measure(
+            "search/cold",
+            0,
+            lambda i: wiki_search.cross_lingual_document_search(f"query {i}", 3, languages, []),
+            iterations,
+            concurrency,
+            setup=reset_caches,
+        )
+    )
+    results.append(
+        measure(
+            "search/warm",
+            0,
+            lambda i: wiki_search.cross_lingual_document_search("Nigerian civil war", 3, languages, []),
+            iterations,
+            concurrency,
+            setup=lambda: wiki_search.cross_lingual_document_search("Nigerian civil war", 3, languages, []),
+        )
+    )
+    results.append(
+        measure(
+            "search/title",
+            0,
+            lambda i: wiki_search.cross_lingual_document_search(
+                f"article {2 * i + 1}", 3, languages, ["Full Text Search"]
+            ),
+            iterations,
+            concurrency,
+            setup=reset_caches,
+        )
+    )
+    results.append(
+        measure(
+            "search/hybrid",
+            0,
+            lambda i: wiki_search.cross_lingual_document_search(
+                f"topic {i % 97} query {i}", 3, languages, ["Full Text Search"]
+            ),
+            iterations,
+            concurrency,
+            setup=reset_caches,
+        )
+    )
+
+    for size in sizes:
+        document = make_document(size)
+        question = [["What is photosynthesis?", None]]
+        scenarios = [
+            ("qa/cold", lambda i: document_utils.question_answer(make_document(size, i), question), reset_caches),
+            (
+                "qa/warm",
+                lambda i: document_utils.question_answer(document, question),
+                lambda: document_utils.question_answer(document, question),
+            ),
+            (
+                "qa/followup",
+                lambda i: document_utils.question_answer(document, [[f"What is step {i}?", None]]),
+                lambda: document_utils.question_answer(document, question),
+            ),
+            (
+                "summarize",
+                lambda i: document_utils.summarize(make_document(size, i), "long", "bullets"),
+                reset_caches,
+            ),
+            (
+                "generate_questions",
+                lambda i: document_utils.generate_questions(make_document(size, i)),
+                reset_caches,
+            ),
+            ("paraphrase", lambda i: document_utils.paraphrase(document), None),
+            ("translate", lambda i: wiki_search.translate_text(make_document(size, i)), reset_caches),
+        ]
+        for name, call, setup in scenarios:
+            results.append(measure(name, size, call, iterations, concurrency, setup=setup))
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict], baseline: List[Dict]) -> None:
+    """Prints the relative change in p50 latency and CPU time against a previous run."""
+    previous = {(r["name"], r["size"]): r for r in baseline}
+    print(f"{'scenario':<28}{'p50 ms':>12}{'change':>10}{'cpu ms':>12}{'change':>10}")
+    for result in results:
+        old = previous.get((result["name"], result["size"]))
+        label = f"{result['name']}[{result['size']}]"
+        line = f"{label:<28}{result['p50_ms']:>12.2f}"
+        if old is None:
+            print(line + f"{'new':>10}{result['cpu_ms_per_call']:>12.2f}")
+            continue
+        p50_change = 100 * (result["p50_ms"] / max(old["p50_ms"], 1e-9) - 1)
+        cpu_change = 100 * (result["cpu_ms_per_call"] / max(old["cpu_ms_per_call"], 1e-9) - 1)
+        print(line + f"{p50_change:>+9.1f}%{result['cpu_ms_per_call']:>12.2f}{cpu_change:>+9.1f}%")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the offline pipeline benchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 5000], help="Document sizes in words.")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--corpus-size", type=int, default=10_000)
+    parser.add_argument("--embed-latency", type=float, default=Latency.embed)
+    parser.add_argument("--summarize-latency", type=float, default=Latency.summarize)
+    parser.add_argument("--generate-latency", type=float, default=Latency.generate)
+    parser.add_argument("--token-latency", type=float, default=Latency.token)
+    parser.add_argument("--index-latency", type=float, default=Latency.index_query)
+    parser.add_argument("--translate-latency", type=float, default=Latency.translate)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against.")
+    args = parser.parse_args(argv)
+
+    latency = Latency(
+        embed=args.embed_latency,
+        summarize=args.summarize_latency,
+        generate=args.generate_latency,
+        token=args.token_latency,
+        index_query=args.index_latency,
+        translate=args.translate_latency,
+    )
+    install_stubs(latency, args.corpus_size)
+    results = run_benchmarks(args.sizes, args.iterations, args.concurrency)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "latency": vars(latency),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            compare(results, json.load(file)["results"])
+    else:
+        for result in results:
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Deterministic local stand-ins for the Cohere, Pinecone and Google Translate clients.
+
+Every stub sleeps for a configurable simulated latency and returns outputs derived only from its inputs,
+so benchmark runs are repeatable and need no API keys or network access.
+"""
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain.llms.base import LLM
+from pinecone.core.client.model.query_response import QueryResponse
+from pinecone.core.client.model.scored_vector import ScoredVector
+
+from src.vector_index import LocalVectorIndex
+
+EMBEDDING_DIMENSION = 768
+LANGUAGES = ["en", "yo", "ig", "ha"]
+
+
+@dataclass
+class Latency:
+    """Simulated service latencies in seconds."""
+
+    embed: float = 0.05
+    summarize: float = 0.5
+    generate: float = 0.3
+    token: float = 0.005
+    index_query: float = 0.02
+    translate: float = 0.2
+
+
+def stub_embedding(text: str) -> List[float]:
+    """A unit vector seeded by the text's checksum, so equal texts always get equal vectors."""
+    rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    vector = rng.standard_normal(EMBEDDING_DIMENSION).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class _Generations(list):
+    @property
+    def generations(self):
+        return self
+
+
+class StubCohereClient:
+    """Implements the `embed`, `summarize` and `generate` calls of `cohere.Client` used by the app."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    def embed(self, texts: List[str], model: Optional[str] = None, **kwargs):
+        time.sleep(self.latency.embed)
+        return SimpleNamespace(embeddings=[stub_embedding(text) for text in texts])
+
+    def summarize(self, text: str, length: str = "medium", **kwargs):
+        time.sleep(self.latency.summarize)
+        sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+        keep = {"short": 2, "medium": 4, "long": 6}.get(length, 4)
+        return SimpleNamespace(summary=" ".join(sentences[:keep]))
+
+    def _reply(self, prompt: str) -> str:
+        level = re.search(r"Write (\d+) different (\w+) short answer questions", prompt)
+        if level is not None:
+            count, name = int(level.group(1)), level.group(2)
+            return "\n\n".join(
+                f"Question: What is fact {i} of the {name} section?\nAnswer: Fact {i}"
+                for i in range(1, count + 1)
+            )
+        if "Write five different questions" in prompt:
+            return "\n\n".join(
+                f"Question {i}: What is item {i}?\nAnswer: Item {i}" for i in range(1, 6)
+            )
+        # rephrase by reversing the order of the words of the last line of the prompt
+        return " ".join(reversed(prompt.splitlines()[-1].split()))
+
+    def generate(self, prompt: str, stream: bool = False, max_tokens: int = 256, **kwargs):
+        # tokens keep their trailing whitespace so newlines survive streaming
+        tokens = re.findall(r"\S+\s*", self._reply(prompt))[:max_tokens]
+        if stream:
+            return self._stream(tokens)
+        time.sleep(self.latency.generate)
+        return _Generations([SimpleNamespace(text="".join(tokens))])
+
+    def _stream(self, tokens: List[str]):
+        time.sleep(self.latency.generate)
+        for token in tokens:
+            time.sleep(self.latency.token)
+            yield SimpleNamespace(text=token, is_finished=False)
+
+
+class StubEmbeddings:
+    """Implements the LangChain embeddings interface on top of `StubCohereClient`."""
+
+    def __init__(self, client: StubCohereClient):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed(texts=texts).embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embed(texts=[text]).embeddings[0]
+
+
+class StubLLM(LLM):
+    """A LangChain LLM that answers through `StubCohereClient.generate`."""
+
+    client: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, **kwargs) -> str:
+        return self.client.generate(prompt=prompt).generations[0].text
+
+
+class StubIndex:
+    """
+    A `LocalVectorIndex` over a synthetic multilingual corpus, with simulated network latency per query. Like
+    `pinecone.Index`, it answers with a `QueryResponse` of `ScoredVector`s rather than plain dicts.
+    """
+
+    def __init__(self, latency: Latency, corpus_size: int = 10_000):
+        self.latency = latency
+        self.index = LocalVectorIndex()
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((corpus_size, EMBEDDING_DIMENSION)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.index.upsert(
+            (
+                f"{LANGUAGES[i % 4]}-{i}",
+                vectors[i],
+                {
+                    "title": f"Article {i}",
+                    "text": f"Article {i} is about topic {i % 97}. " * 20,
+                    "url": f"https://{LANGUAGES[i % 4]}.wikipedia.org/wiki/Article_{i}",
+                    "lang": LANGUAGES[i % 4],
+                },
+            )
+            for i in range(corpus_size)
+        )
+
+    def query(self, **kwargs):
+        time.sleep(self.latency.index_query)
+        matches = self.index.query(**kwargs)["matches"]
+        return QueryResponse(matches=[ScoredVector(**match) for match in matches], namespace="")
+
+
+class StubTranslator:
+    """Implements `EasyGoogleTranslate.translate` by upper-casing the text."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    def translate(self, text: str, target_language: str = "en") -> str:
+        time.sleep(self.latency.translate)
+        return text.upper()
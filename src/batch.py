@@ -0,0 +1,251 @@
+"""
+Runs summarization, practice question generation and paraphrasing over many documents without the web app.
+
+Documents are read from a directory of .txt/.md files or from a JSONL file with 'id' and 'text' fields. Every
+(document, operation) job runs through the same functions as the app, with a bounded number of jobs in flight and
+a limit on how many start per second. Results are appended to a JSONL file as soon as each job finishes, and
+jobs already in that file are skipped when the command is run again, so an interrupted run resumes where it
+stopped.
+
+Example:
+    python -m src.batch --input course_pack/ --operations summarize questions --output results.jsonl
+    python -m src.batch --input documents.jsonl --operations paraphrase --output paraphrases.jsonl --rate 1
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+sys.path.append(os.path.abspath(".."))
+
+from src import document_utils
+from src.concurrency import RateLimiter
+from src.constants import (
+    BATCH_JOBS_PER_SECOND,
+    BATCH_WORKERS,
+    EXAMPLE_SUMMARY_EXTRACTIVENESS,
+    EXAMPLE_SUMMARY_TEMPERATURE,
+)
+
+logger = logging.getLogger(__name__)
+
+# extensions of the files read from an input directory
+DOCUMENT_EXTENSIONS = (".txt", ".md")
+
+
+def summarize_operation(options: argparse.Namespace) -> Callable[[str], str]:
+    return lambda document: document_utils.summarize(
+        document,
+        options.summary_length,
+        options.summary_format,
+        options.extractiveness,
+        options.temperature,
+    )
+
+
+# operation name -> factory of the function applied to each document, given the command line options
+OPERATIONS: Dict[str, Callable[[argparse.Namespace], Callable[[str], str]]] = {
+    "summarize": summarize_operation,
+    "questions": lambda options: document_utils.generate_questions,
+    "paraphrase": lambda options: document_utils.rephrase,
+}
+
+
+def read_directory(path: str) -> Iterator[Dict]:
+    """
+    Yields the .txt and .md files under `path`, in name order, with their path relative to `path` as id.
+    A file that can't be read is yielded with an 'error' instead of a 'text'.
+    """
+    for directory, subdirectories, files in os.walk(path):
+        subdirectories.sort()
+        for name in sorted(files):
+            if name.endswith(DOCUMENT_EXTENSIONS):
+                file_path = os.path.join(directory, name)
+                document_id = os.path.relpath(file_path, path)
+                try:
+                    with open(file_path, "r", encoding="utf-8") as file:
+                        yield {"id": document_id, "text": file.read()}
+                except (OSError, UnicodeDecodeError) as e:
+                    yield {"id": document_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def _parse_record(line: str, line_number: int) -> Dict:
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"id": str(line_number), "error": f"line {line_number} is not valid JSON: {e}"}
+    if not isinstance(record, dict):
+        return {"id": str(line_number), "error": f"line {line_number} is not a JSON object"}
+    document_id = str(record.get("id", line_number))
+    # 'text' is the documented field, 'document' is accepted as well
+    for field in ("text", "document"):
+        text = record.get(field)
+        if isinstance(text, str) and text.strip():
+            return {"id": document_id, "text": text}
+    return {"id": document_id, "error": f"line {line_number} has no 'text' or 'document' field with text"}
+
+
+def read_jsonl(path: str) -> Iterator[Dict]:
+    """
+    Yields the documents of a JSONL file. Lines without an 'id' are identified by their line number, and lines
+    without any text are yielded with an 'error' instead of a 'text'.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                yield _parse_record(line, line_number)
+
+
+def read_documents(path: str) -> Iterator[Dict]:
+    return read_directory(path) if os.path.isdir(path) else read_jsonl(path)
+
+
+def completed_jobs(output_path: str) -> Set[Tuple[str, str]]:
+    """Returns the `(id, operation)` pairs that already have a result in `output_path`. Failed jobs are retried."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line of a run that was killed while writing it
+                continue
+            if "error" not in result:
+                completed.add((result["id"], result["operation"]))
+    return completed
+
+
+def run_batch(
+    documents: Iterable[Dict],
+    operations: Dict[str, Callable[[str], str]],
+    output_path: str,
+    workers: int = BATCH_WORKERS,
+    jobs_per_second: Optional[float] = BATCH_JOBS_PER_SECOND,
+    report_interval: float = 10.0,
+) -> Dict[str, int]:
+    """
+    Applies every operation to every document and appends the results to `output_path` as they complete.
+        Args:
+            documents (`Iterable[Dict]`):
+                Documents with an 'id' and a 'text' field. Documents with an 'error' field instead, such as records
+                that couldn't be read, fail all their jobs with that error without stopping the run.
+            operations (`Dict[str, Callable[[str], str]]`):
+                The functions applied to each document's text, by operation name.
+            output_path (`str`):
+                JSONL file receiving one `{"id", "operation", "result", "seconds"}` line per finished job, or an
+                `{"id", "operation", "error"}` line per failed job. Jobs already completed in it are skipped.
+            workers (`int`, *optional*, defaults to `BATCH_WORKERS`):
+                The maximum number of jobs running at the same time.
+            jobs_per_second (`float`, *optional*, defaults to `BATCH_JOBS_PER_SECOND`):
+                The maximum number of jobs started per second. If `None`, jobs start as soon as a worker is free.
+            report_interval (`float`, *optional*, defaults to 10.0):
+                Seconds between two progress lines.
+        Returns:
+            counts (`Dict[str, int]`):
+                The number of jobs that 'completed', 'failed' or were 'skipped' as already completed.
+    """
+    completed = completed_jobs(output_path)
+    limiter = RateLimiter(jobs_per_second) if jobs_per_second else None
+    counts = {"completed": 0, "failed": 0, "skipped": 0}
+
+    def jobs() -> Iterator[Tuple[str, str, Dict]]:
+        for document in documents:
+            for operation in operations:
+                if (document["id"], operation) in completed:
+                    counts["skipped"] += 1
+                else:
+                    yield document["id"], operation, document
+
+    def run(operation: str, text: str) -> Tuple[str, float]:
+        if limiter is not None:
+            limiter.acquire()
+        start = time.perf_counter()
+        result = operations[operation](text)
+        return result, time.perf_counter() - start
+
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    partial_line = False
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        with open(output_path, "rb") as file:
+            file.seek(-1, os.SEEK_END)
+            partial_line = file.read(1) != b"\n"
+    start = last_report = time.perf_counter()
+    pending = jobs()
+    in_flight = {}
+    with ThreadPoolExecutor(workers) as pool, open(output_path, "a", encoding="utf-8") as output:
+
+        def write(line: Dict) -> None:
+            output.write(json.dumps(line, ensure_ascii=False) + "\n")
+            output.flush()
+
+        if partial_line:
+            # the line a killed run was writing is ended, so the first new result doesn't run into it
+            output.write("\n")
+
+        while True:
+            # documents are read lazily, keeping at most two jobs per worker between reading and writing
+            while len(in_flight) < 2 * workers:
+                job = next(pending, None)
+                if job is None:
+                    break
+                document_id, operation, document = job
+                if "error" in document:
+                    write({"id": document_id, "operation": operation, "error": document["error"]})
+                    counts["failed"] += 1
+                    continue
+                in_flight[pool.submit(run, operation, document["text"])] = (document_id, operation)
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                document_id, operation = in_flight.pop(future)
+                line = {"id": document_id, "operation": operation}
+                try:
+                    line["result"], line["seconds"] = future.result()
+                    counts["completed"] += 1
+                except Exception as e:
+                    logger.warning("%s of %s failed", operation, document_id, exc_info=True)
+                    line["error"] = f"{type(e).__name__}: {e}"
+                    counts["failed"] += 1
+                write(line)
+            now = time.perf_counter()
+            if now - last_report >= report_interval:
+                print(f"{counts['completed']} jobs completed, {counts['failed']} failed in {now - start:.1f}s")
+                last_report = now
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Summarize, generate questions for or paraphrase many documents.")
+    parser.add_argument("--input", required=True, help="A directory of .txt/.md files or a JSONL file with id and text fields.")
+    parser.add_argument("--output", required=True, help="JSONL file the results are appended to.")
+    parser.add_argument("--operations", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS))
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--rate", type=float, default=BATCH_JOBS_PER_SECOND, help="Jobs started per second, 0 for no limit.")
+    parser.add_argument("--summary-length", choices=["short", "medium", "long"], default="long")
+    parser.add_argument("--summary-format", choices=["paragraph", "bullets"], default="bullets")
+    parser.add_argument("--extractiveness", choices=["low", "medium", "high"], default=EXAMPLE_SUMMARY_EXTRACTIVENESS)
+    parser.add_argument("--temperature", type=float, default=EXAMPLE_SUMMARY_TEMPERATURE)
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    counts = run_batch(
+        read_documents(args.input),
+        {operation: OPERATIONS[operation](args) for operation in args.operations},
+        args.output,
+        workers=args.workers,
+        jobs_per_second=args.rate or None,
+        report_interval=args.report_interval,
+    )
+    print(f"{counts['completed']} jobs completed, {counts['failed']} failed, {counts['skipped']} already done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded least-recently-used cache kept in process memory.
+        Args:
+            maxsize (`int`, *optional*, defaults to 1024):
+                The maximum number of entries kept before the least recently used one is evicted.
+            ttl (`float`, *optional*):
+                Number of seconds after which an entry expires. If `None`, entries never expire.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._expires = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key in self._data and not self._expired(key):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl is not None:
+                self._expires[key] = time.monotonic() + self.ttl
+            while len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                self._expires.pop(evicted, None)
+                self.evictions += 1
+
+    def _expired(self, key: Hashable) -> bool:
+        expires = self._expires.get(key)
+        if expires is None or expires > time.monotonic():
+            return False
+        del self._data[key]
+        del self._expires[key]
+        self.evictions += 1
+        return True
+
+    def pop(self, key: Hashable, default=None):
+        with self._lock:
+            self._expires.pop(key, None)
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data and not self._expired(key)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteVectorStore:
+    """
+    An on-disk store of embedding vectors keyed by (model name, text) that survives restarts.
+    Vectors are stored as packed float32 blobs and the least recently used rows are evicted once `max_entries` is exceeded.
+        Args:
+            path (`str`):
+                Location of the sqlite database file. Parent directories are created if missing.
+            max_entries (`int`, *optional*, defaults to 100000):
+                The maximum number of vectors kept on disk.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text)
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE model = ? AND text = ?", (model, text)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text = ?",
+                (time.time(), model, text),
+            )
+            self._conn.commit()
+        return array("f", row[0]).tolist()
+
+    def set(self, model: str, text: str, vector: List[float]) -> None:
+        blob = array("f", vector).tobytes()
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM embeddings WHERE model = ? AND text = ?", (model, text)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (model, text, vector, last_used) VALUES (?, ?, ?, ?)",
+                (model, text, blob, time.time()),
+            )
+            if exists is None:
+                self._count += 1
+            if self._count > self.max_entries:
+                # evict in one statement rather than row by row
+                self._conn.execute(
+                    """DELETE FROM embeddings WHERE rowid IN (
+                        SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?
+                    )""",
+                    (self._count - self.max_entries,),
+                )
+                self._count = self.max_entries
+            self._conn.commit()
+
+    def delete_other_models(self, model: str) -> int:
+        """Removes every vector that was not produced by `model`. Returns the number of deleted rows."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM embeddings WHERE model != ?", (model,)
+            ).rowcount
+            self._conn.commit()
+            self._count -= deleted
+        return deleted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a query used as a cache key: NFC-normalized, case-folded, with collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).casefold().split())
+
+
+class EmbeddingCache:
+    """
+    A two-tier cache for query embeddings: an in-process LRU backed by an on-disk sqlite store.
+    Entries are keyed by (model name, normalized query), and vectors from any other model are purged when the cache is opened, so changing the embedding model invalidates the stale entries.
+        Args:
+            model_name (`str`):
+                Name of the embedding model whose vectors are cached.
+            memory_size (`int`, *optional*, defaults to 1024):
+                The maximum number of vectors kept in process memory.
+            disk_path (`str`, *optional*):
+                Location of the sqlite database. If `None`, only the in-process tier is used.
+            disk_size (`int`, *optional*, defaults to 100000):
+                The maximum number of vectors kept on disk.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        memory_size: int = 1024,
+        disk_path: Optional[str] = None,
+        disk_size: int = 100_000,
+    ):
+        self.model_name = model_name
+        self.memory = LRUCache(memory_size)
+        self.disk = SQLiteVectorStore(disk_path, disk_size) if disk_path else None
+        self.disk_hits = 0
+        if self.disk is not None:
+            self.disk.delete_other_models(model_name)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = (self.model_name, normalize_query(text))
+        vector = self.memory.get(key)
+        if vector is not None or self.disk is None:
+            return vector
+        vector = self.disk.get(*key)
+        if vector is not None:
+            self.disk_hits += 1
+            self.memory.set(key, vector)
+        return vector
+
+    def set(self, text: str, vector: List[float]) -> None:
+        key = (self.model_name, normalize_query(text))
+        self.memory.set(key, vector)
+        if self.disk is not None:
+            self.disk.set(*key, vector)
+
+    def get_or_compute(self, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """Returns the cached vector for `text`, calling `compute` on the normalized text on a miss."""
+        vector = self.get(text)
+        if vector is None:
+            vector = compute(normalize_query(text))
+            self.set(text, vector)
+        return vector
+
+    def invalidate(self, model_name: Optional[str] = None) -> None:
+        """
+        Drops cached vectors. If `model_name` differs from the current model, the cache switches to it and
+        only vectors from other models are removed; otherwise everything is cleared.
+        """
+        self.memory.clear()
+        if model_name is not None and model_name != self.model_name:
+            self.model_name = model_name
+            if self.disk is not None:
+                self.disk.delete_other_models(model_name)
+        elif self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_size"] = len(self.disk) if self.disk is not None else 0
+        # a miss in memory that was served from disk is still a cache hit overall
+        stats["memory_hits"] = stats["hits"]
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        return stats
+
+
+def content_hash(text: str) -> str:
+    """A stable hex digest of `text`, used to key per-document caches."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _DocumentAnswers:
+    # answered questions of one document: unit-length question embeddings stacked as rows, with their answers
+    def __init__(self):
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self.answers: List[str] = []
+        self.expires: List[float] = []
+
+
+class SemanticAnswerCache:
+    """
+    Caches answers per document and serves them for questions that mean the same as one already answered.
+    A lookup hits when the cosine similarity between the new question's embedding and an answered question's
+    embedding reaches `threshold`, so 'What is photosynthesis?' and 'what's photosynthesis' share one answer.
+        Args:
+            threshold (`float`, *optional*, defaults to 0.95):
+                The minimum cosine similarity for two questions to be considered the same.
+            ttl (`float`, *optional*):
+                Number of seconds after which an answer expires. If `None`, answers never expire.
+            max_documents (`int`, *optional*, defaults to 64):
+                The maximum number of documents with cached answers before the least recently used one is evicted.
+            max_answers (`int`, *optional*, defaults to 256):
+                The maximum number of answers kept per document; the oldest answer is dropped first.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl: Optional[float] = None,
+        max_documents: int = 64,
+        max_answers: int = 256,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_answers = max_answers
+        self.documents = LRUCache(max_documents)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, document_key: str, embedding: List[float]) -> Tuple[Optional[str], float]:
+        """
+        Returns the answer of the most similar question asked about the document, and its similarity.
+        The answer is `None` if no unexpired question reaches the threshold.
+        """
+        entry = self.documents.get(document_key)
+        if entry is None:
+            return None, 0.0
+        query = self._normalize(embedding)
+        with self._lock:
+            if not entry.answers:
+                return None, 0.0
+            similarities = entry.embeddings @ query
+            if self.ttl is not None:
+                similarities[np.asarray(entry.expires) <= time.monotonic()] = -1.0
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            answer = entry.answers[best]
+        if similarity < self.threshold:
+            return None, similarity
+        return answer, similarity
+
+    def set(self, document_key: str, embedding: List[float], answer: str) -> None:
+        entry = self.documents.get(document_key)
+        if entry is None:
+            entry = _DocumentAnswers()
+            self.documents.set(document_key, entry)
+        vector = self._normalize(embedding)[None, :]
+        expires = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            now = time.monotonic()
+            # expired answers are dropped when the document is next written to, and the oldest
+            # answers make room for the new one once the document holds `max_answers`
+            keep = [i for i, expiry in enumerate(entry.expires) if expiry > now]
+            if len(keep) >= self.max_answers:
+                keep = keep[len(keep) - self.max_answers + 1 :]
+            entry.embeddings = np.vstack([entry.embeddings[keep], vector]) if keep else vector
+            entry.answers = [entry.answers[i] for i in keep] + [answer]
+            entry.expires = [entry.expires[i] for i in keep] + [expires]
+
+    def clear(self) -> None:
+        self.documents.clear()
@@ -0,0 +1,217 @@
+import re
+import zlib
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+# a sentence ends at ., !, ? (or the Devanagari danda) followed by whitespace
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?।])\s+")
+
+# the same sentence boundaries, plus blank lines, which end a paragraph (and the sentence in it)
+UNIT_BOUNDARY = re.compile(r"(?P<paragraph>[ \t\r\f\v]*\n\s*\n\s*)|(?<=[.!?।])\s+")
+
+# a word, number or single punctuation mark counts as one token, which tracks subword tokenizers
+# closely enough for chunk budgets on prose
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Splits `text` into sentences, dropping the whitespace between them."""
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+
+
+def _split_long(sentence: str, max_chars: int) -> Iterator[str]:
+    # a single sentence longer than the limit is cut at word boundaries
+    piece = []
+    size = 0
+    for word in sentence.split():
+        if piece and size + len(word) + 1 > max_chars:
+            yield " ".join(piece)
+            piece, size = [], 0
+        piece.append(word)
+        size += len(word) + 1
+    if piece:
+        yield " ".join(piece)
+
+
+def group_sentences(text: str, max_chars: int) -> List[str]:
+    """
+    Packs the sentences of `text` into chunks of at most `max_chars` characters without cutting sentences,
+    unless a single sentence is itself longer than `max_chars`.
+        Args:
+            text (`str`):
+                The text to split.
+            max_chars (`int`):
+                The maximum length of a chunk.
+        Returns:
+            chunks (`List[str]`):
+                The chunks, in order. Joining them with spaces restores the text up to whitespace.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for sentence in split_sentences(text):
+        pieces = [sentence] if len(sentence) <= max_chars else _split_long(sentence, max_chars)
+        for piece in pieces:
+            if current and size + len(piece) + 1 > max_chars:
+                chunks.append(" ".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def sentence_spans(text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the sentences of `text` in a single pass and returns them as character offsets instead of strings.
+        Args:
+            text (`str`):
+                The text to split.
+        Returns:
+            starts (`np.ndarray`), ends (`np.ndarray`), paragraph_ends (`np.ndarray`):
+                `text[starts[i]:ends[i]]` is the i-th sentence without surrounding whitespace, and `paragraph_ends[i]`
+                tells whether it is the last sentence of its paragraph.
+    """
+    starts, ends, paragraph_ends = [], [], []
+    start = len(text) - len(text.lstrip())
+    for match in UNIT_BOUNDARY.finditer(text, start):
+        if match.start() > start:
+            starts.append(start)
+            ends.append(match.start())
+            paragraph_ends.append(match.group("paragraph") is not None)
+        start = match.end()
+    end = len(text.rstrip())
+    if end > start:
+        starts.append(start)
+        ends.append(end)
+        paragraph_ends.append(True)
+    return (
+        np.array(starts, dtype=np.int64),
+        np.array(ends, dtype=np.int64),
+        np.array(paragraph_ends, dtype=bool),
+    )
+
+
+def token_chunks(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """
+    Packs whole sentences of `text` into chunks of at most `max_tokens` tokens, preferring to end a chunk at the end
+    of a paragraph. Consecutive chunks repeat up to `overlap_tokens` tokens of whole sentences, so a passage cut by
+    a chunk boundary is still retrievable from the next chunk. Sentence and token boundaries are found in one pass
+    and chunks are slices of `text`, so the original whitespace and line breaks are kept.
+        Args:
+            text (`str`):
+                The text to split.
+            max_tokens (`int`):
+                The token budget of a chunk. Only a single sentence longer than this is cut, between two tokens.
+            overlap_tokens (`int`, *optional*, defaults to 0):
+                The maximum number of tokens a chunk shares with the previous one.
+        Returns:
+            chunks (`List[str]`):
+                The chunks, in order.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    starts, ends, paragraph_ends = sentence_spans(text)
+    if not len(starts):
+        return []
+
+    # token counts of all sentences at once, from the offsets of every token in the text
+    token_starts = np.fromiter((match.start() for match in TOKEN.finditer(text)), dtype=np.int64)
+    first = np.searchsorted(token_starts, starts)
+    last = np.searchsorted(token_starts, ends)
+
+    # sentences over the budget are cut into pieces of `max_tokens` tokens
+    counts = np.maximum(last - first, 1)
+    pieces = -(-counts // max_tokens)
+    owner = np.repeat(np.arange(len(starts)), pieces)
+    piece = np.arange(len(owner)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    is_last_piece = piece == pieces[owner] - 1
+    first = first[owner] + piece * max_tokens
+    last = np.where(is_last_piece, last[owner], first + max_tokens)
+    token_index = lambda i: token_starts[np.minimum(i, len(token_starts) - 1)]
+    starts = np.where(piece == 0, starts[owner], token_index(first))
+    ends = np.where(is_last_piece, ends[owner], token_index(last))
+    paragraph_ends = paragraph_ends[owner] & is_last_piece
+
+    chunks = []
+    n = len(starts)
+    i = 0
+    previous_end = -1
+    while True:
+        j = max(i, int(np.searchsorted(last, first[i] + max_tokens, side="right")) - 1)
+        if j <= previous_end:
+            # the overlap leaves no room for a new sentence, so start right after the previous chunk
+            i = previous_end + 1
+            continue
+        if j < n - 1 and not paragraph_ends[j]:
+            # end at the last paragraph break instead, as long as that keeps the chunk at least half full
+            candidates = np.arange(max(i, previous_end + 1), j)
+            breaks = candidates[
+                paragraph_ends[candidates] & (last[candidates] - first[i] >= max_tokens // 2)
+            ]
+            if len(breaks):
+                j = int(breaks[-1])
+        chunks.append(text[starts[i] : ends[j]].rstrip())
+        if j == n - 1:
+            return chunks
+        previous_end = j
+        # the next chunk starts with the trailing sentences of this one that fit into the overlap
+        overlap_start = int(np.searchsorted(first, last[j] - overlap_tokens)) if overlap_tokens else j + 1
+        i = min(max(overlap_start, i + 1), j + 1)
+
+
+def _split_long_span(text: str, start: int, end: int, max_chars: int) -> Iterator[Tuple[int, int]]:
+    # a single sentence longer than the limit is cut at word boundaries, as offsets into `text`
+    piece_start = piece_end = start
+    for word in re.finditer(r"\S+", text[start:end]):
+        word_start, word_end = start + word.start(), start + word.end()
+        if piece_end > piece_start and word_end - piece_start > max_chars:
+            yield piece_start, piece_end
+            piece_start = word_start
+        piece_end = word_end
+    if piece_end > piece_start:
+        yield piece_start, piece_end
+
+
+def content_defined_chunks(
+    text: str, min_chars: int, max_chars: int, boundary_divisor: int = 8
+) -> List[str]:
+    """
+    Packs sentences into chunks whose boundaries depend on the sentences themselves rather than on their position.
+    Once a chunk holds `min_chars` characters it is closed after any sentence whose checksum is divisible by
+    `boundary_divisor`, and it is always closed before exceeding `max_chars`. Editing one part of a document
+    therefore only changes the chunks around the edit, and the others keep their cache keys.
+        Args:
+            text (`str`):
+                The text to split.
+            min_chars (`int`):
+                The size after which a chunk may end at a content-defined boundary.
+            max_chars (`int`):
+                The maximum length of a chunk.
+            boundary_divisor (`int`, *optional*, defaults to 8):
+                On average, one sentence in `boundary_divisor` is a boundary.
+        Returns:
+            chunks (`List[str]`):
+                The chunks, in order, as slices of `text`.
+    """
+    chunks = []
+    chunk_start = chunk_end = None
+    starts, ends, _ = sentence_spans(text)
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        spans = [(start, end)] if end - start <= max_chars else _split_long_span(text, start, end, max_chars)
+        for piece_start, piece_end in spans:
+            if chunk_start is not None and piece_end - chunk_start > max_chars:
+                chunks.append(text[chunk_start:chunk_end])
+                chunk_start = None
+            if chunk_start is None:
+                chunk_start = piece_start
+            chunk_end = piece_end
+            piece = text[piece_start:piece_end]
+            if chunk_end - chunk_start >= min_chars and zlib.crc32(piece.encode("utf-8")) % boundary_divisor == 0:
+                chunks.append(text[chunk_start:chunk_end])
+                chunk_start = None
+    if chunk_start is not None:
+        chunks.append(text[chunk_start:chunk_end])
+    return chunks
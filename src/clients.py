@@ -0,0 +1,138 @@
+import asyncio
+import os
+import sys
+import threading
+import weakref
+from typing import TYPE_CHECKING
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(".."))
+
+from src.constants import (
+    COHERE_MAX_RETRIES,
+    COHERE_POOL_SIZE,
+    COHERE_TIMEOUT,
+    MULTILINGUAL_EMBEDDING_MODEL,
+    TEXT_GENERATION_MODEL,
+)
+
+# cohere, langchain and the translator are imported on first use, so importing the app stays fast
+if TYPE_CHECKING:
+    import cohere
+    from easygoogletranslate import EasyGoogleTranslate
+    from langchain.embeddings.cohere import CohereEmbeddings
+    from langchain.llms import Cohere
+
+# load environment variables
+CWD = os.path.dirname(os.path.abspath(__file__))
+dotenv_path = os.path.join(os.path.dirname(CWD), ".env")
+load_dotenv(dotenv_path)
+COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+
+
+_lock = threading.Lock()
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def shared(name, factory):
+    """Creates the object returned by `factory` once per process and hands out the same instance afterwards."""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def _create_cohere_client() -> "cohere.Client":
+    from src.cohere_client import PooledCohereClient
+
+    return PooledCohereClient(
+        COHERE_API_KEY,
+        num_workers=COHERE_POOL_SIZE,
+        max_retries=COHERE_MAX_RETRIES,
+        timeout=COHERE_TIMEOUT,
+        pool_size=COHERE_POOL_SIZE,
+    )
+
+
+def override_clients(**clients) -> None:
+    """
+    Replaces shared clients by name, e.g. `override_clients(cohere=stub, wiki_index=local_index)`.
+    Used by the benchmarks to run the pipelines against local stand-ins instead of the network services.
+    """
+    with _lock:
+        _clients.update(clients)
+
+
+def get_cohere_client() -> "cohere.Client":
+    """
+    Returns the process-wide Cohere client. All calls share its HTTP connection pool,
+    so keep-alive connections and TLS sessions are reused across requests.
+    """
+    return shared("cohere", _create_cohere_client)
+
+
+def get_async_cohere_client() -> "cohere.AsyncClient":
+    """
+    Returns the asyncio Cohere client of the running event loop, creating it on first use.
+    An `AsyncClient` is bound to the loop it was created in, so one is kept per loop.
+    """
+    import cohere
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = cohere.AsyncClient(
+            COHERE_API_KEY,
+            num_workers=COHERE_POOL_SIZE,
+            max_retries=COHERE_MAX_RETRIES,
+            timeout=COHERE_TIMEOUT,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def get_embeddings() -> "CohereEmbeddings":
+    """Returns the shared LangChain embeddings wrapper, backed by the pooled Cohere client."""
+
+    def create():
+        from langchain.embeddings.cohere import CohereEmbeddings
+
+        embeddings = CohereEmbeddings(
+            model=MULTILINGUAL_EMBEDDING_MODEL, cohere_api_key=COHERE_API_KEY
+        )
+        embeddings.client = get_cohere_client()
+        return embeddings
+
+    return shared("embeddings", create)
+
+
+def get_qa_llm() -> "Cohere":
+    """Returns the shared LangChain LLM used for question answering, backed by the pooled Cohere client."""
+
+    def create():
+        from langchain.llms import Cohere
+
+        llm = Cohere(
+            model=TEXT_GENERATION_MODEL, temperature=0, cohere_api_key=COHERE_API_KEY
+        )
+        llm.client = get_cohere_client()
+        return llm
+
+    return shared("qa_llm", create)
+
+
+def get_translator() -> "EasyGoogleTranslate":
+    """Returns the shared Google Translate client."""
+
+    def create():
+        from src.google_translate import CheckedGoogleTranslate
+
+        return CheckedGoogleTranslate()
+
+    return shared("translator", create)
@@ -0,0 +1,69 @@
+import json as jsonlib
+
+import cohere
+import requests
+from cohere.error import CohereAPIError, CohereConnectionError, CohereError
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+
+from src.constants import COHERE_POOL_SIZE
+
+
+class PooledCohereClient(cohere.Client):
+    """
+    A `cohere.Client` that sends every request through one long-lived, pooled `requests.Session`.
+    The SDK's own `_request` opens a new session per call, which throws away keep-alive connections and TLS
+    sessions; this override is otherwise identical to it.
+        Args:
+            pool_size (`int`):
+                The maximum number of pooled connections kept open to the API.
+    """
+
+    def __init__(self, *args, pool_size: int = COHERE_POOL_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        retries = Retry(
+            total=self.max_retries,
+            backoff_factor=0.5,
+            allowed_methods=["POST", "GET"],
+            # 429s are retried by `src.outbound`, which backs off with jitter and honours the rate limits
+            status_forcelist=[code for code in cohere.RETRY_STATUS_CODES if code != 429],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def _request(self, endpoint, json=None, method="POST", stream=False):
+        headers = {
+            "Authorization": "BEARER {}".format(self.api_key),
+            "Content-Type": "application/json",
+            "Request-Source": self.request_source,
+        }
+        url = f"{self.api_url}/{self.api_version}/{endpoint}"
+
+        if stream:
+            return self._session.request(
+                method, url, headers=headers, json=json, **self.request_dict, stream=True
+            )
+
+        try:
+            response = self._session.request(
+                method, url, headers=headers, json=json, timeout=self.timeout, **self.request_dict
+            )
+        except requests.exceptions.ConnectionError as e:
+            raise CohereConnectionError(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            raise CohereError(f"Unexpected exception ({e.__class__.__name__}): {e}") from e
+
+        try:
+            json_response = response.json()
+        except jsonlib.decoder.JSONDecodeError:
+            raise CohereAPIError.from_response(
+                response, message=f"Failed to decode json body: {response.text}"
+            )
+
+        self._check_response(json_response, response.headers, response.status_code)
+        return json_response
@@ -0,0 +1,265 @@
+import functools
+import inspect
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, List, Sequence, Type
+
+logger = logging.getLogger(__name__)
+
+
+class EndpointBusyError(RuntimeError):
+    pass
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class EndpointLimiter:
+    """
+    Bounds how many calls of one endpoint run at the same time and how many may wait for a free slot.
+    A call arriving while `max_waiting` calls are already waiting fails immediately with `busy_error` instead of
+    queueing behind them. Time spent waiting for a slot and time spent executing are recorded separately.
+        Args:
+            name (`str`):
+                Name of the endpoint, used in log lines and error messages.
+            max_concurrency (`int`):
+                The maximum number of calls executing at the same time.
+            max_waiting (`int`):
+                The maximum number of calls waiting for a free slot.
+            busy_error (`Type[Exception]`, *optional*, defaults to `EndpointBusyError`):
+                Exception raised when the endpoint is full, e.g. `gr.Error` to show the message in the UI.
+            history (`int`, *optional*, defaults to 1000):
+                Number of recent calls used to compute the latency percentiles in `stats`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_waiting: int,
+        busy_error: Type[Exception] = EndpointBusyError,
+        history: int = 1000,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.busy_error = busy_error
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+        self.wait_times = deque(maxlen=history)
+        self.execution_times = deque(maxlen=history)
+
+    @contextmanager
+    def slot(self):
+        enqueued = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise self.busy_error(
+                        f"The {self.name} service is busy right now, please try again in a moment."
+                    )
+                self.waiting += 1
+            try:
+                self._slots.acquire()
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+        started = time.perf_counter()
+        with self._lock:
+            self.running += 1
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            self._slots.release()
+            with self._lock:
+                self.running -= 1
+                self.wait_times.append(started - enqueued)
+                self.execution_times.append(finished - started)
+            logger.info(
+                "%s: waited %.3fs, executed %.3fs", self.name, started - enqueued, finished - started
+            )
+
+    def wrap(self, fn: Callable) -> Callable:
+        """Returns `fn` limited by this endpoint. Generator functions hold their slot until they are exhausted."""
+        if inspect.isgeneratorfunction(fn):
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.slot():
+                    yield from fn(*args, **kwargs)
+
+        else:
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.slot():
+                    return fn(*args, **kwargs)
+
+        return wrapper
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            wait_times = list(self.wait_times)
+            execution_times = list(self.execution_times)
+            return {
+                "running": self.running,
+                "waiting": self.waiting,
+                "rejected": self.rejected,
+                "wait_p50": _percentile(wait_times, 0.5),
+                "wait_p95": _percentile(wait_times, 0.95),
+                "execution_p50": _percentile(execution_times, 0.5),
+                "execution_p95": _percentile(execution_times, 0.95),
+            }
+
+
+class RateLimiter:
+    """
+    A token bucket shared by threads: `acquire` blocks until a call may start, so that no more than `rate` calls
+    start per second on average, with bursts of up to `burst` calls after a quiet period.
+        Args:
+            rate (`float`):
+                The number of calls allowed per second.
+            burst (`int`, *optional*, defaults to 1):
+                The number of calls that may start at once.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes one token, waiting for it if the bucket is empty. Returns the number of seconds waited."""
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def reserve(self) -> float:
+        """Takes one token without waiting and returns the number of seconds the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # the token is taken right away, and a caller finding the bucket empty sleeps until it refills;
+            # later callers queue up behind it because the balance goes negative
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent callers into batches, so that an endpoint accepting a list (such as
+    Cohere's embed) is called once per batch instead of once per item. While another batch is being processed, a
+    batch is sent once `max_wait` seconds have passed since its first item arrived, or as soon as it holds
+    `max_batch_size` items; when the batcher is idle, an item is sent right away with whatever else is waiting, so
+    batching only costs latency under load. Identical items in one batch are sent once, and every caller receives
+    the result for its own item.
+        Args:
+            process (`Callable[[List], Sequence]`):
+                Maps a batch of items to their results, in the same order.
+            max_batch_size (`int`):
+                The maximum number of items sent in one call.
+            max_wait (`float`):
+                Seconds the first item of a batch waits for others to join it.
+            max_concurrent_batches (`int`, *optional*, defaults to 4):
+                The maximum number of batches being processed at the same time. Items arriving while all of them
+                are busy keep collecting into the next batch.
+            name (`str`, *optional*, defaults to 'batch'):
+                Name of the batcher's threads, also used in its error messages.
+            max_queue_size (`int`, *optional*, defaults to 0):
+                The maximum number of items waiting for a batch while all batches are busy; `submit` blocks until
+                there is room. 0 means no bound, for callers that are already limited, such as requests of an
+                endpoint with an `EndpointLimiter`.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List], Sequence],
+        max_batch_size: int,
+        max_wait: float,
+        max_concurrent_batches: int = 4,
+        name: str = "batch",
+        max_queue_size: int = 0,
+    ):
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._queue: "queue.Queue[tuple]" = queue.Queue(max_queue_size)
+        self._slots = threading.BoundedSemaphore(max_concurrent_batches)
+        self._pool = ThreadPoolExecutor(max_concurrent_batches, thread_name_prefix=name)
+        self._collector = None
+        self._lock = threading.Lock()
+        self._running = 0
+
+    def submit(self, item: Hashable) -> Future:
+        """Adds `item` to the next batch and returns a future of its result. Blocks while the queue is full."""
+        future = Future()
+        self._queue.put((item, future))
+        if self._collector is None:
+            with self._lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+                    self._collector.start()
+        return future
+
+    def __call__(self, item: Hashable):
+        """Submits `item` and waits for its result."""
+        return self.submit(item).result()
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            with self._lock:
+                idle = self._running == 0
+            deadline = time.monotonic() + (0 if idle else self.max_wait)
+            while len(batch) < self.max_batch_size:
+                try:
+                    remaining = deadline - time.monotonic()
+                    # once the window has passed, only the items already waiting join the batch
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # wait for a free slot here, so items keep piling into the next batch while all slots are busy
+            self._slots.acquire()
+            with self._lock:
+                self._running += 1
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: List[tuple]) -> None:
+        try:
+            unique = list(dict.fromkeys(item for item, _ in batch))
+            try:
+                results = self.process(unique)
+                if len(results) != len(unique):
+                    raise RuntimeError(f"{self.name} returned {len(results)} results for {len(unique)} items")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            by_item = dict(zip(unique, results))
+            for item, future in batch:
+                future.set_result(by_item[item])
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._slots.release()
@@ -15,3 +15,187 @@ TEXT_GENERATION_MODEL = "command-xlarge-nightly"
 
 
 EXAMPLES_FILE_PATH = "src/example.csv"
+
+# precomputed embeddings, summaries, answers and practice questions of the examples, written by `python -m src.examples`,
+# relative to the repository
+EXAMPLES_ARTIFACT_PATH = "data/examples.bin"
+
+# the summary settings the example summaries are precomputed with, which are also the defaults of the app
+EXAMPLE_SUMMARY_EXTRACTIVENESS = "high"
+EXAMPLE_SUMMARY_TEMPERATURE = 0.64
+
+# maximum number of query embeddings kept in process memory
+EMBEDDING_CACHE_MEMORY_SIZE = 2048
+
+# location of the on-disk query embedding cache relative to the repository, which survives restarts
+EMBEDDING_CACHE_PATH = ".cache/query_embeddings.sqlite"
+
+# maximum number of query embeddings kept on disk
+EMBEDDING_CACHE_DISK_SIZE = 200_000
+
+# location of the saved in-process vector index used by the "local" search backend, relative to the repository
+LOCAL_INDEX_PATH = "data/wiki-embed.npz"
+
+# the local index is searched exactly up to this many vectors and with an IVF index above it
+EXACT_SEARCH_MAX_VECTORS = 50_000
+
+# maximum number of per-document chunk indexes kept in process for Q&A
+DOCUMENT_INDEX_CACHE_SIZE = 32
+
+# seconds after their last question the chunk vectors of a Q&A document or upload are deleted, and how often
+# expired namespaces are swept
+QA_NAMESPACE_TTL = 60 * 60
+QA_NAMESPACE_SWEEP_INTERVAL = 60
+
+# where Q&A chunk vectors are kept: "local" (in process) or "pinecone" (one namespace per document in the wiki-embed
+# index, which wiki searches never query); overridden by the QA_INDEX_BACKEND environment variable
+QA_INDEX_BACKEND = "local"
+
+# maximum number of pooled HTTP connections (and concurrent requests) shared by all Cohere calls
+COHERE_POOL_SIZE = 32
+
+# timeout in seconds for a single Cohere request
+COHERE_TIMEOUT = 60
+
+# number of times a failed Cohere request is retried by the client
+COHERE_MAX_RETRIES = 3
+
+# queries embedded within this many seconds of each other are sent in one embed request of at most
+# EMBED_BATCH_MAX_SIZE texts (the embed endpoint's limit), with up to EMBED_BATCH_CONCURRENCY requests in flight
+EMBED_BATCH_WINDOW = 0.005
+EMBED_BATCH_MAX_SIZE = 96
+EMBED_BATCH_CONCURRENCY = 4
+
+# requests per second and burst size allowed for each model or service called by the app; models not listed
+# here get the default limit
+OUTBOUND_RATE_LIMITS = {
+    "multilingual-22-12": (20, 40),
+    "summarize-xlarge": (5, 10),
+    "command-xlarge-nightly": (5, 10),
+    "command": (5, 10),
+    "command-nightly": (5, 10),
+    "google-translate": (10, 20),
+}
+OUTBOUND_DEFAULT_RATE_LIMIT = (5, 10)
+
+# number of times a request rejected with HTTP 429 is retried, and the base and cap of the jittered backoff in seconds
+OUTBOUND_MAX_RETRIES = 4
+OUTBOUND_BACKOFF = 0.5
+OUTBOUND_MAX_BACKOFF = 10.0
+
+# maximum number of search result sets kept in process, keyed by (query, languages, number of results)
+SEARCH_RESULT_CACHE_SIZE = 256
+
+# number of seconds a search result set is reused before the index is queried again
+SEARCH_RESULT_CACHE_TTL = 300
+
+# maximum number of characters sent to the translator in one request
+TRANSLATION_CHUNK_CHARS = 2000
+
+# number of chunks translated in parallel
+TRANSLATION_WORKERS = 8
+
+# maximum number of translated documents kept in process
+TRANSLATION_CACHE_SIZE = 512
+
+# whether search results are translated in the background as soon as a search returns
+PREFETCH_TRANSLATIONS = True
+
+# documents longer than this many characters are summarized chunk by chunk and the chunk summaries summarized again
+SUMMARY_CHUNK_CHARS = 10_000
+
+# cohere's summarize endpoint rejects texts shorter than this
+SUMMARY_MIN_CHARS = 250
+
+# number of chunks summarized concurrently
+SUMMARY_WORKERS = 8
+
+# maximum number of chunk summaries kept in process
+SUMMARY_CACHE_SIZE = 1024
+
+# practice questions are generated "parallel" (one generation per difficulty level, sent concurrently, parsed and
+# de-duplicated into a bank of QUESTION_BANK_SIZE questions) or "single" (one streamed generation of five questions)
+QUESTION_GENERATION_MODE = "parallel"
+QUESTION_BANK_SIZE = 5
+
+# questions asked for per difficulty level, so duplicates and unparsable ones can be dropped, and the sampling
+# temperature of each generation
+QUESTIONS_PER_LEVEL = 3
+QUESTION_TEMPERATURE = 0.9
+
+# number of level generations sent concurrently, and the number of question banks kept in process
+QUESTION_WORKERS = 6
+QUESTION_CACHE_SIZE = 256
+
+# per-endpoint limits of the web app as (maximum concurrent calls, maximum calls waiting for a slot);
+# calls arriving when an endpoint's waiting line is full fail immediately
+ENDPOINT_LIMITS = {
+    "search": (8, 16),
+    "qa": (4, 8),
+    "summarize": (4, 8),
+    "paraphrase": (4, 8),
+    "translate": (6, 12),
+}
+
+# number of jobs the batch command runs at the same time, and how many it starts per second at most
+BATCH_WORKERS = 4
+BATCH_JOBS_PER_SECOND = 2.0
+
+# maximum number of events waiting in the Gradio queue before new ones are rejected
+QUEUE_MAX_SIZE = 64
+
+# port of the Prometheus metrics endpoint served next to the web app
+METRICS_PORT = 9464
+
+# JSONL file every tracing span is appended to, None to disable; overridden by the TRACE_FILE environment variable
+TRACE_FILE_PATH = None
+
+# files uploaded for Q&A: text files and .docx files, which have no real pages, are cut into pages of about
+# UPLOAD_PAGE_CHARS characters; chunks are embedded UPLOAD_EMBED_BATCH_SIZE at a time by UPLOAD_WORKERS background
+# workers, and the indexes of the last UPLOAD_INDEX_CACHE_SIZE files are kept in process
+UPLOAD_PAGE_CHARS = 3000
+UPLOAD_EMBED_BATCH_SIZE = 96
+UPLOAD_WORKERS = 2
+UPLOAD_INDEX_CACHE_SIZE = 8
+
+# seconds a question about an upload waits for its first page to be indexed
+UPLOAD_FIRST_PAGE_TIMEOUT = 30
+
+# token budget of the document chunks retrieved for Q&A, and how many tokens consecutive chunks share
+QA_CHUNK_TOKENS = 256
+QA_CHUNK_OVERLAP_TOKENS = 32
+
+# articles longer than this many tokens are split into several vectors when building the search index
+INGEST_CHUNK_TOKENS = 512
+INGEST_CHUNK_OVERLAP_TOKENS = 64
+
+# number of articles the ingestion script processes and checkpoints together; each article can become several
+# chunks, whose embeddings are requested EMBED_BATCH_MAX_SIZE at a time
+INGEST_BATCH_SIZE = 96
+# seconds between ingestion checkpoints; each one waits for the batches in flight and rewrites the local indexes
+INGEST_CHECKPOINT_INTERVAL = 10 * 60
+
+# article ids and metadata for full-text search, written by the ingestion script, relative to the repository
+FULL_TEXT_INDEX_PATH = "data/wiki-fulltext.npz"
+
+# whether full-text results are fused with vector search results (reciprocal rank fusion) or used on their own
+FULL_TEXT_FUSION = True
+
+# number of candidates each retriever contributes to the fusion, and the rank damping constant
+FUSION_CANDIDATES = 20
+FUSION_RRF_K = 60
+
+# number of vector search candidates re-ranked for diversity (maximal marginal relevance) per search, the weight of
+# relevance against diversity (1 ranks by relevance only), and the cosine similarity above which two results are
+# near-duplicates, e.g. the same article in two languages, of which only the better one is kept
+RERANK_CANDIDATES = 12
+MMR_LAMBDA = 0.7
+DUPLICATE_SIMILARITY = 0.9
+
+# Q&A answers are reused for questions about the same document whose embeddings are at least this cosine-similar
+ANSWER_CACHE_THRESHOLD = 0.95
+
+# seconds a cached answer is served, the number of documents with cached answers, and the answers kept per document
+ANSWER_CACHE_TTL = 24 * 60 * 60
+ANSWER_CACHE_DOCUMENTS = 64
+ANSWER_CACHE_ANSWERS_PER_DOCUMENT = 256
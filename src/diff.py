@@ -0,0 +1,237 @@
+import bisect
+import html
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# words and single punctuation marks; the whitespace between them is kept from the text, not diffed
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# the most edits a single region is searched for before it is reported as replaced as a whole
+MAX_EDIT_COST = 500
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def _tokens(text: str, vocabulary: Dict[str, int]) -> Tuple[List[int], List[int], List[int]]:
+    # tokens are interned as ints so that comparisons inside the diff are cheap
+    ids, starts, ends = [], [], []
+    for match in TOKEN.finditer(text):
+        ids.append(vocabulary.setdefault(match.group(), len(vocabulary)))
+        starts.append(match.start())
+        ends.append(match.end())
+    return ids, starts, ends
+
+
+def _myers(a: Sequence[int], b: Sequence[int], a_lo: int, a_hi: int, b_lo: int, b_hi: int, max_cost: int):
+    """Returns the matching token pairs of a shortest edit script, or None if it needs more than `max_cost` edits."""
+    n, m = a_hi - a_lo, b_hi - b_lo
+    if abs(n - m) > max_cost:
+        # every token one side has in excess is an edit, so the budget can't be met
+        return None
+    max_d = min(n + m, max_cost)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    for d in range(max_d + 1):
+        trace.append(v[offset - d - 1 : offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m, a_lo, b_lo)
+    return None
+
+
+def _backtrack(trace, x: int, y: int, a_lo: int, b_lo: int) -> List[Tuple[int, int]]:
+    matches = []
+    for d in range(len(trace) - 1, -1, -1):
+        # `trace[d]` holds the diagonals -d - 1 .. d + 1 as they were before step d
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + d + 1] < v[k + 1 + d + 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = v[previous_k + d + 1]
+        previous_y = previous_x - previous_k
+        while x > previous_x and y > previous_y:
+            x -= 1
+            y -= 1
+            matches.append((a_lo + x, b_lo + y))
+        x, y = previous_x, previous_y
+    return matches
+
+
+def _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi) -> List[Tuple[int, int]]:
+    # patience diff: tokens occurring exactly once on both sides, kept in the longest run that is in order on both
+    a_counts = Counter(a[a_lo:a_hi])
+    b_counts = Counter(b[b_lo:b_hi])
+    a_positions = {a[i]: i for i in range(a_lo, a_hi) if a_counts[a[i]] == 1}
+    pairs = [
+        (a_positions[b[j]], j)
+        for j in range(b_lo, b_hi)
+        if b_counts[b[j]] == 1 and b[j] in a_positions
+    ]
+    if not pairs:
+        return []
+    tails, tail_indices, previous = [], [], [None] * len(pairs)
+    for index, (i, _) in enumerate(pairs):
+        position = bisect.bisect_left(tails, i)
+        if position:
+            previous[index] = tail_indices[position - 1]
+        if position == len(tails):
+            tails.append(i)
+            tail_indices.append(index)
+        else:
+            tails[position] = i
+            tail_indices[position] = index
+    anchors = []
+    index = tail_indices[-1]
+    while index is not None:
+        anchors.append(pairs[index])
+        index = previous[index]
+    return anchors[::-1]
+
+
+def _matching_pairs(a: List[int], b: List[int], max_cost: int) -> List[Tuple[int, int]]:
+    matches = []
+    regions = [(0, len(a), 0, len(b))]
+    while regions:
+        a_lo, a_hi, b_lo, b_hi = regions.pop()
+        # unchanged runs at either end of a region are matched without any search
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            matches.append((a_hi, b_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        anchors = _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi)
+        if anchors:
+            for i, j in anchors:
+                matches.append((i, j))
+                regions.append((a_lo, i, b_lo, j))
+                a_lo, b_lo = i + 1, j + 1
+            regions.append((a_lo, a_hi, b_lo, b_hi))
+        else:
+            matches.extend(_myers(a, b, a_lo, a_hi, b_lo, b_hi, max_cost) or [])
+    matches.sort()
+    return matches
+
+
+def _opcodes(matches: List[Tuple[int, int]], n: int, m: int) -> List[Opcode]:
+    opcodes = []
+    i = j = 0
+    for match_i, match_j in matches + [(n, m)]:
+        if i < match_i or j < match_j:
+            tag = "replace" if i < match_i and j < match_j else ("delete" if i < match_i else "insert")
+            opcodes.append((tag, i, match_i, j, match_j))
+        if match_i < n:
+            if opcodes and opcodes[-1][0] == "equal":
+                _, i1, _, j1, _ = opcodes.pop()
+                opcodes.append(("equal", i1, match_i + 1, j1, match_j + 1))
+            else:
+                opcodes.append(("equal", match_i, match_i + 1, match_j, match_j + 1))
+        i, j = match_i + 1, match_j + 1
+    return opcodes
+
+
+def _junk(b: List[int], vocabulary: Dict[str, int]) -> set:
+    # like difflib's autojunk, tokens making up more than 1% of a long text are junk; for prose the
+    # punctuation marks and one- or two-letter words ('a', 'of', 'is') are junk at any length
+    counts = Counter(b)
+    threshold = len(b) // 100 + 1 if len(b) >= 200 else None
+    return {
+        token_id
+        for token, token_id in vocabulary.items()
+        if len(token) <= 2 or (threshold is not None and counts[token_id] > threshold)
+    }
+
+
+def _absorb_junk(opcodes: List[Opcode], b: List[int], junk: set, max_run: int = 2) -> List[Opcode]:
+    # a short run of junk left unchanged between two edits, e.g. 'the' in 'the big dog' -> 'the small cat',
+    # is shown as part of one edit instead of splitting it into two highlights
+    merged = []
+    for index, opcode in enumerate(opcodes):
+        tag, i1, i2, j1, j2 = opcode
+        between_edits = 0 < index < len(opcodes) - 1
+        if (
+            tag == "equal"
+            and between_edits
+            and j2 - j1 <= max_run
+            and all(token in junk for token in b[j1:j2])
+        ):
+            tag = "replace"
+        if merged and tag != "equal" and merged[-1][0] != "equal":
+            _, m_i1, _, m_j1, _ = merged.pop()
+            tag = "replace" if (i2 > m_i1 and j2 > m_j1) else tag
+            merged.append((tag, m_i1, i2, m_j1, j2))
+        else:
+            merged.append((tag, i1, i2, j1, j2))
+    return merged
+
+
+def diff_words(
+    a: str, b: str, autojunk: bool = True, max_cost: int = MAX_EDIT_COST
+) -> Tuple[List[Opcode], List[int], List[int]]:
+    """
+    Compares two texts word by word. Unique words shared by both texts anchor the comparison (patience diff), the
+    gaps between anchors are compared with Myers' algorithm, and unchanged runs at the ends of every gap are
+    skipped before any search.
+        Args:
+            a (`str`):
+                The original text.
+            b (`str`):
+                The revised text.
+            autojunk (`bool`, *optional*, defaults to True):
+                Whether short runs of frequent words and punctuation between two edits are merged into one edit.
+            max_cost (`int`, *optional*, defaults to `MAX_EDIT_COST`):
+                Gaps needing more edits than this are reported as replaced as a whole.
+        Returns:
+            opcodes (`List[Tuple[str, int, int, int, int]]`), b_starts (`List[int]`), b_ends (`List[int]`):
+                `difflib`-style opcodes over the tokens of both texts, and the character offsets of the tokens of `b`.
+    """
+    vocabulary = {}
+    a_tokens, _, _ = _tokens(a, vocabulary)
+    b_tokens, b_starts, b_ends = _tokens(b, vocabulary)
+    opcodes = _opcodes(_matching_pairs(a_tokens, b_tokens, max_cost), len(a_tokens), len(b_tokens))
+    if autojunk:
+        opcodes = _absorb_junk(opcodes, b_tokens, _junk(b_tokens, vocabulary))
+    return opcodes, b_starts, b_ends
+
+
+def diff_html(original: str, revised: str, autojunk: bool = True, max_cost: Optional[int] = None) -> str:
+    """
+    Renders `revised` as HTML with the words that are new or changed compared to `original` highlighted.
+    The HTML is built in a single pass over the opcodes, copying unchanged regions as one slice each.
+    """
+    opcodes, starts, ends = diff_words(original, revised, autojunk, max_cost or MAX_EDIT_COST)
+    output = []
+    position = 0
+    for tag, _, _, j1, j2 in opcodes:
+        if j1 == j2:
+            continue
+        if tag == "equal":
+            end = starts[j2] if j2 < len(starts) else len(revised)
+            output.append(html.escape(revised[position:end]))
+            position = end
+        else:
+            output.append(html.escape(revised[position : starts[j1]]))
+            output.append(
+                f"<span style='background-color:lime;'>{html.escape(revised[starts[j1] : ends[j2 - 1]])}</span>"
+            )
+            position = ends[j2 - 1]
+    output.append(html.escape(revised[position:]))
+    return "".join(output)
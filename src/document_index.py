@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+from src.cache import content_hash
+from src.chunking import token_chunks
+from src.constants import QA_CHUNK_OVERLAP_TOKENS, QA_CHUNK_TOKENS
+from src.namespaces import NamespaceRegistry
+from src.telemetry import span
+from src.vector_index import LocalVectorIndex
+
+# prefix of the namespaces of the Q&A document indexes
+DOCUMENT_PREFIX = "document-"
+
+
+def split_document(
+    document: str, max_tokens: int = QA_CHUNK_TOKENS, overlap_tokens: int = QA_CHUNK_OVERLAP_TOKENS
+) -> List[str]:
+    """Splits a document at sentence and paragraph boundaries into overlapping chunks of at most `max_tokens` tokens."""
+    return token_chunks(document, max_tokens, overlap_tokens)
+
+
+class DocumentIndexCache:
+    """
+    Keeps one chunk index per document in its own namespace, keyed by the hash of the document's content, so a
+    document is split and embedded once and follow-up questions only need to embed the question. Namespaces no
+    question has used for `ttl` seconds are deleted, so the vectors of past documents don't pile up.
+        Args:
+            maxsize (`int`, *optional*, defaults to 32):
+                The maximum number of document indexes kept before the least recently used one is deleted.
+            ttl (`float`, *optional*):
+                Seconds after the last question about a document its index is deleted. If `None`, indexes only
+                expire by eviction.
+            open_namespace (`Callable[[str], Any]`, *optional*):
+                Creates the index of a namespace, defaults to an in-process `LocalVectorIndex`.
+            delete_namespaces (`Callable[[List[str]], None]`, *optional*):
+                Deletes the vectors of expired namespaces from an external store, see `NamespaceRegistry`.
+            list_namespaces (`Callable[[], List[str]]`, *optional*):
+                Lists the namespaces of the external store, so orphaned document indexes can be deleted.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 32,
+        ttl: Optional[float] = None,
+        open_namespace: Optional[Callable[[str], Any]] = None,
+        delete_namespaces: Optional[Callable[[List[str]], None]] = None,
+        list_namespaces: Optional[Callable[[], List[str]]] = None,
+    ):
+        self.namespaces = NamespaceRegistry(
+            "documents", ttl, maxsize, open_namespace, delete_namespaces, list_namespaces, prefix=DOCUMENT_PREFIX
+        )
+
+    @contextmanager
+    def use(
+        self, document: str, embed_texts: Callable[[List[str]], List[List[float]]]
+    ) -> Iterator[LocalVectorIndex]:
+        """
+        Holds the chunk index of `document` for the duration of the block, building it with `embed_texts` if it
+        doesn't exist yet. The index is not deleted while it is held.
+            Args:
+                document (`str`):
+                    The document whose chunks are indexed.
+                embed_texts (`Callable`):
+                    A function mapping a list of chunks to their embeddings, such as `CohereEmbeddings.embed_documents`.
+            Returns:
+                index (`LocalVectorIndex`):
+                    An index whose records carry the chunk text in their `text` metadata.
+        """
+        namespace = self.namespaces.acquire(f"{DOCUMENT_PREFIX}{content_hash(document)}", create=lambda index: index)
+        try:
+            with span("document_index.build", payload_size=len(document)) as record, namespace.lock:
+                record["cache_hit"] = namespace.ready
+                if not namespace.ready:
+                    texts = split_document(document)
+                    record["chunks"] = len(texts)
+                    namespace.value.upsert(
+                        (str(i), vector, {"text": text})
+                        for i, (text, vector) in enumerate(zip(texts, embed_texts(texts)))
+                    )
+                    namespace.ready = True
+            yield namespace.value
+        finally:
+            self.namespaces.release(namespace)
+
+    def get_or_build(
+        self, document: str, embed_texts: Callable[[List[str]], List[List[float]]]
+    ) -> LocalVectorIndex:
+        """Returns the chunk index of `document`, building it with `embed_texts` if needed, see `use`."""
+        with self.use(document, embed_texts) as index:
+            return index
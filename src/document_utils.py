@@ -1,22 +1,59 @@
+import logging
 import os
 import sys
 
-import pandas as pd
-from typing import List
-import pinecone
-import difflib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv 
 
-import cohere
-from langchain.embeddings.cohere import CohereEmbeddings
-from langchain.llms import Cohere
-from langchain.prompts import PromptTemplate
-from langchain.vectorstores import Pinecone, Qdrant
-from langchain.chains.question_answering import load_qa_chain
-
 sys.path.append(os.path.abspath('..'))
 
-from src.constants import SUMMARIZATION_MODEL, EXAMPLES_FILE_PATH
+from src.constants import (
+    ANSWER_CACHE_ANSWERS_PER_DOCUMENT,
+    ANSWER_CACHE_DOCUMENTS,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    SUMMARIZATION_MODEL,
+    DOCUMENT_INDEX_CACHE_SIZE,
+    MULTILINGUAL_EMBEDDING_MODEL,
+    QA_NAMESPACE_TTL,
+    QUESTION_BANK_SIZE,
+    QUESTION_CACHE_SIZE,
+    QUESTION_GENERATION_MODE,
+    QUESTION_TEMPERATURE,
+    QUESTION_WORKERS,
+    QUESTIONS_PER_LEVEL,
+    SUMMARY_CACHE_SIZE,
+    SUMMARY_CHUNK_CHARS,
+    SUMMARY_MIN_CHARS,
+    SUMMARY_WORKERS,
+    TEXT_GENERATION_MODEL,
+    UPLOAD_FIRST_PAGE_TIMEOUT,
+)
+from src.cache import LRUCache, SemanticAnswerCache, content_hash
+from src.chunking import content_defined_chunks
+from src.clients import get_async_cohere_client, get_cohere_client, get_embeddings, get_qa_llm
+from src.diff import diff_html
+from src.document_index import DocumentIndexCache
+from src.examples import get_example_artifacts
+from src.namespaces import namespace_store
+from src.outbound import acall, call, request_key
+from src.questions import (
+    QUESTION_LEVELS,
+    NoQuestionsError,
+    format_questions,
+    parse_questions,
+    question_bank,
+    questions_prompt,
+)
+from src.telemetry import span
+from src.uploads import get_upload, start_upload, upload_indexes
+
+# langchain is imported on first use, so importing the app stays fast
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+    from langchain.prompts import PromptTemplate
 
 
 
@@ -29,6 +66,41 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENV = os.getenv("PINECONE_ENV")
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 
+logger = logging.getLogger(__name__)
+
+QA_PROMPT_TEMPLATE = """Text: {context}
+    Question: {question}
+    Answer the question based on the text provided. If the text doesn't contain the answer, reply that the answer is not available."""
+
+
+@lru_cache(maxsize=None)
+def get_qa_prompt() -> "PromptTemplate":
+    from langchain.prompts import PromptTemplate
+
+    return PromptTemplate(template=QA_PROMPT_TEMPLATE, input_variables=["context", "question"])
+
+
+# chunk indexes of the documents currently being discussed, one namespace per content hash
+document_indexes = DocumentIndexCache(DOCUMENT_INDEX_CACHE_SIZE, QA_NAMESPACE_TTL, *namespace_store())
+
+# answers to questions already asked about a document, matched by question embedding
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl=ANSWER_CACHE_TTL,
+    max_documents=ANSWER_CACHE_DOCUMENTS,
+    max_answers=ANSWER_CACHE_ANSWERS_PER_DOCUMENT,
+)
+
+# number of streamed tokens between two refreshes of the paraphrase diff
+PARAPHRASE_DIFF_EVERY = 8
+
+# summaries of the chunks of long documents, and the workers that produce them
+summary_cache = LRUCache(SUMMARY_CACHE_SIZE)
+summary_pool = ThreadPoolExecutor(SUMMARY_WORKERS, thread_name_prefix="summarize")
+
+# validated practice question banks, keyed by content hash, and the workers generating their levels concurrently
+question_banks = LRUCache(QUESTION_CACHE_SIZE)
+question_pool = ThreadPoolExecutor(QUESTION_WORKERS, thread_name_prefix="questions")
 
 
 def replace_text(text):
@@ -37,15 +109,65 @@ def replace_text(text):
     return text
 
 
+def _cohere_summarize(
+    text: str,
+    summary_length: str,
+    summary_format: str,
+    extractiveness: str,
+    temperature: float,
+) -> str:
+    parameters = dict(
+        length=summary_length,
+        format=summary_format,
+        model=SUMMARIZATION_MODEL,
+        extractiveness=extractiveness,
+        temperature=temperature,
+    )
+    with span("co.summarize", payload_size=len(text), length=summary_length, format=summary_format):
+        # identical documents summarized at the same moment, e.g. a class loading one example, share one request
+        summary_response = call(
+            SUMMARIZATION_MODEL,
+            get_cohere_client().summarize,
+            text=text,
+            key=request_key("summarize", text, parameters),
+            **parameters,
+        )
+    return summary_response.summary
+
+
+def _summarize_chunk(chunk: str, extractiveness: str, temperature: float) -> str:
+    # chunk summaries are cached by content, so editing one section only re-summarizes that section
+    with span("summarize_chunk", payload_size=len(chunk)) as record:
+        key = (content_hash(chunk), extractiveness, temperature)
+        summary = summary_cache.get(key)
+        record["cache_hit"] = summary is not None
+        if summary is None:
+            summary = _cohere_summarize(chunk, "medium", "paragraph", extractiveness, temperature)
+            summary_cache.set(key, summary)
+    return summary
+
+
+def split_for_summary(document: str) -> List[str]:
+    """Splits a long document into chunks that each fit into one summarize call."""
+    chunks = content_defined_chunks(document, SUMMARY_CHUNK_CHARS // 2, SUMMARY_CHUNK_CHARS)
+    if len(chunks) > 1 and len(chunks[-1]) < SUMMARY_MIN_CHARS:
+        tail = chunks.pop()
+        chunks[-1] += " " + tail
+    return chunks
+
+
 def summarize(
     document: str,
     summary_length: str,
     summary_format: str,
     extractiveness: str = "high",
     temperature: float = 0.6,
+    hierarchical: Optional[bool] = None,
 ) -> str:
     """
     Generates a summary for the input document using Cohere's summarize API.
+    Long documents are summarized map-reduce style: the chunks are summarized concurrently and the
+    concatenated chunk summaries are summarized again until they fit into a single call.
         Args:
             document (`str`):
                 The document given by the user for which summary must be generated.
@@ -57,21 +179,175 @@ def summarize(
                 A value such as 'low', 'medium', 'high' indicating how close the generated summary should be in meaning to the original text.
             temperature (`str`):
                 This controls the randomness of the output. Lower values tend to generate more “predictable” output, while higher values tend to generate more “creative” output.
+            hierarchical (`bool`, *optional*):
+                Whether to summarize chunk by chunk. Defaults to doing so for documents longer than `SUMMARY_CHUNK_CHARS`.
         Returns:
             generated_summary (`str`):
                 The generated summary from the summarization model.
     """
+    for generated_summary in stream_summarize(
+        document, summary_length, summary_format, extractiveness, temperature, hierarchical
+    ):
+        pass
+    return generated_summary
 
-    summary_response = cohere.Client(COHERE_API_KEY).summarize(
-        text=document,
+
+def stream_summarize(
+    document: str,
+    summary_length: str,
+    summary_format: str,
+    extractiveness: str = "high",
+    temperature: float = 0.6,
+    hierarchical: Optional[bool] = None,
+) -> Iterator[str]:
+    """
+    Streaming variant of `summarize`. For long documents it yields the chunk summaries as they complete,
+    followed by the final summary; short documents yield the summary once.
+    """
+    precomputed = _precomputed(
+        "summary",
+        lambda artifacts: artifacts.summary(
+            document, summary_length, summary_format, extractiveness, temperature
+        ),
+    )
+    if precomputed is not None:
+        yield precomputed
+        return
+    if hierarchical is None:
+        hierarchical = len(document) > SUMMARY_CHUNK_CHARS
+    if not hierarchical:
+        yield _cohere_summarize(
+            document, summary_length, summary_format, extractiveness, temperature
+        )
+        return
+
+    chunk_summaries = []
+    for chunk_summary in summary_pool.map(
+        lambda chunk: _summarize_chunk(chunk, extractiveness, temperature),
+        split_for_summary(document),
+    ):
+        chunk_summaries.append(chunk_summary)
+        yield "\n\n".join(chunk_summaries)
+    combined = "\n\n".join(chunk_summaries)
+    # only keep reducing while the summaries actually shrink the text
+    yield from stream_summarize(
+        combined,
+        summary_length,
+        summary_format,
+        extractiveness,
+        temperature,
+        hierarchical=SUMMARY_CHUNK_CHARS < len(combined) < len(document),
+    )
+
+
+async def asummarize(
+    document: str,
+    summary_length: str,
+    summary_format: str,
+    extractiveness: str = "high",
+    temperature: float = 0.6,
+) -> str:
+    """Asyncio variant of `summarize`, using the shared async Cohere client."""
+    parameters = dict(
         length=summary_length,
         format=summary_format,
         model=SUMMARIZATION_MODEL,
         extractiveness=extractiveness,
         temperature=temperature,
     )
-    generated_summary = summary_response.summary
-    return generated_summary
+    summary_response = await acall(
+        SUMMARIZATION_MODEL,
+        get_async_cohere_client().summarize,
+        text=document,
+        key=request_key("summarize", document, parameters),
+        **parameters,
+    )
+    return summary_response.summary
+
+
+def _precomputed(kind: str, lookup: Callable):
+    # results precomputed for the bundled examples are served without calling any API
+    with span("example_artifacts", kind=kind) as record:
+        result = lookup(get_example_artifacts())
+        record["cache_hit"] = result is not None
+    return result
+
+
+def _embed_question(question: str) -> List[float]:
+    embedding = _precomputed("question_embedding", lambda artifacts: artifacts.question_embedding(question))
+    if embedding is not None:
+        return embedding
+    with span("embed_query", payload_size=len(question)):
+        return call(
+            MULTILINGUAL_EMBEDDING_MODEL,
+            get_embeddings().embed_query,
+            question,
+            key=request_key("embed_query", question),
+        )
+
+
+def _embed_chunks(chunks: List[str]) -> List[List[float]]:
+    embeddings = _precomputed("chunk_embeddings", lambda artifacts: artifacts.chunk_embeddings(chunks))
+    if embeddings is not None:
+        return embeddings
+    return call(
+        MULTILINGUAL_EMBEDDING_MODEL,
+        get_embeddings().embed_documents,
+        chunks,
+        key=request_key("embed_documents", chunks),
+    )
+
+
+def _cached_answer(
+    input_document: str, document_key: str, question: str, question_embedding: List[float]
+) -> Optional[str]:
+    answer = _precomputed("answer", lambda artifacts: artifacts.answer(input_document, question))
+    if answer is not None:
+        return answer
+    with span("answer_cache") as record:
+        answer, record["similarity"] = answer_cache.get(document_key, question_embedding)
+        record["cache_hit"] = answer is not None
+    return answer
+
+
+def _relevant_context(input_document: str, question_embedding: List[float]) -> List["Document"]:
+    from langchain.docstore.document import Document
+
+    # the document is only chunked and embedded the first time a question is asked about it
+    with document_indexes.use(input_document, _embed_chunks) as context_index, span("document_index.query"):
+        query_results = context_index.query(question_embedding, top_k=4, include_metadata=True)
+    return [
+        Document(page_content=match["metadata"]["text"])
+        for match in query_results["matches"]
+    ]
+
+
+def _clean_answer(answer: str) -> str:
+    answer = answer.replace("\n", "").replace("Answer:", "")
+    return replace_text(answer)
+
+
+def _open_stream(**kwargs):
+    # the SDK returns a stream without checking its HTTP status, so an error such as a 429 is raised here instead of
+    # while iterating, where `call` could no longer retry it
+    stream = get_cohere_client().generate(stream=True, **kwargs)
+    response = getattr(stream, "response", None)
+    if response is not None and not response.ok:
+        response.close()
+        response.raise_for_status()
+    return stream
+
+
+def _stream_generate(prompt: str, **kwargs) -> Iterator[str]:
+    """Calls Cohere's generate endpoint in streaming mode and yields the text generated so far after every token."""
+    with span("co.generate", payload_size=len(prompt), model=kwargs.get("model")) as record:
+        # a stream can't be shared between callers, so only the rate limit and 429 retries apply
+        response = call(kwargs.get("model", TEXT_GENERATION_MODEL), _open_stream, prompt=prompt, **kwargs)
+        tokens = []
+        for token in response:
+            tokens.append(token.text)
+            record["tokens"] = len(tokens)
+            yield "".join(tokens)
 
 
 def question_answer(input_document: str, history: List) -> str:
@@ -86,50 +362,114 @@ def question_answer(input_document: str, history: List) -> str:
             answer (`str`):
                 The generated answer corresponding to the input question and document received from the user.
     """
-    pinecone.init(
-    api_key=PINECONE_API_KEY,  # find at app.pinecone.io
-    environment=PINECONE_ENV  # next to api key in console
-    )
-    context = input_document
     # The last element of the `history` list contains the most recent question asked by the user whose answer needs to be generated.
     question = history[-1][0]
-    word_list = context.split()
-
-    texts =  [" ".join(word_list[k : k + 200]) for k in range(0, len(word_list), 200)]
-
-    # print(texts)
-
-    embeddings = CohereEmbeddings(
-        model="multilingual-22-12", cohere_api_key=COHERE_API_KEY
-    )
-
-    context_index = Pinecone.from_texts(texts, embeddings, index_name="wiki-embed")
-
-    prompt_template = """Text: {context}
-    Question: {question}
-    Answer the question based on the text provided. If the text doesn't contain the answer, reply that the answer is not available."""
-
-    PROMPT = PromptTemplate(
-        template=prompt_template, input_variables=["context", "question"]
-    )
+    document_key = content_hash(input_document)
+    question_embedding = _embed_question(question)
+    # a question that means the same as one already answered about this document skips retrieval and generation
+    answer = _cached_answer(input_document, document_key, question, question_embedding)
+    if answer is not None:
+        return answer
+    relevant_context = _relevant_context(input_document, question_embedding)
 
     # Generate the answer given the context
-    chain = load_qa_chain(
-        Cohere(
-            model="command-xlarge-nightly", temperature=0, cohere_api_key=COHERE_API_KEY
-        ),
-        chain_type="stuff",
-        prompt=PROMPT,
-    )
-    relevant_context = context_index.similarity_search(question)
-    answer = chain.run(input_documents=relevant_context, question=question)
-    answer = answer.replace("\n", "").replace("Answer:", "")
-    answer = replace_text(answer) 
+    from langchain.chains.question_answering import load_qa_chain
+
+    chain = load_qa_chain(get_qa_llm(), chain_type="stuff", prompt=get_qa_prompt())
+    with span("chain.run", payload_size=sum(len(doc.page_content) for doc in relevant_context)):
+        answer = call(
+            TEXT_GENERATION_MODEL,
+            chain.run,
+            input_documents=relevant_context,
+            question=question,
+            key=request_key("qa", question, [doc.page_content for doc in relevant_context]),
+        )
+    answer = _clean_answer(answer)
+    answer_cache.set(document_key, question_embedding, answer)
     return answer
 
-def generate_questions(input_document: str) -> str:
-    co = cohere.Client(COHERE_API_KEY)
-    prompt = f"""Write five different questions to test the understanding of the following text. The questions should be short answer, with one or two words each, and vary in difficulty from easy to hard. Provide the correct answer for each question after the question. 
+
+def stream_question_answer(input_document: str, history: List) -> Iterator[str]:
+    """Streaming variant of `question_answer` that yields the answer generated so far as tokens arrive."""
+    question = history[-1][0]
+    document_key = content_hash(input_document)
+    question_embedding = _embed_question(question)
+    answer = _cached_answer(input_document, document_key, question, question_embedding)
+    if answer is not None:
+        yield answer
+        return
+    relevant_context = _relevant_context(input_document, question_embedding)
+    answer = ""
+    for answer in _stream_answer(question, [doc.page_content for doc in relevant_context]):
+        yield answer
+    # only answers that were streamed to the end are cached
+    if answer:
+        answer_cache.set(document_key, question_embedding, answer)
+
+
+def _stream_answer(question: str, contexts: List[str]) -> Iterator[str]:
+    # the same prompt the "stuff" chain builds, sent to the streaming generate endpoint
+    prompt = QA_PROMPT_TEMPLATE.format(context="\n\n".join(contexts), question=question)
+    for answer in _stream_generate(
+        prompt, model=TEXT_GENERATION_MODEL, temperature=0, max_tokens=256
+    ):
+        yield _clean_answer(answer)
+
+
+def index_upload(path: str) -> str:
+    """Starts indexing an uploaded .pdf, .docx, .txt or .md file for Q&A in the background and returns its key."""
+    return start_upload(path, _embed_chunks)
+
+
+def stream_upload_question_answer(upload_key: str, history: List) -> Iterator[str]:
+    """
+    Streaming Q&A over a file uploaded with `index_upload`. While the file is still being indexed, the question is
+    answered from the pages indexed so far and the answer says how many that is.
+        Args:
+            upload_key (`str`):
+                The key returned by `index_upload`.
+            history (`List`):
+                The chat history, whose last message holds the question.
+        Returns:
+            answers (`Iterator[str]`):
+                The answer generated so far, as tokens arrive.
+    """
+    question = history[-1][0]
+    upload = get_upload(upload_key)
+    if upload is None:
+        yield "The uploaded file is no longer available, please upload it again."
+        return
+    question_embedding = _embed_question(question)
+    # answers are only cached once the whole file is indexed, since later pages may change them
+    complete = upload.done and upload.error is None
+    if complete:
+        with span("answer_cache") as record:
+            answer, record["similarity"] = answer_cache.get(upload_key, question_embedding)
+            record["cache_hit"] = answer is not None
+        if answer is not None:
+            yield answer
+            return
+    if not upload.wait_for_chunks(UPLOAD_FIRST_PAGE_TIMEOUT):
+        yield upload.status() if upload.done else f"{upload.name} is still being read, please ask again in a moment."
+        return
+
+    complete, pages_indexed = upload.done and upload.error is None, upload.pages_indexed
+    # holding the namespace keeps it from expiring while it is queried
+    with upload_indexes.hold(upload_key), span("upload_index.query", payload_size=len(upload)):
+        query_results = upload.index.query(question_embedding, top_k=4, include_metadata=True)
+    note = ""
+    if not complete:
+        pages = f"{pages_indexed} page" + ("s" if pages_indexed != 1 else "")
+        note = f"\n\n(Answered from the first {pages} of {upload.name}, the rest is still being indexed.)"
+    answer = ""
+    for answer in _stream_answer(question, [match["metadata"]["text"] for match in query_results["matches"]]):
+        yield answer + note
+    if answer and complete:
+        answer_cache.set(upload_key, question_embedding, answer)
+
+
+def _questions_prompt(input_document: str) -> str:
+    return f"""Write five different questions to test the understanding of the following text. The questions should be short answer, with one or two words each, and vary in difficulty from easy to hard. Provide the correct answer for each question after the question. 
     Now write your own questions for this text:
 
     Text: {input_document}
@@ -150,78 +490,153 @@ def generate_questions(input_document: str) -> str:
     Answer: (answer_5)"""
 
 
-    response = co.generate(model='command', prompt=prompt, temperature=2, max_tokens=1000, )
+def _generate_level_questions(input_document: str, level: str) -> List[Tuple[str, str]]:
+    prompt = questions_prompt(input_document, level, QUESTIONS_PER_LEVEL)
+    with span("co.generate", payload_size=len(prompt), model="command", level=level) as record:
+        response = call(
+            "command",
+            get_cohere_client().generate,
+            model="command",
+            prompt=prompt,
+            temperature=QUESTION_TEMPERATURE,
+            max_tokens=80 * QUESTIONS_PER_LEVEL,
+            key=request_key("generate", prompt, QUESTION_TEMPERATURE),
+        )
+        pairs = parse_questions(response.generations[0].text)
+        record["questions"] = len(pairs)
+    return pairs
+
+
+def stream_question_bank(input_document: str) -> Iterator[str]:
+    """
+    Generates a bank of `QUESTION_BANK_SIZE` practice questions from one generation per difficulty level, sent
+    concurrently, and yields the bank built from the levels finished so far. Similar questions are dropped, and
+    complete banks are cached by document. Raises `NoQuestionsError` if no level produced a usable question.
+    """
+    document_key = content_hash(input_document)
+    bank = question_banks.get(document_key)
+    if bank is not None:
+        yield format_questions(bank)
+        return
+    futures = {
+        question_pool.submit(_generate_level_questions, input_document, level): level for level in QUESTION_LEVELS
+    }
+    candidates, bank = {}, []
+    for future in as_completed(futures):
+        try:
+            candidates[futures[future]] = future.result()
+        except Exception:
+            # the other levels make up for a failed one
+            logger.warning("%s questions could not be generated", futures[future], exc_info=True)
+            candidates[futures[future]] = []
+        bank = question_bank(candidates, QUESTION_BANK_SIZE)
+        if bank:
+            yield format_questions(bank)
+    if not bank:
+        raise NoQuestionsError(
+            "No practice questions could be generated for this document. Please try again, or use a longer text."
+        )
+    if len(bank) == QUESTION_BANK_SIZE:
+        question_banks.set(document_key, bank)
 
-    answer = response.generations[0].text.strip()
-    print(answer)
-    questions = answer.split('\n\n')
-    print(questions)
-    result = {}
-    for question in questions:
-        q, a = question.split('\n')
-        result[q] = a.split(': ')[1]
 
-    return answer
+def generate_questions(input_document: str) -> str:
+    """Generates practice questions about the input document, each followed by its answer."""
+    questions = _precomputed("questions", lambda artifacts: artifacts.questions(input_document))
+    if questions is not None:
+        return questions
+    if QUESTION_GENERATION_MODE == "parallel":
+        questions = ""
+        for questions in stream_question_bank(input_document):
+            pass
+        return questions
+    co = get_cohere_client()
+    prompt = _questions_prompt(input_document)
+
+    with span("co.generate", payload_size=len(prompt), model='command'):
+        response = call(
+            'command',
+            co.generate,
+            model='command',
+            prompt=prompt,
+            temperature=2,
+            max_tokens=1000,
+            key=request_key("generate", prompt),
+        )
+
+    return response.generations[0].text.strip()
+
+
+def stream_generate_questions(input_document: str) -> Iterator[str]:
+    """Streaming variant of `generate_questions` that yields the questions generated so far."""
+    questions = _precomputed("questions", lambda artifacts: artifacts.questions(input_document))
+    if questions is not None:
+        yield questions
+        return
+    if QUESTION_GENERATION_MODE == "parallel":
+        yield from stream_question_bank(input_document)
+        return
+    for answer in _stream_generate(
+        _questions_prompt(input_document), model='command', temperature=2, max_tokens=1000
+    ):
+        yield answer.strip()
 
 
 def load_science():
-    examples_df = pd.read_csv(EXAMPLES_FILE_PATH)
-    science_doc = examples_df["doc"].iloc[0]
-    sample_question = examples_df["question"].iloc[0]
+    # the examples are read once per process, together with their precomputed results
+    science_doc, sample_question = get_example_artifacts().document(0)
     return science_doc, sample_question
 
 
 def load_history():
-    examples_df = pd.read_csv(EXAMPLES_FILE_PATH)
-    history_doc = examples_df["doc"].iloc[1]
-    sample_question = examples_df["question"].iloc[1]
+    history_doc, sample_question = get_example_artifacts().document(1)
     return history_doc, sample_question
 
-def show_diff_html(seqm):
-    """Unify operations between two compared strings
-    seqm is a difflib.SequenceMatcher instance whose a & b are strings
-    """
-    output = []
-    for opcode, a0, a1, b0, b1 in seqm.get_opcodes():
-        if opcode == 'equal':
-            output.append(seqm.b[b0:b1])
-        elif opcode == 'insert':
-            output.append(f"<span style='background-color:lime;'>{seqm.b[b0:b1]}</span>")
-        # elif opcode == 'delete':
-        #     output.append(f"<span style='background-color:red;'>{seqm.a[a0:a1]}</span>")
-        elif opcode == 'replace':
-            # output.append(f"<span style='background-color:red;'>{seqm.a[a0:a1]}</span>")
-            output.append(f"<span style='background-color:lime;'>{seqm.b[b0:b1]}</span>")
-        else:
-            if opcode == 'delete' or opcode == 'replace':
-                continue
-            raise RuntimeError("unexpected opcode")
-    return ''.join(output)
+def _diff_html(text: str, rephrased_text: str) -> str:
+    # words of the paraphrase that are new or changed are highlighted
+    with span("diff", payload_size=len(text) + len(rephrased_text)):
+        return diff_html(text, rephrased_text)
 
 # define a function to paraphrase text using Cohere API
-def paraphrase(text):
-    # create a cohere client with your API key
-    client = cohere.Client(api_key=COHERE_API_KEY)
+def rephrase(text: str) -> str:
+    """Returns `text` rephrased by the model, as plain text."""
+    # use the shared cohere client so the connection is reused across calls
+    client = get_cohere_client()
 
     # set the prompt for paraphrasing
     prompt = f"Rephrase this sentence in a different way: {text}"
 
     # generate a response using the multilingual-22-12 model
-    response = client.generate(
-        model="command-nightly",
-        prompt=prompt,
-        max_tokens=1000,
-
-    )
+    with span("co.generate", payload_size=len(prompt), model="command-nightly"):
+        response = call(
+            "command-nightly",
+            client.generate,
+            model="command-nightly",
+            prompt=prompt,
+            max_tokens=1000,
+            key=request_key("generate", prompt),
+        )
     # get the generated text
-    rephrased_text = response[0].text
-    print(rephrased_text)
+    return response[0].text
+
 
-    # compare the original and rephrased texts using difflib
-    sm = difflib.SequenceMatcher(None, text, rephrased_text)
-    html = show_diff_html(sm)
+def paraphrase(text):
+    # compare the original and rephrased texts word by word
+    return _diff_html(text, rephrase(text))
 
-    return html
+def stream_paraphrase(text) -> Iterator[str]:
+    """
+    Streaming variant of `paraphrase`. The highlighted diff is refreshed every `PARAPHRASE_DIFF_EVERY`
+    tokens rather than on every token, since each refresh diffs the whole text generated so far.
+    """
+    prompt = f"Rephrase this sentence in a different way: {text}"
+    rephrased_text = ""
+    for count, rephrased_text in enumerate(
+        _stream_generate(prompt, model="command-nightly", max_tokens=1000), start=1
+    ):
+        if count % PARAPHRASE_DIFF_EVERY == 0:
+            yield _diff_html(text, rephrased_text)
+    yield _diff_html(text, rephrased_text)
 
 if __name__ == "__main__":
     with open('sample_text.txt', 'r') as file:
@@ -0,0 +1,276 @@
+"""
+Precomputes the results the app shows for its bundled example documents, so the demo path costs no API calls.
+
+For every example in `EXAMPLES_FILE_PATH` the build step stores the chunk embeddings of its Q&A index, the
+embedding of and answer to its sample question, a summary for each length and format, and a set of practice
+questions. Everything is written to one file: a JSON header with the texts, followed by the embeddings as a
+float32 matrix that the app memory-maps at startup.
+
+Example:
+    python -m src.examples
+    python -m src.examples --output data/examples.bin
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(".."))
+
+from src.cache import content_hash, normalize_query
+from src.clients import override_clients, shared
+from src.constants import (
+    EXAMPLE_SUMMARY_EXTRACTIVENESS,
+    EXAMPLE_SUMMARY_TEMPERATURE,
+    EXAMPLES_ARTIFACT_PATH,
+    EXAMPLES_FILE_PATH,
+    QA_CHUNK_OVERLAP_TOKENS,
+    QA_CHUNK_TOKENS,
+)
+
+# load environment variables
+CWD = os.path.dirname(os.path.abspath(__file__))
+dotenv_path = os.path.join(os.path.dirname(CWD), ".env")
+load_dotenv(dotenv_path)
+
+# resolved against the repository, so the app finds the examples whatever its working directory
+EXAMPLES_FILE = os.path.join(os.path.dirname(CWD), EXAMPLES_FILE_PATH)
+EXAMPLES_ARTIFACT = os.path.join(os.path.dirname(CWD), EXAMPLES_ARTIFACT_PATH)
+
+MAGIC = b"OMOWEEX1"
+
+# the embedding matrix starts at a multiple of this many bytes
+ALIGNMENT = 64
+
+SUMMARY_LENGTHS = ["short", "medium", "long"]
+SUMMARY_FORMATS = ["paragraph", "bullets"]
+
+
+def _key(document: str) -> str:
+    # the text box may add or drop the blank lines around an example
+    return content_hash(document.strip())
+
+
+def read_examples(path: str = EXAMPLES_FILE) -> List[Tuple[str, str]]:
+    """Reads the `(document, sample question)` pairs of the examples CSV file."""
+    import pandas as pd
+
+    examples_df = pd.read_csv(path)
+    return list(zip(examples_df["doc"], examples_df["question"]))
+
+
+class ExampleArtifacts:
+    """
+    The precomputed results for the example documents, looked up by document content. Every lookup returns None
+    when nothing was precomputed for its arguments, and the caller falls back to computing the result live.
+        Args:
+            examples (`List[Dict]`):
+                One entry per example, with its 'document' and 'question' and, once built, its results.
+            vectors (`np.ndarray`, *optional*):
+                The embeddings the entries refer to by row, usually a read-only memory map.
+            settings (`Dict`, *optional*):
+                The chunking and summary settings the results were computed with.
+    """
+
+    def __init__(self, examples: List[Dict], vectors: Optional[np.ndarray] = None, settings: Optional[Dict] = None):
+        self.examples = examples
+        self.vectors = vectors
+        self.settings = settings or {}
+        self._by_document = {_key(example["document"]): example for example in examples}
+        self._chunk_rows = {
+            chunk_hash: row
+            for example in examples
+            for chunk_hash, row in example.get("chunks", [])
+        }
+
+    @classmethod
+    def from_csv(cls, path: str = EXAMPLES_FILE) -> "ExampleArtifacts":
+        """The examples without any precomputed results, as read from the CSV file."""
+        return cls([{"document": document, "question": question} for document, question in read_examples(path)])
+
+    @classmethod
+    def load(cls, path: str) -> "ExampleArtifacts":
+        """Reads the header of an artifact file written with `save` and memory-maps its embeddings."""
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an example artifact file")
+            (header_size,) = struct.unpack("<Q", file.read(8))
+            header = json.loads(file.read(header_size).decode("utf-8"))
+        vectors = None
+        if header["rows"]:
+            vectors = np.memmap(
+                path,
+                dtype="<f4",
+                mode="r",
+                offset=header["offset"],
+                shape=(header["rows"], header["dimension"]),
+            )
+        return cls(header["examples"], vectors, header["settings"])
+
+    def save(self, path: str) -> None:
+        vectors = np.zeros((0, 0), dtype="<f4") if self.vectors is None else np.asarray(self.vectors, dtype="<f4")
+        header = {
+            "rows": vectors.shape[0],
+            "dimension": vectors.shape[1] if vectors.ndim == 2 else 0,
+            "settings": self.settings,
+            "examples": self.examples,
+            "offset": 0,
+        }
+        # the offset is part of the header, so its size is settled by serializing it with a placeholder wide enough
+        header["offset"] = 10 ** 12
+        prefix = len(MAGIC) + 8 + len(json.dumps(header).encode("utf-8"))
+        header["offset"] = -(-prefix // ALIGNMENT) * ALIGNMENT
+        encoded = json.dumps(header).encode("utf-8")
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(MAGIC)
+            file.write(struct.pack("<Q", len(encoded)))
+            file.write(encoded)
+            file.write(b"\0" * (header["offset"] - file.tell()))
+            file.write(vectors.tobytes())
+        os.replace(temporary, path)
+
+    def document(self, index: int) -> Tuple[str, str]:
+        """Returns the document and sample question of the `index`-th example."""
+        example = self.examples[index]
+        return example["document"], example["question"]
+
+    def summary(
+        self, document: str, summary_length: str, summary_format: str, extractiveness: str, temperature: float
+    ) -> Optional[str]:
+        example = self._by_document.get(_key(document))
+        if (
+            example is None
+            or extractiveness != self.settings.get("extractiveness")
+            or abs(float(temperature) - self.settings.get("temperature", float("nan"))) > 1e-6
+        ):
+            return None
+        return example.get("summaries", {}).get(f"{summary_length}/{summary_format}")
+
+    def questions(self, document: str) -> Optional[str]:
+        example = self._by_document.get(_key(document))
+        return None if example is None else example.get("questions")
+
+    def answer(self, document: str, question: str) -> Optional[str]:
+        example = self._by_document.get(_key(document))
+        if example is None or normalize_query(question) != normalize_query(example["question"]):
+            return None
+        return example.get("answer")
+
+    def question_embedding(self, question: str) -> Optional[List[float]]:
+        # returned as a list like a live embedding, since it ends up in request keys, the answer cache and queries
+        normalized = normalize_query(question)
+        for example in self.examples:
+            if example.get("question_row") is not None and normalize_query(example["question"]) == normalized:
+                return self.vectors[example["question_row"]].tolist()
+        return None
+
+    def chunk_embeddings(self, chunks: List[str]) -> Optional[List[List[float]]]:
+        """Returns the embeddings of `chunks` if every one of them was precomputed."""
+        rows = [self._chunk_rows.get(content_hash(chunk)) for chunk in chunks]
+        if not rows or None in rows:
+            return None
+        return self.vectors[rows].tolist()
+
+
+def get_example_artifacts() -> ExampleArtifacts:
+    """
+    Returns the precomputed example results, loaded once per process. Without an artifact file the examples are
+    read from the CSV file and every result is computed live.
+    """
+
+    def load():
+        if os.path.exists(EXAMPLES_ARTIFACT):
+            return ExampleArtifacts.load(EXAMPLES_ARTIFACT)
+        if os.path.exists(EXAMPLES_FILE):
+            return ExampleArtifacts.from_csv(EXAMPLES_FILE)
+        # e.g. the batch command run outside the repository, which never shows the examples
+        return ExampleArtifacts([])
+
+    return shared("example_artifacts", load)
+
+
+def build_example_artifacts(examples_path: str = EXAMPLES_FILE) -> ExampleArtifacts:
+    """
+    Computes the results of every example in `examples_path` with the app's own pipelines.
+        Args:
+            examples_path (`str`, *optional*, defaults to `EXAMPLES_FILE_PATH`):
+                The CSV file with the `doc` and `question` of every example.
+        Returns:
+            artifacts (`ExampleArtifacts`):
+                The examples with their results, ready to be saved.
+    """
+    from src import document_utils
+    from src.clients import get_embeddings
+    from src.document_index import split_document
+
+    # results are always computed live, even if an older artifact file exists
+    source = ExampleArtifacts.from_csv(examples_path)
+    override_clients(example_artifacts=source)
+
+    vectors = []
+    examples = []
+    for document, question in (source.document(i) for i in range(len(source.examples))):
+        chunks = split_document(document)
+        chunk_vectors = get_embeddings().embed_documents(chunks)
+        question_vector = get_embeddings().embed_query(question)
+        # the chunk index is seeded with the embeddings above, so answering only embeds the question again
+        document_utils.document_indexes.get_or_build(document, lambda texts: chunk_vectors)
+        answer = document_utils.question_answer(document, [[question, None]])
+
+        example = {
+            "document": document,
+            "question": question,
+            "answer": answer,
+            "question_row": len(vectors),
+            "chunks": [],
+            "summaries": {},
+        }
+        vectors.append(question_vector)
+        for chunk, vector in zip(chunks, chunk_vectors):
+            example["chunks"].append([content_hash(chunk), len(vectors)])
+            vectors.append(vector)
+        for summary_length in SUMMARY_LENGTHS:
+            for summary_format in SUMMARY_FORMATS:
+                example["summaries"][f"{summary_length}/{summary_format}"] = document_utils.summarize(
+                    document,
+                    summary_length,
+                    summary_format,
+                    EXAMPLE_SUMMARY_EXTRACTIVENESS,
+                    EXAMPLE_SUMMARY_TEMPERATURE,
+                )
+        for questions in document_utils.stream_generate_questions(document):
+            pass
+        example["questions"] = questions
+        examples.append(example)
+
+    settings = {
+        "chunk_tokens": QA_CHUNK_TOKENS,
+        "chunk_overlap_tokens": QA_CHUNK_OVERLAP_TOKENS,
+        "extractiveness": EXAMPLE_SUMMARY_EXTRACTIVENESS,
+        "temperature": EXAMPLE_SUMMARY_TEMPERATURE,
+    }
+    return ExampleArtifacts(examples, np.array(vectors, dtype="<f4"), settings)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute the results shown for the bundled example documents.")
+    parser.add_argument("--examples", default=EXAMPLES_FILE, help="CSV file with the doc and question columns.")
+    parser.add_argument("--output", default=EXAMPLES_ARTIFACT)
+    args = parser.parse_args(argv)
+
+    artifacts = build_example_artifacts(args.examples)
+    artifacts.save(args.output)
+    print(f"saved {len(artifacts.examples)} examples and {len(artifacts.vectors)} embeddings to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
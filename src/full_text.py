@@ -0,0 +1,223 @@
+import json
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.vector_index import _filter_mask
+
+# letters of Hausa's boko alphabet (and the Igbo velar nasal) that do not decompose into a base letter plus marks
+_FOLDED_LETTERS = str.maketrans({"ɓ": "b", "ɗ": "d", "ƙ": "k", "ƴ": "y", "ŋ": "n", "ʼ": None, "’": None})
+
+WORD = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """
+    Normalizes text for matching. Letters are lowercased and stripped of tone marks and under-dots, so that
+    'Ọ̀yọ́', 'Ọyọ' and 'oyo' or 'Ƙano' and 'Kano' are the same word whether or not the user typed the diacritics.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.translate(_FOLDED_LETTERS)
+
+
+def tokenize(text: str) -> List[str]:
+    return WORD.findall(fold(text))
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Dict]], k: int = 60) -> List[Dict]:
+    """
+    Merges several ranked lists of matches into one. Each match scores `1 / (k + rank)` in every list it appears in,
+    so records ranked well by several retrievers rise to the top regardless of how each retriever scales its scores.
+        Args:
+            rankings (`Iterable[List[Dict]]`):
+                Lists of `{"id", "score", "metadata"}` matches, such as dicts or Pinecone `ScoredVector`s, each
+                ordered best first.
+            k (`int`, *optional*, defaults to 60):
+                Damps the advantage of the very first ranks.
+        Returns:
+            matches (`List[Dict]`):
+                The fused matches as `{"id", "score", "metadata"}` dicts, best first, with their fused score.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking, start=1):
+            # matches may be Pinecone `ScoredVector`s, which index like dicts but can't be unpacked like them
+            entry = fused.setdefault(match["id"], {"id": match["id"], "score": 0.0, "metadata": match.get("metadata")})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda match: -match["score"])
+
+
+class FullTextIndex:
+    """
+    An in-process inverted index with BM25 ranking over the title and text of wiki articles. It accepts the same
+    records and metadata filters as `LocalVectorIndex` and answers in the same `{"matches": [...]}` shape.
+    Articles whose title is exactly the query can be looked up directly, without scoring.
+        Args:
+            k1 (`float`, *optional*, defaults to 1.2):
+                BM25 term frequency saturation.
+            b (`float`, *optional*, defaults to 0.75):
+                BM25 document length normalization.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.metadata: List[Dict] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._vocabulary: Dict[str, int] = {}
+        self._titles: Dict[str, List[int]] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._masks: Dict[str, np.ndarray] = {}
+        self._postings = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, records: Iterable[Tuple[str, Dict]]) -> Dict:
+        """Adds or replaces `(id, metadata)` records. The metadata must hold the article's 'title' and 'text'."""
+        count = 0
+        with self._lock:
+            for record_id, metadata in records:
+                row = self._id_to_row.get(record_id)
+                if row is None:
+                    self._id_to_row[record_id] = len(self.ids)
+                    self.ids.append(record_id)
+                    self.metadata.append(dict(metadata))
+                else:
+                    self.metadata[row] = dict(metadata)
+                count += 1
+            self._dirty = True
+        return {"upserted_count": count}
+
+    def _build(self) -> None:
+        if not self._dirty:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            vocabulary = {}
+            titles = {}
+            term_ids, rows, frequencies = [], [], []
+            lengths = np.zeros(len(self.ids), dtype=np.float32)
+            for row, metadata in enumerate(self.metadata):
+                title = tokenize(metadata.get("title", ""))
+                titles.setdefault(" ".join(title), []).append(row)
+                tokens = title + tokenize(metadata.get("text", ""))
+                lengths[row] = len(tokens)
+                for term, frequency in Counter(tokens).items():
+                    term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                    rows.append(row)
+                    frequencies.append(frequency)
+
+            # postings grouped by term, with offsets delimiting each term's list of (row, frequency)
+            term_ids = np.array(term_ids, dtype=np.int64)
+            order = np.argsort(term_ids, kind="stable")
+            document_frequency = np.bincount(term_ids, minlength=len(vocabulary))
+            offsets = np.concatenate([[0], np.cumsum(document_frequency)])
+            n = max(len(self.ids), 1)
+            idf = np.log(1 + (n - document_frequency + 0.5) / (document_frequency + 0.5))
+            average_length = max(float(lengths.mean()) if len(lengths) else 0.0, 1.0)
+            self._postings = (
+                offsets,
+                np.array(rows, dtype=np.int64)[order],
+                np.array(frequencies, dtype=np.float32)[order],
+                idf.astype(np.float32),
+                self.k1 * (1 - self.b + self.b * lengths / average_length),
+            )
+            self._vocabulary = vocabulary
+            self._titles = titles
+            self._columns = {}
+            self._masks = {}
+            self._dirty = False
+
+    def _filter_rows(self, filter: Dict) -> np.ndarray:
+        key = json.dumps(filter, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.ones(len(self.ids), dtype=bool)
+            for field, condition in filter.items():
+                column = self._columns.get(field)
+                if column is None:
+                    column = np.array([m.get(field) for m in self.metadata], dtype=object)
+                    self._columns[field] = column
+                mask &= _filter_mask(column, condition)
+            self._masks[key] = mask
+        return mask
+
+    def _matches(self, rows: np.ndarray, scores: np.ndarray, include_metadata: bool) -> Dict:
+        matches = []
+        for row, score in zip(rows.tolist(), scores.tolist()):
+            match = {"id": self.ids[row], "score": score}
+            if include_metadata:
+                match["metadata"] = self.metadata[row]
+            matches.append(match)
+        return {"matches": matches}
+
+    def query(
+        self,
+        text: str,
+        top_k: int = 10,
+        include_metadata: bool = False,
+        filter: Optional[Dict] = None,
+    ) -> Dict:
+        """Returns the `top_k` records with the highest BM25 score for `text`, best first."""
+        self._build()
+        terms = [self._vocabulary[t] for t in set(tokenize(text)) if t in self._vocabulary]
+        if not terms:
+            return {"matches": []}
+        offsets, posting_rows, posting_frequencies, idf, normalization = self._postings
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in terms:
+            rows = posting_rows[offsets[term] : offsets[term + 1]]
+            frequencies = posting_frequencies[offsets[term] : offsets[term + 1]]
+            scores[rows] += idf[term] * frequencies * (self.k1 + 1) / (frequencies + normalization[rows])
+
+        candidates = np.flatnonzero(scores)
+        if filter:
+            candidates = candidates[self._filter_rows(filter)[candidates]]
+        if len(candidates) == 0:
+            return {"matches": []}
+        k = min(top_k, len(candidates))
+        best = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return self._matches(best, scores[best], include_metadata)
+
+    def lookup_title(
+        self,
+        text: str,
+        top_k: int = 10,
+        include_metadata: bool = False,
+        filter: Optional[Dict] = None,
+    ) -> Dict:
+        """Returns the records whose title is `text`, ignoring case, diacritics and punctuation."""
+        self._build()
+        rows = np.array(self._titles.get(" ".join(tokenize(text)), []), dtype=np.int64)
+        if filter and len(rows):
+            rows = rows[self._filter_rows(filter)[rows]]
+        rows = rows[:top_k]
+        return self._matches(rows, np.ones(len(rows)), include_metadata)
+
+    def save(self, path: str) -> None:
+        """Writes the ids and metadata to a single `.npz` file. The postings are rebuilt when the index is loaded."""
+        with self._lock:
+            np.savez(path, ids=np.array(self.ids), metadata=np.array(json.dumps(self.metadata)))
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "FullTextIndex":
+        """
+        Loads an index written with `save`. The `.npz` files of `LocalVectorIndex` can be loaded too, since they
+        hold the same ids and metadata.
+        """
+        index = cls(**kwargs)
+        with np.load(path, allow_pickle=False) as data:
+            index.upsert(zip(data["ids"].tolist(), json.loads(str(data["metadata"]))))
+        return index
@@ -0,0 +1,28 @@
+import html
+import re
+import urllib.parse
+
+import requests
+from easygoogletranslate import EasyGoogleTranslate
+
+
+class CheckedGoogleTranslate(EasyGoogleTranslate):
+    """
+    An `EasyGoogleTranslate` that raises on failed requests. The library itself exits the process when a response
+    holds no translation (as it does for HTTP 429), and opens a new connection per request; this override raises
+    `requests.HTTPError` with the response attached instead, so throttling can be retried, and reuses one session.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._session = requests.Session()
+
+    def make_request(self, target_language, source_language, text, timeout):
+        escaped_text = urllib.parse.quote(text.encode("utf8"))
+        url = "https://translate.google.com/m?tl=%s&sl=%s&q=%s" % (target_language, source_language, escaped_text)
+        response = self._session.get(url, timeout=timeout)
+        response.raise_for_status()
+        result = re.findall(self.pattern, response.text)
+        if not result:
+            raise ValueError("Google Translate returned a page without a translation")
+        return html.unescape(result[0])
@@ -0,0 +1,409 @@
+"""
+Streams Wikipedia articles into the `wiki-embed` vector index.
+
+Records are read lazily from a Hugging Face dataset or a local JSONL/Parquet dump, embedded in batches with a
+bounded number of batches in flight, and upserted in parallel. Progress is checkpointed to disk so that an
+interrupted run resumes after the last batch that was fully indexed.
+
+Example:
+    python -m src.ingest --lang yo --jsonl dumps/yo.jsonl --limit 50000
+    python -m src.ingest --lang en --dataset Cohere/wikipedia-22-12 --config en --backend local
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import requests
+import urllib3
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(".."))
+
+from src.chunking import token_chunks
+from src.clients import get_cohere_client
+from src.constants import (
+    CREATE_QDRANT_COLLECTION_NAME,
+    EMBED_BATCH_MAX_SIZE,
+    FULL_TEXT_INDEX_PATH,
+    INGEST_BATCH_SIZE,
+    INGEST_CHECKPOINT_INTERVAL,
+    INGEST_CHUNK_OVERLAP_TOKENS,
+    INGEST_CHUNK_TOKENS,
+    LOCAL_INDEX_PATH,
+    MULTILINGUAL_EMBEDDING_MODEL,
+)
+from src.outbound import call
+
+# load environment variables
+CWD = os.path.dirname(os.path.abspath(__file__))
+dotenv_path = os.path.join(os.path.dirname(CWD), ".env")
+load_dotenv(dotenv_path)
+# load environment variables
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+PINECONE_ENV = os.getenv("PINECONE_ENV")
+
+# pinecone recommends upserting at most 100 vectors per request
+UPSERT_CHUNK_SIZE = 100
+
+
+def read_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_parquet(path: str, batch_size: int = 1024) -> Iterator[Dict]:
+    import pyarrow.parquet as pq
+
+    for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield from record_batch.to_pylist()
+
+
+def read_dataset(path: str, config: Optional[str] = None, split: str = "train") -> Iterator[Dict]:
+    from datasets import load_dataset
+
+    return iter(load_dataset(path, config, split=split, streaming=True))
+
+
+def batched(records: Iterable[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    iterator = iter(records)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class Checkpoint:
+    """
+    Tracks how many records of a source have been fully indexed.
+    Batches may finish out of order, so the saved offset only advances over a contiguous run of completed batches.
+        Args:
+            path (`str`):
+                Location of the JSON checkpoint file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                self.offset = json.load(file)["offset"]
+        self._completed = {}
+        self._next_batch = 0
+
+    def complete(self, batch_number: int, size: int) -> None:
+        self._completed[batch_number] = size
+        while self._next_batch in self._completed:
+            size = self._completed.pop(self._next_batch)
+            self.offset += size
+            self._next_batch += 1
+
+    def save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"offset": self.offset}, file)
+        # atomic so that a crash while saving never leaves a truncated checkpoint
+        os.replace(tmp_path, self.path)
+
+
+class ThroughputReporter:
+    """Prints the number of indexed documents and the docs/sec rate at most every `interval` seconds."""
+
+    def __init__(self, interval: float = 10.0):
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.count = 0
+
+    def update(self, count: int, force: bool = False) -> None:
+        self.count += count
+        now = time.perf_counter()
+        if force or now - self.last_report >= self.interval:
+            elapsed = max(now - self.start, 1e-9)
+            print(f"indexed {self.count} docs in {elapsed:.1f}s ({self.count / elapsed:.1f} docs/sec)")
+            self.last_report = now
+
+
+def chunk_record(record: Dict, max_tokens: int, overlap_tokens: int) -> List[Dict]:
+    """
+    Splits an article into records of at most `max_tokens` tokens. An article that fits keeps its id, so indexes
+    built from pre-chunked dumps such as Cohere/wikipedia-22-12 keep the same vector ids; the chunks of a longer
+    article get the ids '<id>-0', '<id>-1', ...
+    """
+    chunks = token_chunks(record["text"], max_tokens, overlap_tokens)
+    if len(chunks) <= 1:
+        return [record]
+    return [{**record, "id": f"{record['id']}-{i}", "text": chunk} for i, chunk in enumerate(chunks)]
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether `error` is worth retrying: a dropped connection, a timeout, an HTTP 429 or a 5xx answer."""
+    # `status` is set by the Pinecone client, `http_status` by the Cohere SDK and `response` by `requests`
+    for status in (
+        getattr(error, "status", None),
+        getattr(error, "http_status", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        if isinstance(status, int):
+            return status == 429 or status >= 500
+    return isinstance(
+        error, (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout, urllib3.exceptions.HTTPError)
+    )
+
+
+def with_retries(fn, *args, attempts: int = 3, backoff: float = 2.0):
+    """Calls `fn(*args)`, retrying transient errors with exponential backoff. Other errors are raised right away."""
+    for attempt in range(attempts):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient(e):
+                raise
+            time.sleep(backoff * 2**attempt)
+
+
+def ingest(
+    records: Iterable[Dict],
+    lang: str,
+    index,
+    checkpoint: Checkpoint,
+    embed_texts,
+    batch_size: int = INGEST_BATCH_SIZE,
+    max_in_flight: int = 4,
+    upsert_workers: int = 4,
+    limit: Optional[int] = None,
+    on_checkpoint=None,
+    report_interval: float = 10.0,
+    checkpoint_interval: float = INGEST_CHECKPOINT_INTERVAL,
+    chunk_tokens: int = INGEST_CHUNK_TOKENS,
+    chunk_overlap_tokens: int = INGEST_CHUNK_OVERLAP_TOKENS,
+    full_text_index=None,
+) -> int:
+    """
+    Embeds and upserts `records` into `index`, resuming after `checkpoint.offset`.
+        Args:
+            records (`Iterable[Dict]`):
+                Articles with 'id', 'url', 'title' and 'text' fields.
+            lang (`str`):
+                Language code stored in the `lang` metadata field and used to prefix the vector ids.
+            index:
+                A `pinecone.Index` or `LocalVectorIndex` that receives the vectors.
+            checkpoint (`Checkpoint`):
+                Progress of previous runs; updated and saved as batches complete.
+            embed_texts (`Callable[[List[str]], List[List[float]]]`):
+                Function that returns one embedding per input text.
+            batch_size (`int`, *optional*, defaults to `INGEST_BATCH_SIZE`):
+                The number of articles processed and checkpointed together. Their chunks are embedded at most
+                `EMBED_BATCH_MAX_SIZE` per request.
+            max_in_flight (`int`, *optional*, defaults to 4):
+                The maximum number of batches being embedded or upserted at the same time.
+            upsert_workers (`int`, *optional*, defaults to 4):
+                The number of concurrent upsert requests.
+            limit (`int`, *optional*):
+                Stop once this many records of the source have been indexed.
+            on_checkpoint (`Callable`, *optional*):
+                Called before the checkpoint is saved, e.g. to persist a local index. No batch is being processed
+                while it runs.
+            report_interval (`float`, *optional*, defaults to 10.0):
+                Seconds between throughput reports.
+            checkpoint_interval (`float`, *optional*, defaults to `INGEST_CHECKPOINT_INTERVAL`):
+                Seconds between checkpoints. A checkpoint waits for the batches in flight to finish, and
+                `on_checkpoint` may rewrite a whole index, so this is much longer than `report_interval`.
+            chunk_tokens (`int`, *optional*, defaults to `INGEST_CHUNK_TOKENS`):
+                Articles longer than this many tokens are embedded as several chunks.
+            chunk_overlap_tokens (`int`, *optional*, defaults to `INGEST_CHUNK_OVERLAP_TOKENS`):
+                The number of tokens consecutive chunks of an article share.
+            full_text_index (`FullTextIndex`, *optional*):
+                Also receives every chunk, for full-text search next to a hosted vector index.
+        Returns:
+            indexed (`int`): The number of records indexed in this run.
+    """
+    skipped = checkpoint.offset
+    records = itertools.islice(records, skipped, limit)
+    if skipped:
+        print(f"resuming after {skipped} records")
+
+    reporter = ThroughputReporter(report_interval)
+    upsert_pool = ThreadPoolExecutor(upsert_workers)
+
+    def process_batch(batch: List[Dict]) -> int:
+        chunks = [
+            chunk
+            for x in batch
+            for chunk in chunk_record(x, chunk_tokens, chunk_overlap_tokens)
+        ]
+        texts = [x["text"] for x in chunks]
+        # the embed endpoint accepts at most EMBED_BATCH_MAX_SIZE texts per request; `embed_texts` goes through the
+        # outbound layer, which already retries 429s, so it isn't wrapped in `with_retries`
+        embeds = [
+            embed
+            for i in range(0, len(texts), EMBED_BATCH_MAX_SIZE)
+            for embed in embed_texts(texts[i : i + EMBED_BATCH_MAX_SIZE])
+        ]
+        vectors = [
+            (
+                f"{lang}-{x['id']}",
+                embed,
+                {"text": x["text"], "title": x["title"], "url": x["url"], "lang": lang},
+            )
+            for x, embed in zip(chunks, embeds)
+        ]
+        if full_text_index is not None:
+            full_text_index.upsert((vector_id, metadata) for vector_id, _, metadata in vectors)
+        upserts = [
+            upsert_pool.submit(with_retries, index.upsert, vectors[i : i + UPSERT_CHUNK_SIZE])
+            for i in range(0, len(vectors), UPSERT_CHUNK_SIZE)
+        ]
+        for upsert in upserts:
+            upsert.result()
+        return len(batch)
+
+    def save_checkpoint() -> None:
+        if on_checkpoint is not None:
+            on_checkpoint()
+        checkpoint.save()
+
+    in_flight = {}
+    last_save = time.perf_counter()
+    started_since_save = 0
+    exhausted = False
+    error = None
+    with ThreadPoolExecutor(max_in_flight) as embed_pool:
+        batches = enumerate(batched(records, batch_size))
+        while True:
+            # once a checkpoint is due no new batch starts, so the in-flight ones drain and nothing writes to the
+            # indexes while they are saved
+            save_due = started_since_save > 0 and time.perf_counter() - last_save >= checkpoint_interval
+            # keep at most `max_in_flight` batches between reading and a finished upsert
+            while error is None and not save_due and not exhausted and len(in_flight) < max_in_flight:
+                item = next(batches, None)
+                if item is None:
+                    exhausted = True
+                    break
+                batch_number, batch = item
+                in_flight[embed_pool.submit(process_batch, batch)] = batch_number
+                started_since_save += 1
+            if not in_flight:
+                if not save_due or exhausted or error is not None:
+                    break
+                save_checkpoint()
+                last_save = time.perf_counter()
+                started_since_save = 0
+                continue
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch_number = in_flight.pop(future)
+                try:
+                    size = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                checkpoint.complete(batch_number, size)
+                reporter.update(size)
+
+    upsert_pool.shutdown()
+    save_checkpoint()
+    reporter.update(0, force=True)
+    if error is not None:
+        raise error
+    return checkpoint.offset - skipped
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Embed Wikipedia articles into the wiki-embed index.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--jsonl", help="Path to a JSONL dump with id, url, title and text fields.")
+    source.add_argument("--parquet", help="Path to a Parquet dump with id, url, title and text columns.")
+    source.add_argument("--dataset", help="Hugging Face dataset name, streamed (e.g. Cohere/wikipedia-22-12).")
+    parser.add_argument("--config", help="Dataset configuration, e.g. the language for Cohere/wikipedia-22-12.")
+    parser.add_argument("--lang", required=True, help="Language code stored with every vector (en, yo, ig, ha).")
+    parser.add_argument("--limit", type=int, help="Maximum number of records to index from the source.")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--upsert-workers", type=int, default=4)
+    parser.add_argument("--backend", choices=["pinecone", "local"], default="pinecone")
+    # the defaults are where the app looks for the indexes, whatever the working directory
+    parser.add_argument("--local-index-path", default=os.path.join(os.path.dirname(CWD), LOCAL_INDEX_PATH))
+    parser.add_argument(
+        "--full-text-index-path",
+        default=os.path.join(os.path.dirname(CWD), FULL_TEXT_INDEX_PATH),
+        help="Where the articles are saved for full-text search when indexing into Pinecone.",
+    )
+    parser.add_argument("--checkpoint", help="Checkpoint file, defaults to .cache/ingest-<lang>.json.")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("--checkpoint-interval", type=float, default=INGEST_CHECKPOINT_INTERVAL)
+    parser.add_argument("--chunk-tokens", type=int, default=INGEST_CHUNK_TOKENS)
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=INGEST_CHUNK_OVERLAP_TOKENS)
+    args = parser.parse_args(argv)
+
+    if args.jsonl:
+        records = read_jsonl(args.jsonl)
+    elif args.parquet:
+        records = read_parquet(args.parquet)
+    else:
+        records = read_dataset(args.dataset, args.config)
+
+    on_checkpoint = None
+    full_text_index = None
+    if args.backend == "local":
+        from src.vector_index import LocalVectorIndex
+
+        if os.path.exists(args.local_index_path):
+            index = LocalVectorIndex.load(args.local_index_path)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(args.local_index_path)), exist_ok=True)
+            index = LocalVectorIndex()
+        on_checkpoint = lambda: index.save(args.local_index_path)
+    else:
+        import pinecone
+
+        from src.full_text import FullTextIndex
+
+        pinecone.init(api_key=PINECONE_API_KEY, environment=PINECONE_ENV)
+        index = pinecone.Index(CREATE_QDRANT_COLLECTION_NAME)
+        # the hosted index can't be listed, so full-text search gets its own copy of the articles;
+        # a local vector index is searched by full text directly
+        if os.path.exists(args.full_text_index_path):
+            full_text_index = FullTextIndex.load(args.full_text_index_path)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(args.full_text_index_path)), exist_ok=True)
+            full_text_index = FullTextIndex()
+        on_checkpoint = lambda: full_text_index.save(args.full_text_index_path)
+
+    co = get_cohere_client()
+
+    def embed_texts(texts: List[str]) -> List[List[float]]:
+        # shares the app's rate limit and HTTP 429 backoff for the embedding model
+        return call(MULTILINGUAL_EMBEDDING_MODEL, co.embed, texts=texts, model=MULTILINGUAL_EMBEDDING_MODEL).embeddings
+
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(".cache", f"ingest-{args.lang}.json"))
+    ingest(
+        records,
+        args.lang,
+        index,
+        checkpoint,
+        embed_texts,
+        batch_size=args.batch_size,
+        max_in_flight=args.max_in_flight,
+        upsert_workers=args.upsert_workers,
+        limit=args.limit,
+        on_checkpoint=on_checkpoint,
+        report_interval=args.report_interval,
+        checkpoint_interval=args.checkpoint_interval,
+        chunk_tokens=args.chunk_tokens,
+        chunk_overlap_tokens=args.chunk_overlap_tokens,
+        full_text_index=full_text_index,
+    )
+
+
+if __name__ == "__main__":
+    main()
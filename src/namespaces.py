@@ -0,0 +1,329 @@
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from src.clients import shared
+from src.constants import QA_INDEX_BACKEND, QA_NAMESPACE_SWEEP_INTERVAL
+from src.outbound import call
+from src.telemetry import METRIC_HELP, registry
+from src.vector_index import LocalVectorIndex
+
+# load environment variables
+CWD = os.path.dirname(os.path.abspath(__file__))
+dotenv_path = os.path.join(os.path.dirname(CWD), ".env")
+load_dotenv(dotenv_path)
+QA_INDEX_BACKEND = os.getenv("QA_INDEX_BACKEND", QA_INDEX_BACKEND)
+
+logger = logging.getLogger(__name__)
+
+METRIC_HELP.update(
+    {
+        "omowe_qa_namespaces_deleted_total": ("counter", "Q&A namespaces deleted because they expired or were evicted."),
+    }
+)
+
+# maximum number of vectors sent to Pinecone in one upsert request
+PINECONE_UPSERT_BATCH = 100
+
+
+class Namespace:
+    """A named Q&A index, with the number of callers using it and when it was last used."""
+
+    def __init__(self, name: str, value: Any):
+        self.name = name
+        self.value = value
+        self.refs = 0
+        self.last_used = time.monotonic()
+        # held while the namespace is being filled, so concurrent callers don't fill it twice
+        self.lock = threading.Lock()
+        self.ready = False
+
+
+class NamespaceRegistry:
+    """
+    Keeps the vectors of each Q&A document in its own namespace, deleted once nobody has used it for `ttl` seconds.
+    Callers hold a reference while they fill or query a namespace, and namespaces in use are never deleted.
+    A background sweeper deletes expired namespaces in bulk every `QA_NAMESPACE_SWEEP_INTERVAL` seconds.
+    Namespaces only live in memory, so the ones left in an external store by a previous process are deleted with
+    `delete_orphans`.
+        Args:
+            name (`str`):
+                Identifies the registry in metrics, e.g. 'documents'.
+            ttl (`float`, *optional*):
+                Seconds after its last use an unused namespace expires. If `None`, namespaces only expire by eviction.
+            maxsize (`int`, *optional*):
+                The maximum number of namespaces; the least recently used unused ones are deleted beyond it.
+            open_namespace (`Callable[[str], Any]`, *optional*):
+                Creates the index of a new namespace, defaults to an in-process `LocalVectorIndex`.
+            delete_namespaces (`Callable[[List[str]], None]`, *optional*):
+                Deletes the vectors of expired namespaces from an external store. Not needed for in-process indexes.
+            list_namespaces (`Callable[[], List[str]]`, *optional*):
+                Lists the namespaces of the external store, see `delete_orphans`.
+            prefix (`str`, *optional*):
+                The prefix of the names of the registry's namespaces, e.g. 'document-'. Namespaces of the external
+                store without it belong to someone else and are never deleted as orphans.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: Optional[float] = None,
+        maxsize: Optional[int] = None,
+        open_namespace: Optional[Callable[[str], Any]] = None,
+        delete_namespaces: Optional[Callable[[List[str]], None]] = None,
+        list_namespaces: Optional[Callable[[], List[str]]] = None,
+        prefix: Optional[str] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.open_namespace = open_namespace or (lambda namespace: LocalVectorIndex(mode="exact"))
+        self.delete_namespaces = delete_namespaces
+        self.list_namespaces = list_namespaces
+        self.prefix = prefix
+        self._namespaces: Dict[str, Namespace] = {}
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        _registries.add(self)
+
+    def __len__(self) -> int:
+        return len(self._namespaces)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._namespaces
+
+    def acquire(self, name: str, create: Optional[Callable[[Any], Any]] = None) -> Optional[Namespace]:
+        """
+        Takes a reference to namespace `name`, which must be given back with `release`.
+            Args:
+                name (`str`):
+                    The namespace.
+                create (`Callable[[Any], Any]`, *optional*):
+                    Wraps the index of a namespace that doesn't exist yet, e.g. `lambda index: index`.
+                    If `None`, a missing namespace isn't created.
+            Returns:
+                namespace (`Namespace`):
+                    The namespace, whose `value` is the (wrapped) index, or `None` if it doesn't exist and `create`
+                    wasn't given.
+        """
+        created = False
+        with self._lock:
+            namespace = self._namespaces.get(name)
+            if namespace is None:
+                if create is None:
+                    return None
+                namespace = self._namespaces[name] = Namespace(name, create(self.open_namespace(name)))
+                created = True
+            namespace.refs += 1
+            namespace.last_used = time.monotonic()
+        if created:
+            self._start_sweeper()
+            if self.maxsize is not None and len(self._namespaces) > self.maxsize:
+                self.sweep()
+        return namespace
+
+    def release(self, namespace: Namespace) -> None:
+        with self._lock:
+            namespace.refs -= 1
+            namespace.last_used = time.monotonic()
+
+    @contextmanager
+    def hold(self, name: str, create: Optional[Callable[[Any], Any]] = None) -> Iterator[Optional[Namespace]]:
+        """Holds a reference to namespace `name` for the duration of the block, see `acquire`."""
+        namespace = self.acquire(name, create)
+        try:
+            yield namespace
+        finally:
+            if namespace is not None:
+                self.release(namespace)
+
+    def get(self, name: str) -> Optional[Any]:
+        """Returns the value of namespace `name` without holding it, or `None` if it doesn't exist."""
+        namespace = self._namespaces.get(name)
+        return namespace.value if namespace is not None else None
+
+    def remove(self, name: str) -> None:
+        """Deletes namespace `name` now, unless it is in use."""
+        with self._lock:
+            namespace = self._namespaces.get(name)
+            if namespace is None or namespace.refs > 0:
+                return
+            del self._namespaces[name]
+        self._delete([name])
+
+    def sweep(self) -> List[str]:
+        """Deletes the expired namespaces and, beyond `maxsize`, the least recently used unused ones. Returns their names."""
+        now = time.monotonic()
+        with self._lock:
+            unused = sorted(
+                (namespace for namespace in self._namespaces.values() if namespace.refs == 0),
+                key=lambda namespace: namespace.last_used,
+            )
+            excess = len(self._namespaces) - self.maxsize if self.maxsize is not None else 0
+            expired = [
+                namespace.name
+                for position, namespace in enumerate(unused)
+                if position < excess or (self.ttl is not None and now - namespace.last_used >= self.ttl)
+            ]
+            for name in expired:
+                del self._namespaces[name]
+        if expired:
+            self._delete(expired)
+        return expired
+
+    def delete_orphans(self) -> List[str]:
+        """
+        Deletes the namespaces of the external store that start with `prefix` but that the registry doesn't hold,
+        such as those of a process that crashed or restarted before its sweeper got to them. Meant to run once at
+        startup, and assumes no other process keeps namespaces with the same prefix in the store. Returns their names.
+        """
+        if self.list_namespaces is None or self.delete_namespaces is None or not self.prefix:
+            return []
+        names = self.list_namespaces()
+        # the lock is held while deleting, so a namespace re-created by a caller in the meantime isn't deleted with them
+        with self._lock:
+            orphans = [name for name in names if name.startswith(self.prefix) and name not in self._namespaces]
+            if orphans:
+                self._delete_vectors(orphans)
+        if orphans:
+            logger.info("deleted %d orphaned %s namespaces", len(orphans), self.name)
+            registry.increment("omowe_qa_namespaces_deleted_total", len(orphans), registry=self.name)
+        return orphans
+
+    def _delete(self, names: List[str]) -> None:
+        registry.increment("omowe_qa_namespaces_deleted_total", len(names), registry=self.name)
+        self._delete_vectors(names)
+
+    def _delete_vectors(self, names: List[str]) -> None:
+        if self.delete_namespaces is not None:
+            try:
+                self.delete_namespaces(names)
+            except Exception:
+                logger.warning("deleting %d %s namespaces failed", len(names), self.name, exc_info=True)
+
+    def _start_sweeper(self) -> None:
+        if self._sweeper is not None or self.ttl is None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(
+                    target=_sweep_forever, args=(weakref.ref(self),), name=f"sweep-{self.name}", daemon=True
+                )
+                self._sweeper.start()
+
+    def stats(self) -> Tuple[int, int]:
+        """Returns the number of live namespaces and the number of vectors they hold."""
+        with self._lock:
+            values = [namespace.value for namespace in self._namespaces.values()]
+        return len(values), sum(len(value) for value in values)
+
+
+def _sweep_forever(registry_ref: "weakref.ref[NamespaceRegistry]") -> None:
+    # only holds the registry while sweeping, so a replaced registry (e.g. in the benchmarks) can be collected
+    while True:
+        time.sleep(QA_NAMESPACE_SWEEP_INTERVAL)
+        namespaces = registry_ref()
+        if namespaces is None:
+            return
+        namespaces.sweep()
+        del namespaces
+
+
+_registries: "weakref.WeakSet[NamespaceRegistry]" = weakref.WeakSet()
+
+
+def _collect(position: int) -> Dict[Tuple[Tuple[str, str], ...], float]:
+    values = {}
+    for namespaces in list(_registries):
+        labels = (("registry", namespaces.name),)
+        values[labels] = values.get(labels, 0) + namespaces.stats()[position]
+    return values
+
+
+def delete_orphaned_namespaces() -> int:
+    """Runs `NamespaceRegistry.delete_orphans` on every registry. Returns the number of namespaces deleted."""
+    return sum(len(namespaces.delete_orphans()) for namespaces in list(_registries))
+
+
+registry.register_gauge("omowe_qa_namespaces", "Live Q&A document namespaces.", lambda: _collect(0))
+registry.register_gauge("omowe_qa_namespace_vectors", "Vectors held by live Q&A document namespaces.", lambda: _collect(1))
+
+
+class PineconeNamespace:
+    """
+    One namespace of a Pinecone index, with the `upsert`/`query` subset of `LocalVectorIndex` the Q&A code uses.
+    Queries on the index without a namespace, such as wiki searches, never see its vectors.
+        Args:
+            index (`pinecone.Index`):
+                The index holding the namespace.
+            namespace (`str`):
+                The namespace.
+    """
+
+    def __init__(self, index, namespace: str):
+        self.index = index
+        self.namespace = namespace
+        self.vector_count = 0
+
+    def __len__(self) -> int:
+        return self.vector_count
+
+    def upsert(self, vectors) -> Dict:
+        vectors = list(vectors)
+        for start in range(0, len(vectors), PINECONE_UPSERT_BATCH):
+            call("pinecone", self.index.upsert, vectors=vectors[start : start + PINECONE_UPSERT_BATCH], namespace=self.namespace)
+        self.vector_count += len(vectors)
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = False, **kwargs):
+        return call(
+            "pinecone",
+            self.index.query,
+            vector=list(vector),
+            top_k=top_k,
+            include_metadata=include_metadata,
+            namespace=self.namespace,
+            **kwargs,
+        )
+
+
+def _get_pinecone_index():
+    # the wiki search index, opened on first use even when wiki search itself runs on the local backend
+    from src.wiki_search import init_pinecone
+
+    return shared("qa_pinecone_index", init_pinecone)
+
+
+def _delete_pinecone_namespaces(names: List[str]) -> None:
+    index = _get_pinecone_index()
+    for name in names:
+        call("pinecone", index.delete, delete_all=True, namespace=name)
+
+
+def _list_pinecone_namespaces() -> List[str]:
+    stats = call("pinecone", _get_pinecone_index().describe_index_stats)
+    return list(stats["namespaces"])
+
+
+def namespace_store() -> Tuple[
+    Optional[Callable[[str], Any]], Optional[Callable[[List[str]], None]], Optional[Callable[[], List[str]]]
+]:
+    """
+    Returns the `open_namespace`, `delete_namespaces` and `list_namespaces` functions of the configured
+    `QA_INDEX_BACKEND`.
+    """
+    if QA_INDEX_BACKEND == "pinecone":
+        return (
+            (lambda name: PineconeNamespace(_get_pinecone_index(), name)),
+            _delete_pinecone_namespaces,
+            _list_pinecone_namespaces,
+        )
+    if QA_INDEX_BACKEND != "local":
+        raise ValueError(f"unknown Q&A index backend: {QA_INDEX_BACKEND}")
+    return None, None, None
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from src.concurrency import RateLimiter
+from src.constants import (
+    OUTBOUND_BACKOFF,
+    OUTBOUND_DEFAULT_RATE_LIMIT,
+    OUTBOUND_MAX_BACKOFF,
+    OUTBOUND_MAX_RETRIES,
+    OUTBOUND_RATE_LIMITS,
+)
+from src.telemetry import METRIC_HELP, registry
+
+logger = logging.getLogger(__name__)
+
+METRIC_HELP.update(
+    {
+        "omowe_outbound_requests_total": ("counter", "Requests sent to external APIs, by model."),
+        "omowe_outbound_coalesced_total": ("counter", "Calls that shared an identical request already in flight, by model."),
+        "omowe_outbound_rate_limited_total": ("counter", "Requests rejected with HTTP 429 and retried, by model."),
+        "omowe_outbound_throttle_seconds": ("histogram", "Time calls waited for their model's rate limit."),
+    }
+)
+
+
+class SingleFlight:
+    """
+    Lets concurrent callers with the same key share one execution: the first caller runs the function and the
+    others wait for its result or exception. Nothing is kept once the call finishes, so it is not a cache.
+        Args:
+            on_shared (`Callable[[Hashable], None]`, *optional*):
+                Called with the key whenever a caller joins a call that is already running.
+    """
+
+    def __init__(self, on_shared: Optional[Callable[[Hashable], None]] = None):
+        self.on_shared = on_shared
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """Returns `fn(*args, **kwargs)`, or the result of the call with the same `key` that is already running."""
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._calls[key] = future
+        if not owner:
+            if self.on_shared is not None:
+                self.on_shared(key)
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+# keyed by (model, request key)
+single_flight = SingleFlight(
+    on_shared=lambda key: registry.increment("omowe_outbound_coalesced_total", model=key[0])
+)
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+# async requests in flight, by (event loop, key); they are only shared within the loop that started them
+_async_calls: Dict[Hashable, "asyncio.Task"] = {}
+
+
+def set_rate_limits(limits: Dict[str, Tuple[float, int]], default: Tuple[float, int]) -> None:
+    """Replaces the `(requests per second, burst)` limits of `OUTBOUND_RATE_LIMITS`, e.g. for the benchmarks."""
+    global OUTBOUND_RATE_LIMITS, OUTBOUND_DEFAULT_RATE_LIMIT
+    with _limiters_lock:
+        OUTBOUND_RATE_LIMITS, OUTBOUND_DEFAULT_RATE_LIMIT = dict(limits), default
+        _limiters.clear()
+
+
+def rate_limiter(model: str) -> RateLimiter:
+    """Returns the token bucket of `model`, sized by `OUTBOUND_RATE_LIMITS`."""
+    limiter = _limiters.get(model)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(model)
+            if limiter is None:
+                rate, burst = OUTBOUND_RATE_LIMITS.get(model, OUTBOUND_DEFAULT_RATE_LIMIT)
+                limiter = _limiters[model] = RateLimiter(rate, burst)
+    return limiter
+
+
+def request_key(*parts) -> str:
+    """A digest of the parameters of a request, e.g. `request_key("embed", texts)`, to coalesce identical requests."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether `error` is an HTTP 429 from the Cohere SDK or from `requests`."""
+    status = getattr(error, "http_status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+
+def _backoff(error: BaseException, attempt: int) -> float:
+    # full jitter, so clients throttled at the same moment don't all retry at the same moment
+    delay = random.uniform(0, min(OUTBOUND_MAX_BACKOFF, OUTBOUND_BACKOFF * 2 ** attempt))
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(delay, min(OUTBOUND_MAX_BACKOFF, float(headers.get("Retry-After", 0))))
+    except (TypeError, ValueError):
+        return delay
+
+
+def _call_with_retries(model: str, fn: Callable, args, kwargs):
+    for attempt in range(OUTBOUND_MAX_RETRIES + 1):
+        registry.observe("omowe_outbound_throttle_seconds", rate_limiter(model).acquire(), model=model)
+        registry.increment("omowe_outbound_requests_total", model=model)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not is_rate_limited(e) or attempt == OUTBOUND_MAX_RETRIES:
+                raise
+            registry.increment("omowe_outbound_rate_limited_total", model=model)
+            delay = _backoff(e, attempt)
+            logger.warning("%s is rate limited, retrying in %.2fs", model, delay)
+            time.sleep(delay)
+
+
+def call(model: str, fn: Callable, /, *args, key: Optional[Hashable] = None, **kwargs):
+    """
+    Sends one request to an external API through the shared outbound layer. The request waits for a token of
+    `model`'s rate limit, and is retried with jittered exponential backoff while the API answers HTTP 429.
+        Args:
+            model (`str`):
+                The model or service the request counts against, e.g. 'multilingual-22-12' or 'google-translate'.
+            fn (`Callable`):
+                The client method sending the request, called as `fn(*args, **kwargs)`.
+            key (`Hashable`, *optional*):
+                Identifies the request, e.g. with `request_key`. Concurrent calls with the same model and key share
+                one request and all receive its result. Streaming requests must not pass a key.
+        Returns:
+            The return value of `fn`.
+    """
+    if key is None:
+        return _call_with_retries(model, fn, args, kwargs)
+    return single_flight.do((model, key), _call_with_retries, model, fn, args, kwargs)
+
+
+async def _acall_with_retries(model: str, fn: Callable, args, kwargs):
+    for attempt in range(OUTBOUND_MAX_RETRIES + 1):
+        wait = rate_limiter(model).reserve()
+        registry.observe("omowe_outbound_throttle_seconds", wait, model=model)
+        if wait:
+            await asyncio.sleep(wait)
+        registry.increment("omowe_outbound_requests_total", model=model)
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            if not is_rate_limited(e) or attempt == OUTBOUND_MAX_RETRIES:
+                raise
+            registry.increment("omowe_outbound_rate_limited_total", model=model)
+            await asyncio.sleep(_backoff(e, attempt))
+
+
+async def acall(model: str, fn: Callable, /, *args, key: Optional[Hashable] = None, **kwargs):
+    """Asyncio variant of `call`, for coroutine functions such as the methods of `cohere.AsyncClient`."""
+    if key is None:
+        return await _acall_with_retries(model, fn, args, kwargs)
+    task_key = (id(asyncio.get_running_loop()), model, key)
+    task = _async_calls.get(task_key)
+    if task is None:
+        task = asyncio.ensure_future(_acall_with_retries(model, fn, args, kwargs))
+        _async_calls[task_key] = task
+        task.add_done_callback(lambda _: _async_calls.pop(task_key, None))
+    else:
+        registry.increment("omowe_outbound_coalesced_total", model=model)
+    # shielded, so one caller being cancelled doesn't cancel the request the others wait for
+    return await asyncio.shield(task)
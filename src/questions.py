@@ -0,0 +1,139 @@
+import re
+from typing import Dict, List, Sequence, Tuple
+
+from src.cache import normalize_query
+
+# difficulty levels of the practice questions, from first to last in a question bank
+QUESTION_LEVELS = ("easy", "medium", "hard")
+
+LEVEL_INSTRUCTIONS = {
+    "easy": "Easy questions ask about a fact stated directly in the text.",
+    "medium": "Medium questions ask how two facts from the text relate to each other.",
+    "hard": "Hard questions can only be answered by combining several parts of the text.",
+}
+
+# "Question 3:", "Q3.", "3)" ... and "Answer:", "A:", "Ans -" ..., in any case, optionally in bold
+QUESTION_LINE = re.compile(r"^\W*(?:q(?:uestion)?\s*\d*|\d+)\s*[:.)\-]\**\s*(?P<text>.*)$", re.IGNORECASE)
+ANSWER_LINE = re.compile(r"^\W*a(?:ns(?:wer)?)?\s*\d*\s*[:.)\-]\**\s*(?P<text>.*)$", re.IGNORECASE)
+INLINE_ANSWER = re.compile(r"\s+a(?:ns(?:wer)?)?\s*[:\-]\s*", re.IGNORECASE)
+
+# placeholders of the prompt's template that the model sometimes repeats
+PLACEHOLDER = re.compile(r"^\(?(?:question|answer)_?\d*\)?$", re.IGNORECASE)
+
+# words ignored when comparing questions, so two questions differing only in their key term aren't duplicates
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from how in is it its of on or that the this to was were what when "
+    "where which who whom whose why with".split()
+)
+
+QA = Tuple[str, str]
+
+
+class NoQuestionsError(ValueError):
+    """Raised when none of the generations for a document could be parsed into practice questions."""
+
+
+def questions_prompt(input_document: str, level: str, count: int) -> str:
+    return f"""Write {count} different {level} short answer questions to test the understanding of the following text. {LEVEL_INSTRUCTIONS[level]} The answer to each question should be one or two words.
+    Write each question on its own line starting with "Question:", followed by a line starting with "Answer:" with its correct answer.
+
+    Text: {input_document}
+    """
+
+
+def _clean(text: str) -> str:
+    return text.strip().strip("*").strip()
+
+
+def parse_questions(text: str) -> List[QA]:
+    """
+    Extracts (question, answer) pairs from a generation, tolerating numbered or unnumbered labels, missing blank
+    lines, answers on the question's line, markdown emphasis and questions without answers (which are dropped).
+    """
+    pairs = []
+    question = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        answer = ANSWER_LINE.match(line)
+        if answer is not None and question is not None:
+            pairs.append((question, _clean(answer.group("text"))))
+            question = None
+            continue
+        match = QUESTION_LINE.match(line)
+        if match is not None:
+            parts = INLINE_ANSWER.split(match.group("text"), maxsplit=1)
+            question = _clean(parts[0])
+            if len(parts) == 2:
+                pairs.append((question, _clean(parts[1])))
+                question = None
+        elif question is not None and not question.endswith("?"):
+            # a question wrapped over several lines
+            question = f"{question} {line}"
+    return [
+        (question, answer)
+        for question, answer in pairs
+        if question and answer and not PLACEHOLDER.match(question) and not PLACEHOLDER.match(answer)
+    ]
+
+
+def _words(text: str) -> frozenset:
+    return frozenset(word for word in re.findall(r"\w+", normalize_query(text)) if word not in STOPWORDS)
+
+
+def is_duplicate(question: str, questions: Sequence[str], threshold: float = 0.7) -> bool:
+    """Whether `question` shares at least `threshold` of its content words (Jaccard similarity) with one of `questions`."""
+    words = _words(question)
+    for other in questions:
+        other_words = _words(other)
+        union = words | other_words
+        if union and len(words & other_words) / len(union) >= threshold:
+            return True
+    return False
+
+
+def question_bank(candidates: Dict[str, List[QA]], size: int, threshold: float = 0.7) -> List[Tuple[str, str, str]]:
+    """
+    Picks up to `size` distinct questions from the parsed candidates of each level, spread evenly across levels
+    and ordered from easy to hard. Levels with too few usable questions are made up for by the others.
+        Args:
+            candidates (`Dict[str, List[Tuple[str, str]]]`):
+                The (question, answer) pairs generated for each level of `QUESTION_LEVELS`.
+            size (`int`):
+                The number of questions in the bank.
+            threshold (`float`, *optional*, defaults to 0.7):
+                The word overlap above which two questions are duplicates, see `is_duplicate`.
+        Returns:
+            bank (`List[Tuple[str, str, str]]`):
+                (level, question, answer) triples.
+    """
+    distinct: Dict[str, List[QA]] = {}
+    kept: List[str] = []
+    for level in QUESTION_LEVELS:
+        distinct[level] = []
+        for question, answer in candidates.get(level, []):
+            if not is_duplicate(question, kept, threshold):
+                kept.append(question)
+                distinct[level].append((question, answer))
+
+    picked = {level: 0 for level in QUESTION_LEVELS}
+    total = 0
+    # round robin over the levels, so a short level leaves its turns to the others
+    while total < size and any(picked[level] < len(distinct[level]) for level in QUESTION_LEVELS):
+        for level in QUESTION_LEVELS:
+            if total < size and picked[level] < len(distinct[level]):
+                picked[level] += 1
+                total += 1
+    return [
+        (level, question, answer)
+        for level in QUESTION_LEVELS
+        for question, answer in distinct[level][: picked[level]]
+    ]
+
+
+def format_questions(bank: Sequence[Tuple[str, str, str]]) -> str:
+    """Formats a question bank the way the app displays practice questions."""
+    return "\n\n".join(
+        f"Question {number}: {question}\nAnswer: {answer}" for number, (_, question, answer) in enumerate(bank, start=1)
+    )
@@ -0,0 +1,95 @@
+from typing import Dict, List
+
+import numpy as np
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr(
+    query: np.ndarray,
+    candidates: np.ndarray,
+    k: int,
+    lambda_: float = 0.7,
+    duplicate_threshold: float = 1.0,
+) -> List[int]:
+    """
+    Selects `k` candidates by maximal marginal relevance: each pick maximizes
+    `lambda_ * similarity to the query - (1 - lambda_) * highest similarity to an already picked candidate`.
+    Candidates at least `duplicate_threshold` cosine-similar to a picked one are dropped as near-duplicates, so of
+    two copies of an article (e.g. in two languages) only the more relevant one can be picked.
+    All similarities come from one matrix product; each pick only updates a vector of the running maxima.
+        Args:
+            query (`np.ndarray`):
+                The query embedding, of shape (dimension,).
+            candidates (`np.ndarray`):
+                The candidate embeddings, of shape (n, dimension).
+            k (`int`):
+                The maximum number of candidates to select.
+            lambda_ (`float`, *optional*, defaults to 0.7):
+                1 ranks by relevance only, 0 by diversity only.
+            duplicate_threshold (`float`, *optional*, defaults to 1.0):
+                The cosine similarity above which two candidates are near-duplicates.
+        Returns:
+            selected (`List[int]`):
+                The positions of the selected candidates in `candidates`, in the order they were picked.
+    """
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    unit = _unit_rows(np.asarray(candidates, dtype=np.float32))
+    relevance = unit @ _unit_rows(np.asarray(query, dtype=np.float32))
+    similarity = unit @ unit.T
+
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = []
+    for _ in range(min(k, n)):
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * np.maximum(redundancy, 0), -np.inf)
+        best = int(np.argmax(scores))
+        if not available[best]:
+            break
+        selected.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+        available &= redundancy < duplicate_threshold
+        available[best] = False
+    return selected
+
+
+def rerank(
+    query: List[float],
+    matches: List[Dict],
+    k: int,
+    lambda_: float = 0.7,
+    duplicate_threshold: float = 1.0,
+) -> List[Dict]:
+    """
+    Re-ranks vector search matches with `mmr` and drops near-duplicates. The matches must have been retrieved with
+    `include_values=True`; the returned matches keep their id, original score and metadata, but not their values.
+        Args:
+            query (`List[float]`):
+                The query embedding the matches were retrieved with.
+            matches (`List[Dict]`):
+                Matches in the `{"id", "score", "values", "metadata"}` shape of `pinecone.Index.query`, as dicts or
+                Pinecone `ScoredVector`s.
+            k (`int`):
+                The number of matches to return.
+            lambda_ (`float`, *optional*, defaults to 0.7):
+                The trade-off between relevance and diversity, see `mmr`.
+            duplicate_threshold (`float`, *optional*, defaults to 1.0):
+                The cosine similarity above which two matches are near-duplicates.
+        Returns:
+            matches (`List[Dict]`):
+                At most `k` `{"id", "score", "metadata"}` dicts, in the order they were picked.
+    """
+    if not matches:
+        return []
+    candidates = np.array([match["values"] for match in matches], dtype=np.float32)
+    selected = mmr(np.asarray(query, dtype=np.float32), candidates, k, lambda_, duplicate_threshold)
+    # built field by field, since Pinecone's `ScoredVector`s index like dicts but have no `items`
+    return [
+        {"id": matches[i]["id"], "score": matches[i]["score"], "metadata": matches[i].get("metadata")}
+        for i in selected
+    ]
@@ -0,0 +1,133 @@
+import importlib.abc
+import importlib.machinery
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict
+
+from src.telemetry import registry
+
+logger = logging.getLogger(__name__)
+
+
+_FILE_LOADERS = (
+    importlib.machinery.SourceFileLoader,
+    importlib.machinery.SourcelessFileLoader,
+    importlib.machinery.ExtensionFileLoader,
+)
+
+
+def _group(module_name: str) -> str:
+    # third-party modules are reported per package, the app's own modules one by one
+    parts = module_name.split(".")
+    return ".".join(parts[:2]) if parts[0] == "src" else parts[0]
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    Measures how long every module takes to import while installed at the front of `sys.meta_path`.
+    A module's time excludes the modules it imports in turn, so the cost of e.g. langchain is attributed to
+    langchain rather than to the app module that imported it.
+    """
+
+    def __init__(self):
+        self.times: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        # only file loaders are per-module instances that can be wrapped without affecting other modules
+        if isinstance(spec.loader, _FILE_LOADERS):
+            self._wrap(spec.loader, fullname)
+        return spec
+
+    def _wrap(self, loader, fullname: str) -> None:
+        exec_module = loader.exec_module
+
+        def timed_exec_module(module):
+            stack = self._local.__dict__.setdefault("stack", [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self._lock:
+                    self.times[_group(fullname)] += elapsed - nested
+
+        loader.exec_module = timed_exec_module
+
+
+import_timer = ImportTimer()
+
+# seconds spent creating each client or index, by name
+init_times: Dict[str, float] = {}
+
+
+def warm_up(tasks: Dict[str, Callable[[], object]]) -> threading.Thread:
+    """
+    Runs `tasks` one after the other in a background thread, e.g. creating clients and opening indexes right after
+    the UI is up, so the first user request does not pay for them. Each task is timed, a failed task is logged and
+    skipped, and the startup report is logged once all tasks have run.
+    """
+
+    def run():
+        for name, task in tasks.items():
+            start = time.perf_counter()
+            try:
+                task()
+            except Exception:
+                logger.warning("warm-up of %s failed", name, exc_info=True)
+            init_times[name] = time.perf_counter() - start
+        import_timer.uninstall()
+        logger.info("%s", startup_report())
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def startup_report(limit: int = 15) -> str:
+    """Formats the slowest module imports and the warm-up times as a table."""
+    lines = ["startup time by module (import, excluding nested imports):"]
+    for module, seconds in sorted(import_timer.times.items(), key=lambda item: -item[1])[:limit]:
+        lines.append(f"  {module:<32} {1000 * seconds:9.1f} ms")
+    lines.append(f"  {'total':<32} {1000 * sum(import_timer.times.values()):9.1f} ms")
+    if init_times:
+        lines.append("warm-up:")
+        for name, seconds in init_times.items():
+            lines.append(f"  {name:<32} {1000 * seconds:9.1f} ms")
+    return "\n".join(lines)
+
+
+registry.register_gauge(
+    "omowe_startup_import_seconds",
+    "Time spent importing each module or package at startup, excluding nested imports.",
+    lambda: {(("module", module),): seconds for module, seconds in list(import_timer.times.items())},
+)
+registry.register_gauge(
+    "omowe_startup_warm_up_seconds",
+    "Time spent on each warm-up task after launch.",
+    lambda: {(("task", name),): seconds for name, seconds in list(init_times.items())},
+)
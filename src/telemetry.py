@@ -0,0 +1,193 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+# latency buckets in seconds, from cache hits up to slow generations
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    "omowe_stage_duration_seconds": ("histogram", "Duration of each pipeline stage."),
+    "omowe_stage_payload_chars_total": ("counter", "Characters of input processed by each pipeline stage."),
+    "omowe_stage_cache_requests_total": ("counter", "Cache lookups of each pipeline stage, by outcome."),
+    "omowe_stage_errors_total": ("counter", "Pipeline stages that raised an exception."),
+}
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels: LabelSet, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Holds histograms, counters and gauge callbacks and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, LabelSet], Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelSet], float] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Dict[LabelSet, float]]]] = {}
+
+    def observe(self, metric: str, value: float, **labels) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, metric: str, amount: float = 1, **labels) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_gauge(self, metric: str, help: str, collect: Callable[[], Dict[LabelSet, float]]) -> None:
+        """Registers a gauge whose values are read by calling `collect` at scrape time."""
+        self._gauges[metric] = (help, collect)
+
+    def render(self) -> str:
+        lines = []
+        described = set()
+
+        def describe(metric: str, kind: str, help: str) -> None:
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# HELP {metric} {help}")
+                lines.append(f"# TYPE {metric} {kind}")
+
+        with self._lock:
+            histograms = sorted(
+                (key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()
+            )
+            counters = sorted(self._counters.items())
+
+        for (metric, labels), counts, total, count, buckets in histograms:
+            kind, help = METRIC_HELP.get(metric, ("histogram", metric))
+            describe(metric, kind, help)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{metric}_bucket{_format_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, le='+Inf')} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+        for (metric, labels), value in counters:
+            kind, help = METRIC_HELP.get(metric, ("counter", metric))
+            describe(metric, kind, help)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        for metric, (help, collect) in sorted(self._gauges.items()):
+            describe(metric, "gauge", help)
+            for labels, value in sorted(collect().items()):
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+_trace_file = None
+_trace_lock = threading.Lock()
+
+
+def configure_tracing(path: Optional[str]) -> None:
+    """Appends every finished span as one JSON line to `path`. Passing `None` turns the trace file off."""
+    global _trace_file
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.close()
+        _trace_file = open(path, "a", buffering=1, encoding="utf-8") if path else None
+
+
+@contextmanager
+def span(name: str, payload_size: Optional[int] = None, **attributes):
+    """
+    Times one pipeline stage. The yielded dict holds the span's attributes and can be updated inside the block,
+    e.g. `record["cache_hit"] = True`. When the block exits the duration is added to the stage's latency
+    histogram, the payload size and cache outcome to its counters, and the span is written to the trace file.
+        Args:
+            name (`str`):
+                Name of the stage, e.g. 'embed_user_query' or 'co.summarize'.
+            payload_size (`int`, *optional*):
+                Size of the stage's input, in characters.
+    """
+    record = {"payload_size": payload_size, **attributes}
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield record
+    except GeneratorExit:
+        # a streaming consumer stopped early, which is not a failure of the stage
+        record["closed"] = True
+        raise
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        registry.observe("omowe_stage_duration_seconds", duration, stage=name)
+        if payload_size:
+            registry.increment("omowe_stage_payload_chars_total", payload_size, stage=name)
+        if record.get("cache_hit") is not None:
+            outcome = "hit" if record["cache_hit"] else "miss"
+            registry.increment("omowe_stage_cache_requests_total", stage=name, outcome=outcome)
+        if "error" in record:
+            registry.increment("omowe_stage_errors_total", stage=name)
+        if _trace_file is not None:
+            line = json.dumps(
+                {
+                    "span": name,
+                    "start": started_at,
+                    "duration_ms": 1000 * duration,
+                    "thread": threading.current_thread().name,
+                    **record,
+                },
+                default=str,
+            )
+            with _trace_lock:
+                if _trace_file is not None:
+                    _trace_file.write(line + "\n")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves the metrics at `http://<host>:<port>/metrics` from a background thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Tuple
+
+from src.cache import LRUCache, content_hash
+from src.chunking import group_sentences
+from src.clients import get_translator
+from src.outbound import SingleFlight, call, request_key
+from src.telemetry import span
+from src.constants import (
+    TRANSLATION_CACHE_SIZE,
+    TRANSLATION_CHUNK_CHARS,
+    TRANSLATION_WORKERS,
+)
+
+# finished translations keyed by (text hash, target language)
+translations = LRUCache(TRANSLATION_CACHE_SIZE)
+
+# chunk requests and whole-document prefetches run on separate pools, so a prefetch
+# waiting on its chunks can never occupy the workers those chunks need
+_chunk_pool = ThreadPoolExecutor(TRANSLATION_WORKERS, thread_name_prefix="translate-chunk")
+_prefetch_pool = ThreadPoolExecutor(3, thread_name_prefix="translate-prefetch")
+
+# only one caller translates a given text at a time; the others wait for its result
+_in_flight = SingleFlight()
+
+
+def _translate_uncached(text: str, target_language: str) -> str:
+    # paragraphs are translated chunk by chunk and stitched back with their line breaks
+    paragraphs = text.split("\n")
+    chunks = [
+        (i, chunk)
+        for i, paragraph in enumerate(paragraphs)
+        for chunk in group_sentences(paragraph, TRANSLATION_CHUNK_CHARS)
+    ]
+    translator = get_translator()
+
+    def translate_chunk(chunk: str) -> str:
+        with span("translator.translate", payload_size=len(chunk), target_language=target_language):
+            return call(
+                "google-translate",
+                translator.translate,
+                chunk,
+                target_language=target_language,
+                key=request_key("translate", chunk, target_language),
+            )
+
+    translated = _chunk_pool.map(translate_chunk, [chunk for _, chunk in chunks])
+    output = [[] for _ in paragraphs]
+    for (i, _), translated_chunk in zip(chunks, translated):
+        output[i].append(translated_chunk)
+    return "\n".join(" ".join(parts) for parts in output)
+
+
+def translate(text: str, target_language: str = "en") -> str:
+    """
+    Translates `text` of any length into `target_language`.
+    The text is split at sentence boundaries into chunks that are translated in parallel, and the result is
+    cached by (text hash, target language). If the same text is already being translated, e.g. by a prefetch,
+    the call waits for that translation instead of starting another one.
+        Args:
+            text (`str`):
+                The text to translate.
+            target_language (`str`, *optional*, defaults to 'en'):
+                The language code to translate into.
+        Returns:
+            translation (`str`):
+                The translated text.
+    """
+    with span("translate", payload_size=len(text), target_language=target_language) as record:
+        key = (content_hash(text), target_language)
+        translation = translations.get(key)
+        record["cache_hit"] = translation is not None
+        if translation is None:
+            translation = _in_flight.do(key, _translate_and_cache, key, text, target_language)
+    return translation
+
+
+def _translate_and_cache(key: Tuple[str, str], text: str, target_language: str) -> str:
+    translation = _translate_uncached(text, target_language)
+    translations.set(key, translation)
+    return translation
+
+
+def prefetch(texts: Iterable[str], target_language: str = "en") -> None:
+    """Starts translating `texts` in the background so a later `translate` call is served from the cache."""
+    for text in texts:
+        if text and (content_hash(text), target_language) not in translations:
+            future = _prefetch_pool.submit(translate, text, target_language)
+            # a failed prefetch is retried when the user actually asks for the translation
+            future.add_done_callback(lambda f: f.exception())
@@ -0,0 +1,261 @@
+import hashlib
+import logging
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from src.constants import (
+    QA_NAMESPACE_TTL,
+    UPLOAD_EMBED_BATCH_SIZE,
+    UPLOAD_INDEX_CACHE_SIZE,
+    UPLOAD_PAGE_CHARS,
+    UPLOAD_WORKERS,
+)
+from src.document_index import split_document
+from src.namespaces import Namespace, NamespaceRegistry, namespace_store
+from src.telemetry import span
+from src.vector_index import LocalVectorIndex
+
+logger = logging.getLogger(__name__)
+
+# extensions of the files the Q&A tab accepts
+UPLOAD_EXTENSIONS = (".pdf", ".docx", ".txt", ".md")
+
+# prefix of the namespaces of the uploaded files' indexes
+UPLOAD_PREFIX = "upload-"
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _group_paragraphs(paragraphs: Iterable[Optional[str]], page_chars: int) -> Iterator[str]:
+    # formats without real pages are cut into pages of about `page_chars` characters at paragraph boundaries
+    page, size = [], 0
+    for paragraph in paragraphs:
+        if paragraph is None:
+            # an explicit page break
+            if page:
+                yield "\n\n".join(page)
+            page, size = [], 0
+            continue
+        page.append(paragraph)
+        size += len(paragraph)
+        if size >= page_chars:
+            yield "\n\n".join(page)
+            page, size = [], 0
+    if page:
+        yield "\n\n".join(page)
+
+
+def read_pdf_pages(path: str) -> Iterator[str]:
+    """Yields the text of each page of a PDF, parsing one page at a time."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def _docx_paragraphs(path: str) -> Iterator[Optional[str]]:
+    # streams word/document.xml instead of loading the whole tree, yielding None at explicit page breaks
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document:
+        for _, element in ElementTree.iterparse(document):
+            if element.tag != f"{WORD_NAMESPACE}p":
+                continue
+            if any(br.get(f"{WORD_NAMESPACE}type") == "page" for br in element.iter(f"{WORD_NAMESPACE}br")):
+                yield None
+            text = "".join(node.text or "" for node in element.iter(f"{WORD_NAMESPACE}t"))
+            element.clear()
+            if text.strip():
+                yield text
+
+
+def read_docx_pages(path: str, page_chars: int = UPLOAD_PAGE_CHARS) -> Iterator[str]:
+    """Yields the text of a .docx file page by page, without python-docx."""
+    return _group_paragraphs(_docx_paragraphs(path), page_chars)
+
+
+def _text_paragraphs(path: str, max_chars: int) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        paragraph, size = [], 0
+        # lines are read at most `max_chars` at a time, so a file without line breaks isn't read in one go
+        for line in iter(lambda: file.readline(max_chars), ""):
+            if line.strip():
+                paragraph.append(line)
+                size += len(line)
+            if paragraph and (not line.strip() or size >= max_chars):
+                yield "".join(paragraph).strip()
+                paragraph, size = [], 0
+        if paragraph:
+            yield "".join(paragraph).strip()
+
+
+def read_text_pages(path: str, page_chars: int = UPLOAD_PAGE_CHARS) -> Iterator[str]:
+    """Yields the text of a plain text or markdown file in pages of about `page_chars` characters."""
+    return _group_paragraphs(_text_paragraphs(path, page_chars), page_chars)
+
+
+def extract_pages(path: str) -> Iterator[str]:
+    """
+    Yields the text of an uploaded file page by page as it is parsed, so large files are never held in memory whole.
+        Args:
+            path (`str`):
+                A .pdf, .docx, .txt or .md file.
+        Returns:
+            pages (`Iterator[str]`):
+                The text of each page. Formats without pages are cut at paragraph boundaries.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in UPLOAD_EXTENSIONS:
+        raise ValueError(f"unsupported file type: {extension or os.path.basename(path)}")
+    if extension == ".pdf":
+        return read_pdf_pages(path)
+    if extension == ".docx":
+        return read_docx_pages(path)
+    return read_text_pages(path)
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadIndex:
+    """
+    The chunk index of an uploaded file, filled by a background worker page by page. It can be queried while it
+    is being built, in which case only the pages indexed so far are searched.
+        Args:
+            name (`str`):
+                The file name, for status messages.
+            index (`LocalVectorIndex`, *optional*):
+                The index the chunks are added to, defaults to a new in-process index.
+    """
+
+    def __init__(self, name: str, index: Optional[LocalVectorIndex] = None):
+        self.name = name
+        self.index = index if index is not None else LocalVectorIndex(mode="exact")
+        self.pages_indexed = 0
+        self.done = False
+        self.error: Optional[str] = None
+        self._changed = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add(self, chunks: List[Tuple[int, str]], vectors: List[List[float]], pages_indexed: int) -> None:
+        start = len(self.index)
+        self.index.upsert(
+            (str(start + i), vector, {"text": text, "page": page})
+            for i, ((page, text), vector) in enumerate(zip(chunks, vectors))
+        )
+        with self._changed:
+            self.pages_indexed = pages_indexed
+            self._changed.notify_all()
+
+    def finish(self, error: Optional[str] = None) -> None:
+        with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    def wait_for_chunks(self, timeout: float) -> bool:
+        """Waits up to `timeout` seconds for the first chunks to be indexed. Returns whether there are any."""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.index) > 0 or self.done, timeout)
+        return len(self.index) > 0
+
+    def status(self) -> str:
+        if self.error is not None:
+            return f"Could not read {self.name} after {self.pages_indexed} pages: {self.error}"
+        if self.done:
+            return f"{self.name} is ready: {self.pages_indexed} pages indexed."
+        return f"Indexing {self.name}: {self.pages_indexed} pages so far. You can already ask questions."
+
+
+def build_upload_index(
+    upload: UploadIndex,
+    pages: Iterable[str],
+    embed_texts: Callable[[List[str]], List[List[float]]],
+    batch_size: int = UPLOAD_EMBED_BATCH_SIZE,
+) -> None:
+    """
+    Chunks and embeds `pages` into `upload` as they are read. The first page is indexed on its own so questions
+    can be answered as early as possible; after that chunks are embedded `batch_size` at a time.
+    """
+    pending: List[Tuple[int, str]] = []
+    page_number = 0
+
+    def flush(pages_read: int, everything: bool) -> None:
+        while pending and (everything or len(pending) >= batch_size):
+            batch = pending[:batch_size]
+            with span("upload_index.embed", payload_size=len(batch)):
+                vectors = embed_texts([text for _, text in batch])
+            del pending[: len(batch)]
+            # a page only counts as indexed once all its chunks are
+            upload.add(batch, vectors, pending[0][0] - 1 if pending else pages_read)
+
+    try:
+        for page_number, page in enumerate(pages, start=1):
+            pending.extend((page_number, chunk) for chunk in split_document(page) if chunk.strip())
+            flush(page_number, everything=len(upload) == 0)
+            if not pending and upload.pages_indexed < page_number:
+                # a page without text
+                upload.add([], [], page_number)
+        flush(page_number, everything=True)
+        upload.finish()
+    except Exception as e:
+        logger.warning("indexing %s failed", upload.name, exc_info=True)
+        upload.finish(f"{type(e).__name__}: {e}")
+
+
+# indexes of the files uploaded for Q&A, one namespace per file content, and the workers that build them
+upload_indexes = NamespaceRegistry(
+    "uploads", QA_NAMESPACE_TTL, UPLOAD_INDEX_CACHE_SIZE, *namespace_store(), prefix=UPLOAD_PREFIX
+)
+upload_pool = ThreadPoolExecutor(UPLOAD_WORKERS, thread_name_prefix="upload")
+_start_lock = threading.Lock()
+
+
+def _index_upload(namespace: Namespace, pages: Iterable[str], embed_texts: Callable) -> None:
+    # the namespace is held while it is being filled, so it can't expire half-built
+    try:
+        build_upload_index(namespace.value, pages, embed_texts)
+    finally:
+        upload_indexes.release(namespace)
+
+
+def start_upload(path: str, embed_texts: Callable[[List[str]], List[List[float]]]) -> str:
+    """
+    Starts indexing an uploaded file in the background and returns the key of its `UploadIndex` right away.
+    Uploading a file that is already indexed, or still being indexed, reuses its index.
+        Args:
+            path (`str`):
+                The uploaded .pdf, .docx, .txt or .md file.
+            embed_texts (`Callable`):
+                A function mapping a list of chunks to their embeddings.
+        Returns:
+            key (`str`):
+                The key to pass to `get_upload`, which is also the upload's namespace.
+    """
+    pages = extract_pages(path)
+    key = f"{UPLOAD_PREFIX}{file_hash(path)}"
+    with _start_lock:
+        upload = upload_indexes.get(key)
+        if upload is not None and upload.error is not None:
+            upload_indexes.remove(key)
+        namespace = upload_indexes.acquire(key, create=lambda index: UploadIndex(os.path.basename(path), index))
+        if namespace.ready:
+            upload_indexes.release(namespace)
+            return key
+        namespace.ready = True
+    upload_pool.submit(_index_upload, namespace, pages, embed_texts)
+    return key
+
+
+def get_upload(key: Optional[str]) -> Optional[UploadIndex]:
+    return upload_indexes.get(key) if key else None
@@ -0,0 +1,280 @@
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def _filter_mask(values: np.ndarray, condition) -> np.ndarray:
+    """Evaluates a Pinecone-style metadata condition such as `{'$in': ['yo', 'ig']}` against a column of values."""
+    if not isinstance(condition, dict):
+        return values == condition
+    mask = np.ones(len(values), dtype=bool)
+    for operator, operand in condition.items():
+        if operator == "$in":
+            mask &= np.isin(values, list(operand))
+        elif operator == "$nin":
+            mask &= ~np.isin(values, list(operand))
+        elif operator == "$eq":
+            mask &= values == operand
+        elif operator == "$ne":
+            mask &= values != operand
+        else:
+            raise ValueError(f"unsupported filter operator: {operator}")
+    return mask
+
+
+class LocalVectorIndex:
+    """
+    An in-process dot-product vector index that mirrors the subset of the `pinecone.Index` API used by the app
+    (`upsert` and `query` with metadata filters), so it can be used as a drop-in search backend.
+
+    Small corpora are searched exactly by brute force. Once the index holds more than `exact_threshold` vectors
+    it switches to an inverted-file (IVF) layout: vectors are clustered with k-means and only the `n_probe` lists
+    whose centroids score highest against the query are scanned.
+        Args:
+            mode (`str`, *optional*, defaults to 'auto'):
+                One of 'exact', 'ivf' or 'auto'. 'auto' picks 'exact' or 'ivf' based on the number of vectors.
+            exact_threshold (`int`, *optional*, defaults to 50000):
+                The maximum number of vectors searched by brute force in 'auto' mode.
+            n_lists (`int`, *optional*):
+                The number of IVF clusters. Defaults to roughly the square root of the number of vectors.
+            n_probe (`int`, *optional*, defaults to 8):
+                The number of IVF clusters scanned per query.
+    """
+
+    def __init__(
+        self,
+        mode: str = "auto",
+        exact_threshold: int = 50_000,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+    ):
+        if mode not in ("auto", "exact", "ivf"):
+            raise ValueError(f"unknown index mode: {mode}")
+        self.mode = mode
+        self.exact_threshold = exact_threshold
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+
+        self.ids: List[str] = []
+        self.metadata: List[Dict] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._pending: List[np.ndarray] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._columns: Dict[str, np.ndarray] = {}
+        self._masks: Dict[str, np.ndarray] = {}
+        self._centroids = None
+        self._list_offsets = None
+        self._list_rows = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        self._build()
+        return self._vectors
+
+    def upsert(self, vectors: Iterable[Tuple[str, List[float], Dict]]) -> Dict:
+        """Adds or replaces `(id, vector, metadata)` records, exactly like `pinecone.Index.upsert`."""
+        count = 0
+        with self._lock:
+            self._flush_pending()
+            flushed = self._vectors.shape[0]
+            replaced = {}
+            for record_id, vector, metadata in vectors:
+                vector = np.asarray(vector, dtype=np.float32)
+                row = self._id_to_row.get(record_id)
+                if row is not None:
+                    if row < flushed:
+                        replaced[row] = vector
+                    else:
+                        self._pending[row - flushed] = vector
+                    self.metadata[row] = dict(metadata or {})
+                else:
+                    self._id_to_row[record_id] = len(self.ids)
+                    self.ids.append(record_id)
+                    self.metadata.append(dict(metadata or {}))
+                    self._pending.append(vector)
+                count += 1
+            if replaced:
+                # written to a copy, so a query or save still reading the current array never sees it change
+                self._vectors = self._vectors.copy()
+                for row, vector in replaced.items():
+                    self._vectors[row] = vector
+            self._dirty = True
+        return {"upserted_count": count}
+
+    def _flush_pending(self) -> None:
+        if not self._pending:
+            return
+        pending = np.vstack(self._pending)
+        if self._vectors.size:
+            self._vectors = np.vstack([self._vectors, pending])
+        else:
+            self._vectors = pending
+        self._pending = []
+
+    def _use_ivf(self) -> bool:
+        if self.mode == "exact":
+            return False
+        if self.mode == "ivf":
+            return True
+        return len(self.ids) > self.exact_threshold
+
+    def _build(self) -> None:
+        if not self._dirty:
+            return
+        with self._lock:
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        # called with `_lock` held
+        if not self._dirty:
+            return
+        self._flush_pending()
+        self._columns = {}
+        self._masks = {}
+        self._centroids = None
+        if self._use_ivf() and len(self.ids) > 0:
+            self._train_ivf()
+        self._dirty = False
+
+    def _train_ivf(self, iterations: int = 10, seed: int = 0) -> None:
+        vectors = self._vectors
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            counts = np.bincount(assignment, minlength=n_lists)
+            non_empty = counts > 0
+            centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        # rows grouped by cluster, with offsets delimiting each inverted list
+        self._list_rows = np.argsort(assignment, kind="stable")
+        self._list_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignment, minlength=n_lists))]
+        )
+        self._centroids = centroids
+
+    def _column(self, field: str) -> np.ndarray:
+        column = self._columns.get(field)
+        if column is None:
+            column = np.array([m.get(field) for m in self.metadata], dtype=object)
+            self._columns[field] = column
+        return column
+
+    def _filter_rows(self, filter: Dict) -> np.ndarray:
+        # masks are cached per filter, since the UI only ever sends a handful of language combinations
+        key = json.dumps(filter, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.ones(len(self.ids), dtype=bool)
+            for field, condition in filter.items():
+                mask &= _filter_mask(self._column(field), condition)
+            self._masks[key] = mask
+        return mask
+
+    def _candidate_rows(
+        self, query: np.ndarray, ivf: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    ) -> Optional[np.ndarray]:
+        if ivf is None:
+            return None
+        centroids, list_rows, list_offsets = ivf
+        n_probe = min(self.n_probe, len(centroids))
+        closest = np.argpartition(-(centroids @ query), n_probe - 1)[:n_probe]
+        return np.concatenate([list_rows[list_offsets[c] : list_offsets[c + 1]] for c in closest])
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 10,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        filter: Optional[Dict] = None,
+    ) -> Dict:
+        """
+        Returns the `top_k` records with the highest dot product against `vector`,
+        in the same `{"matches": [{"id", "score", "metadata"}]}` shape as `pinecone.Index.query`.
+        """
+        # the arrays are read together under the lock, so a concurrent upsert can't swap them between reads; upserts
+        # only append ids and replace `_vectors` rather than writing to it, so they stay valid after the lock is released
+        with self._lock:
+            self._rebuild()
+            if not self.ids:
+                return {"matches": []}
+            vectors = self._vectors
+            ivf = (self._centroids, self._list_rows, self._list_offsets) if self._centroids is not None else None
+            mask = self._filter_rows(filter) if filter else None
+        query = np.asarray(vector, dtype=np.float32)
+
+        rows = self._candidate_rows(query, ivf)
+        if rows is None:
+            scores = vectors @ query
+            if mask is not None:
+                rows = np.flatnonzero(mask)
+                scores = scores[rows]
+            else:
+                rows = np.arange(len(scores))
+        else:
+            if mask is not None:
+                rows = rows[mask[rows]]
+            scores = vectors[rows] @ query
+        if len(rows) == 0:
+            return {"matches": []}
+
+        k = min(top_k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        matches = []
+        for position in best:
+            row = rows[position]
+            match = {"id": self.ids[row], "score": float(scores[position])}
+            if include_metadata:
+                match["metadata"] = self.metadata[row]
+            if include_values:
+                match["values"] = vectors[row].tolist()
+            matches.append(match)
+        return {"matches": matches}
+
+    def describe_index_stats(self) -> Dict:
+        self._build()
+        return {
+            "dimension": int(self._vectors.shape[1]) if self._vectors.size else 0,
+            "total_vector_count": len(self.ids),
+            "mode": "ivf" if self._centroids is not None else "exact",
+        }
+
+    def save(self, path: str) -> None:
+        """Writes the vectors, ids and metadata to a single `.npz` file."""
+        with self._lock:
+            self._rebuild()
+            vectors, ids, metadata = self._vectors, list(self.ids), list(self.metadata)
+        np.savez(
+            path,
+            vectors=vectors,
+            ids=np.array(ids),
+            metadata=np.array(json.dumps(metadata)),
+        )
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "LocalVectorIndex":
+        """Loads an index previously written with `save`. Keyword arguments are passed to the constructor."""
+        index = cls(**kwargs)
+        with np.load(path, allow_pickle=False) as data:
+            index.upsert(
+                zip(
+                    data["ids"].tolist(),
+                    data["vectors"],
+                    json.loads(str(data["metadata"])),
+                )
+            )
+        return index
@@ -1,10 +1,37 @@
 import os
-import cohere
+from dataclasses import dataclass
 from typing import List
-import pinecone
-from easygoogletranslate import EasyGoogleTranslate
 from dotenv import load_dotenv
 
+from src.cache import EmbeddingCache, LRUCache, normalize_query
+from src.clients import get_async_cohere_client, get_cohere_client, shared
+from src.concurrency import MicroBatcher
+from src.constants import (
+    EMBED_BATCH_CONCURRENCY,
+    EMBED_BATCH_MAX_SIZE,
+    EMBED_BATCH_WINDOW,
+    EMBEDDING_CACHE_DISK_SIZE,
+    EMBEDDING_CACHE_MEMORY_SIZE,
+    EMBEDDING_CACHE_PATH,
+    EXACT_SEARCH_MAX_VECTORS,
+    FULL_TEXT_FUSION,
+    FULL_TEXT_INDEX_PATH,
+    FUSION_CANDIDATES,
+    FUSION_RRF_K,
+    DUPLICATE_SIMILARITY,
+    LOCAL_INDEX_PATH,
+    MMR_LAMBDA,
+    PREFETCH_TRANSLATIONS,
+    RERANK_CANDIDATES,
+    SEARCH_RESULT_CACHE_SIZE,
+    SEARCH_RESULT_CACHE_TTL,
+)
+from src.full_text import FullTextIndex, reciprocal_rank_fusion
+from src.outbound import acall, call, request_key, single_flight
+from src.rerank import rerank
+from src.telemetry import span
+from src.translation import prefetch, translate
+from src.vector_index import LocalVectorIndex
 
 # load environment variables
 CWD = os.path.dirname(os.path.abspath(__file__))
@@ -14,116 +41,323 @@ load_dotenv(dotenv_path)
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENV = os.getenv("PINECONE_ENV")
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+# vector search backend used for wiki search: "pinecone" or "local"
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "pinecone")
 
 
 MODEL_NAME = "multilingual-22-12"
 COLLECTION = "wiki-embed"
 
-# create qdrant and cohere client
-cohere_client = cohere.Client(COHERE_API_KEY)
 
-translator = EasyGoogleTranslate()
+def init_embedding_cache():
+    # query embeddings are cached per model, so changing `MODEL_NAME` invalidates the stale vectors
+    return EmbeddingCache(
+        MODEL_NAME,
+        memory_size=EMBEDDING_CACHE_MEMORY_SIZE,
+        disk_path=os.path.join(os.path.dirname(CWD), EMBEDDING_CACHE_PATH),
+        disk_size=EMBEDDING_CACHE_DISK_SIZE,
+    )
+
+
+def get_embedding_cache():
+    """Returns the query embedding cache, opening its on-disk store on first use rather than at import time."""
+    return shared("embedding_cache", init_embedding_cache)
+
+
+# recent result sets, so one query's text, sources and translations share a single retrieval
+search_results = LRUCache(SEARCH_RESULT_CACHE_SIZE, ttl=SEARCH_RESULT_CACHE_TTL)
+
 
 def init_pinecone():
+    # imported here, so that the app starts without waiting for the pinecone client
+    import pinecone
+
     pinecone.init(api_key= PINECONE_API_KEY,
             environment=PINECONE_ENV)
     index = pinecone.Index(COLLECTION)
     return index
 
 
-    
+def init_index():
+    """Opens the vector index used for wiki search, either the hosted Pinecone index or a local in-process one."""
+    if SEARCH_BACKEND == "local":
+        return LocalVectorIndex.load(
+            os.path.join(os.path.dirname(CWD), LOCAL_INDEX_PATH), exact_threshold=EXACT_SEARCH_MAX_VECTORS
+        )
+    return init_pinecone()
+
+
+def get_index():
+    """Returns the wiki search index, opening it on first use rather than at import time."""
+    return shared("wiki_index", init_index)
+
+
+def init_full_text_index():
+    """Opens the full-text index written by the ingestion script, or indexes the articles of a local vector index."""
+    path = os.path.join(os.path.dirname(CWD), FULL_TEXT_INDEX_PATH)
+    if os.path.exists(path):
+        return FullTextIndex.load(path)
+    full_text_index = FullTextIndex()
+    index = get_index()
+    if isinstance(index, LocalVectorIndex):
+        full_text_index.upsert(zip(index.ids, index.metadata))
+    return full_text_index
+
+
+def get_full_text_index():
+    """Returns the full-text index of the wiki articles, opening it on first use."""
+    return shared("full_text_index", init_full_text_index)
 
-index = init_pinecone()
+
+def full_text_search_available() -> bool:
+    """
+    Whether full-text search has articles to search, without opening the index: the ingestion script wrote a
+    full-text index, or the local backend's vector index is searched by full text directly.
+    """
+    return SEARCH_BACKEND == "local" or os.path.exists(os.path.join(os.path.dirname(CWD), FULL_TEXT_INDEX_PATH))
+
+
+def _embed_texts(texts: List[str]) -> List[List[float]]:
+    with span("embed_batch", payload_size=sum(len(text) for text in texts), batch_size=len(texts)):
+        embeddings = call(MODEL_NAME, get_cohere_client().embed, texts=texts, model=MODEL_NAME)
+    return embeddings.embeddings
+
+
+# queries of concurrent searches are embedded together, one embed request per batch; the queue of waiting queries
+# isn't bounded, since the app's search endpoint already limits how many searches run and wait at a time
+query_embedder = MicroBatcher(
+    _embed_texts,
+    max_batch_size=EMBED_BATCH_MAX_SIZE,
+    max_wait=EMBED_BATCH_WINDOW,
+    max_concurrent_batches=EMBED_BATCH_CONCURRENCY,
+    name="embed-batch",
+)
+
+
+def _embed_text(text):
+    # users submitting the same query at the same moment share one embedding, even across batches
+    return single_flight.do((MODEL_NAME, request_key("embed", text)), query_embedder, text)
 
 
 def embed_user_query(user_query):
+    with span("embed_user_query", payload_size=len(user_query)) as record:
+        # repeated queries are served from the embedding cache instead of the embed endpoint
+        embedding_cache = get_embedding_cache()
+        query_embedding = embedding_cache.get(user_query)
+        record["cache_hit"] = query_embedding is not None
+        if query_embedding is None:
+            query_embedding = _embed_text(normalize_query(user_query))
+            embedding_cache.set(user_query, query_embedding)
+    return query_embedding, user_query
 
-    embeddings = cohere_client.embed(
-        texts=[user_query],
-        model=MODEL_NAME,
-    )
-    query_embedding = embeddings.embeddings[0]
+
+async def aembed_user_query(user_query):
+    """Asyncio variant of `embed_user_query`, using the shared async Cohere client."""
+    with span("embed_user_query", payload_size=len(user_query)) as record:
+        embedding_cache = get_embedding_cache()
+        query_embedding = embedding_cache.get(user_query)
+        record["cache_hit"] = query_embedding is not None
+        if query_embedding is None:
+            embeddings = await acall(
+                MODEL_NAME,
+                get_async_cohere_client().embed,
+                texts=[normalize_query(user_query)],
+                model=MODEL_NAME,
+                key=request_key("embed", normalize_query(user_query)),
+            )
+            query_embedding = embeddings.embeddings[0]
+            embedding_cache.set(user_query, query_embedding)
     return query_embedding, user_query
 
 
+LANGUAGE_CODES = {
+    "English": "en",
+    "Yoruba": "yo",
+    "Igbo": "ig",
+    "Hausa": "ha",
+}
+
+
+@dataclass
+class SearchResult:
+    title: str
+    text: str
+    url: str
+    lang: str
+    score: float
+
+
+def _language_filter(languages):
+    # narrow down search results to the selected languages
+    if not languages:
+        return None
+    return {'lang': {'$in': [LANGUAGE_CODES[lang] for lang in languages]}}
+
+
+def query_wiki_index(
+    query_embedding,
+    num_results = 3,
+    languages = [],
+    include_values = False,
+):
+    filter = _language_filter(languages)
+    with span("index.query", top_k=num_results, languages=languages) as record:
+        query_results = get_index().query(
+            top_k=num_results,
+            include_metadata=True,
+            include_values=include_values,
+            vector=query_embedding,
+            filter=filter,
+        )
+        record["matches"] = len(query_results["matches"])
+    return query_results["matches"]
+
+
+def diverse_wiki_matches(query_embedding, num_results = 3, languages = []):
+    """
+    Retrieves `RERANK_CANDIDATES` matches with their vectors and keeps the `num_results` best by maximal marginal
+    relevance, dropping near-duplicates such as the same article in another language, so that every result slot
+    shows a different article.
+    """
+    candidates = query_wiki_index(
+        query_embedding, max(num_results, RERANK_CANDIDATES), languages, include_values=True
+    )
+    with span("rerank", candidates=len(candidates)) as record:
+        matches = rerank(
+            query_embedding,
+            candidates,
+            num_results,
+            lambda_=MMR_LAMBDA,
+            duplicate_threshold=DUPLICATE_SIMILARITY,
+        )
+        record["matches"] = len(matches)
+    return matches
+
+
 def search_wiki_for_query(
     query_embedding,
     num_results = 3,
     languages = [],
 ):
+    matches = diverse_wiki_matches(query_embedding, num_results, languages)
+    metadata = [record["metadata"] for record in matches]
 
+    return metadata
 
-    language_mapping = {
-        "English": "en",
-        "Yoruba": "yo",
-        "Igbo": "ig",
-        "Hause": "ha",
-    }
-
-    # index.query(query_embedding, top_k=num_results, include_metadata=True)
-
-    # prepare filters to narrow down search results
-    # if the `match_text` list is not empty then create filter to find exact matching text in the documents
-    query_results = index.query(
-        top_k=3,
-        include_metadata=True,
-        vector= query_embedding,
-        filter={
-            'lang': {'$in': [language_mapping[lang] for lang in languages]}
-        }
-    )
 
-    metadata = [record["metadata"] for record in query_results["matches"]]
+def full_text_search(user_input: str, num_results: int = 3, languages = []) -> List[dict]:
+    """
+    Searches the wiki articles by their words rather than their meaning. Articles whose title is the query, such as
+    the name of a person or place, come first and are returned without calling the embedding endpoint. Otherwise the
+    BM25 results are fused with the vector search results by reciprocal rank when `FULL_TEXT_FUSION` is enabled.
+        Args:
+            user_input (`str`):
+                The search query.
+            num_results (`int`, *optional*, defaults to 3):
+                The number of results to retrieve.
+            languages (`List[str]`):
+                Names of the languages to search in. Searches all languages if empty.
+        Returns:
+            matches (`List[dict]`):
+                Matches with the article in their `metadata`, best match first.
+    """
+    full_text_index = get_full_text_index()
+    filter = _language_filter(languages)
+    with span("full_text.query", payload_size=len(user_input)) as record:
+        title_matches = full_text_index.lookup_title(
+            user_input, top_k=num_results, include_metadata=True, filter=filter
+        )["matches"]
+        word_matches = full_text_index.query(
+            user_input, top_k=FUSION_CANDIDATES, include_metadata=True, filter=filter
+        )["matches"]
+        record["title_match"] = bool(title_matches)
+    if title_matches:
+        title_ids = {match["id"] for match in title_matches}
+        return (title_matches + [m for m in word_matches if m["id"] not in title_ids])[:num_results]
+    if not FULL_TEXT_FUSION:
+        return word_matches[:num_results]
 
-    return metadata
+    query_embedding, _ = embed_user_query(user_input)
+    vector_matches = query_wiki_index(query_embedding, FUSION_CANDIDATES, languages)
+    return reciprocal_rank_fusion([word_matches, vector_matches], k=FUSION_RRF_K)[:num_results]
+
+
+def search(
+    user_input: str, num_results: int = 3, languages = [], text_match: bool = False
+) -> List[SearchResult]:
+    """
+    Runs the embed + vector query + re-ranking pipeline once for a query and returns structured results.
+    Result sets are kept for a short time per (query, languages, k), so the search results, their
+    sources and their translations all reuse one retrieval.
+        Args:
+            user_input (`str`):
+                The search query.
+            num_results (`int`, *optional*, defaults to 3):
+                The number of results to retrieve.
+            languages (`List[str]`):
+                Names of the languages to search in, e.g. ['Yoruba', 'Hausa']. Searches all languages if empty.
+            text_match (`bool`, *optional*, defaults to False):
+                Whether to search by the words of the query with `full_text_search` instead of by its meaning.
+        Returns:
+            results (`List[SearchResult]`):
+                The matching articles, best match first.
+    """
+    num_results = int(num_results)
+    text_match = bool(text_match)
+    key = (normalize_query(user_input), tuple(sorted(languages or [])), num_results, text_match)
+    with span("search", payload_size=len(user_input), text_match=text_match) as record:
+        results = search_results.get(key)
+        record["cache_hit"] = results is not None
+        if results is None:
+            if text_match:
+                matches = full_text_search(user_input, num_results, languages)
+            else:
+                query_embedding, _ = embed_user_query(user_input)
+                matches = diverse_wiki_matches(query_embedding, num_results, languages)
+            results = [
+                SearchResult(
+                    title=match["metadata"]["title"],
+                    text=match["metadata"]["text"],
+                    url=match["metadata"]["url"],
+                    lang=match["metadata"]["lang"],
+                    score=match["score"],
+                )
+                for match in matches
+            ]
+            search_results.set(key, results)
+    return results
+
+
+def _pad(values: List[str], num_results: int) -> List[str]:
+    # the UI always has one output component per requested result
+    return values + [""] * (num_results - len(values))
 
 
 def cross_lingual_document_search(
     user_input: str, num_results: int, languages, text_match
 ) -> List:
-    # create an embedding for the input query
-    query_embedding, _ = embed_user_query(user_input)
+    results = search(user_input, num_results, languages, text_match)
 
-    # retrieve search results
-    metadata = search_wiki_for_query(
-        query_embedding,
-        num_results,
-        languages,
-    )
+    texts = [result.title + "\n" + result.text for result in results]
+    url_list = [result.url + "\n\n" for result in results]
 
-    results = [result['title']+"\n"+result['text'] for result in metadata]
-    url_list = [result['url'] + "\n\n" for result in metadata]
+    if PREFETCH_TRANSLATIONS:
+        # translate in the background so the 'Translate Text' buttons answer from the cache
+        prefetch(text for text, result in zip(texts, results) if result.lang != "en")
 
-    return results + url_list
-    url_list = [result['url'] + "\n\n" for result in metadata]
+    return _pad(texts, num_results) + _pad(url_list, num_results)
 
-    return results + url_list
 
 def document_source(
     user_input: str, num_results: int, languages, text_match
 ) -> List:
-    query_embedding, _ = embed_user_query(user_input)
-
-    # retrieve search results
-    metadata = search_wiki_for_query(
-        query_embedding,
-        num_results,
-        languages,
-    )
-
-    results = [result['url'] for result in metadata]
+    results = search(user_input, num_results, languages, text_match)
 
-    if num_results > len(results):
-        remaining_inputs = num_results - len(results)
-        for input in range(remaining_inputs):
-            results.append("")
+    return _pad([result.url for result in results], num_results)
 
-    return results
 
 def translate_text(doc):
-    doc = " ".join(doc.split()[:4800])
-    result = translator.translate(doc, target_language='en')
-    return result
+    return translate(doc, target_language='en')
 
 def translate_search_result():
     pass
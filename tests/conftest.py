@@ -0,0 +1,18 @@
+import pytest
+
+from src import clients, document_utils, outbound
+
+
+@pytest.fixture
+def stub_services(monkeypatch):
+    """Runs the pipelines against the benchmark stand-ins without simulated latency, restoring the clients afterwards."""
+    from benchmarks.run import install_stubs, reset_caches
+    from benchmarks.stubs import Latency
+
+    monkeypatch.setattr(clients, "_clients", dict(clients._clients))
+    monkeypatch.setattr(outbound, "_limiters", {})
+    monkeypatch.setattr(outbound, "OUTBOUND_RATE_LIMITS", outbound.OUTBOUND_RATE_LIMITS)
+    monkeypatch.setattr(outbound, "OUTBOUND_DEFAULT_RATE_LIMIT", outbound.OUTBOUND_DEFAULT_RATE_LIMIT)
+    monkeypatch.setattr(document_utils, "document_indexes", document_utils.document_indexes)
+    install_stubs(Latency(0, 0, 0, 0, 0, 0), corpus_size=200)
+    reset_caches()
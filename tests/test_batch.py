@@ -0,0 +1,92 @@
+import json
+
+from src.batch import completed_jobs, read_documents, run_batch
+
+
+def read_lines(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_read_jsonl_reports_records_without_text(tmp_path):
+    path = tmp_path / "documents.jsonl"
+    path.write_text(
+        "\n".join(
+            [
+                json.dumps({"id": "a", "text": "First."}),
+                json.dumps({"id": "b", "text": "", "document": "Second."}),
+                json.dumps({"id": "c", "text": ""}),
+                "{not json",
+                json.dumps({"text": "Fifth."}),
+            ]
+        ),
+        encoding="utf-8",
+    )
+
+    documents = list(read_documents(str(path)))
+
+    assert documents[0] == {"id": "a", "text": "First."}
+    assert documents[1] == {"id": "b", "text": "Second."}
+    assert documents[2]["id"] == "c" and "error" in documents[2]
+    assert documents[3]["id"] == "4" and "not valid JSON" in documents[3]["error"]
+    assert documents[4] == {"id": "5", "text": "Fifth."}
+
+
+def test_read_directory_uses_relative_paths_as_ids(tmp_path):
+    (tmp_path / "unit-1").mkdir()
+    (tmp_path / "unit-1" / "notes.md").write_text("Notes.", encoding="utf-8")
+    (tmp_path / "intro.txt").write_text("Intro.", encoding="utf-8")
+    (tmp_path / "broken.txt").write_bytes(b"\xff\xfe\xfa")
+    (tmp_path / "image.png").write_bytes(b"")
+
+    documents = list(read_documents(str(tmp_path)))
+
+    assert [document["id"] for document in documents] == ["broken.txt", "intro.txt", "unit-1/notes.md"]
+    assert "error" in documents[0]
+    assert documents[1]["text"] == "Intro."
+
+
+def test_run_batch_records_failures_without_stopping(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+
+    def shout(text):
+        if text == "fail":
+            raise RuntimeError("boom")
+        return text.upper()
+
+    documents = [{"id": "a", "text": "hello"}, {"id": "b", "text": "fail"}, {"id": "c", "error": "no text"}]
+    counts = run_batch(documents, {"shout": shout, "count": lambda text: str(len(text))}, output, workers=2)
+
+    assert counts == {"completed": 3, "failed": 3, "skipped": 0}
+    lines = {(line["id"], line["operation"]): line for line in read_lines(output)}
+    assert lines[("a", "shout")]["result"] == "HELLO"
+    assert lines[("b", "shout")]["error"] == "RuntimeError: boom"
+    assert lines[("b", "count")]["result"] == "4"
+    assert lines[("c", "count")]["error"] == "no text"
+
+
+def test_run_batch_resumes_and_retries_failed_jobs(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text(
+        json.dumps({"id": "a", "operation": "shout", "result": "HELLO", "seconds": 0.1})
+        + "\n"
+        + json.dumps({"id": "b", "operation": "shout", "error": "RuntimeError: boom"})
+        + "\n"
+        # the last line of a run killed while writing it
+        + '{"id": "c", "operat',
+        encoding="utf-8",
+    )
+    assert completed_jobs(str(output)) == {("a", "shout")}
+
+    calls = []
+
+    def shout(text):
+        calls.append(text)
+        return text.upper()
+
+    documents = [{"id": "a", "text": "hello"}, {"id": "b", "text": "again"}, {"id": "c", "text": "new"}]
+    counts = run_batch(documents, {"shout": shout}, str(output), workers=1, jobs_per_second=None)
+
+    assert counts == {"completed": 2, "failed": 0, "skipped": 1}
+    assert sorted(calls) == ["again", "new"]
+    assert completed_jobs(str(output)) == {("a", "shout"), ("b", "shout"), ("c", "shout")}
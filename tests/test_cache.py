@@ -0,0 +1,130 @@
+import math
+from types import SimpleNamespace
+
+import pytest
+
+from src import cache
+from src.cache import EmbeddingCache, LRUCache, SemanticAnswerCache, SQLiteVectorStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=clock, time=clock))
+    return clock
+
+
+def test_lru_cache_evicts_the_least_recently_used_entry():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+
+    lru.set("c", 3)
+
+    assert "b" not in lru
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 0, "evictions": 1}
+
+
+def test_lru_cache_entries_expire_after_their_ttl(clock):
+    lru = LRUCache(ttl=10)
+    lru.set("a", 1)
+
+    clock.now = 9.9
+    assert lru.get("a") == 1
+    clock.now = 10.0
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+    # setting the entry again restarts its ttl
+    lru.set("a", 2)
+    clock.now = 19.9
+    assert "a" in lru
+    assert lru.stats()["evictions"] == 1
+
+
+def test_vector_store_caps_its_size_by_last_use(tmp_path, clock):
+    store = SQLiteVectorStore(str(tmp_path / "vectors.db"), max_entries=3)
+    for text in ["a", "b", "c"]:
+        clock.now += 1
+        store.set("model", text, [1.0])
+    clock.now += 1
+    assert store.get("model", "a") == [1.0]
+    clock.now += 1
+    store.set("model", "c", [2.0])
+
+    clock.now += 1
+    store.set("model", "d", [3.0])
+
+    assert len(store) == 3
+    assert store.get("model", "b") is None
+    assert [store.get("model", text) for text in ["a", "c", "d"]] == [[1.0], [2.0], [3.0]]
+    assert len(SQLiteVectorStore(store.path, max_entries=3)) == 3
+
+
+def test_embedding_cache_promotes_disk_hits_to_memory(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    EmbeddingCache("embed-v1", disk_path=path).set("Hello   World", [0.5, 0.25])
+
+    # a restarted process only has the disk tier
+    restarted = EmbeddingCache("embed-v1", disk_path=path)
+    assert restarted.get("hello world") == [0.5, 0.25]
+    assert restarted.get("HELLO WORLD") == [0.5, 0.25]
+
+    stats = restarted.stats()
+    assert (stats["hits"], stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (2, 1, 1, 0)
+
+
+def test_embedding_cache_drops_vectors_of_other_models(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    EmbeddingCache("embed-v1", disk_path=path).set("query", [1.0])
+
+    upgraded = EmbeddingCache("embed-v2", disk_path=path)
+    computed = []
+
+    assert upgraded.get_or_compute("Query", lambda text: computed.append(text) or [2.0]) == [2.0]
+    assert computed == ["query"]
+    assert upgraded.stats()["disk_size"] == 1
+
+
+def unit(degrees):
+    return [math.cos(math.radians(degrees)), math.sin(math.radians(degrees))]
+
+
+def test_semantic_cache_serves_answers_above_the_threshold():
+    answers = SemanticAnswerCache(threshold=0.95)
+    answers.set("doc", unit(0), "Photosynthesis turns light into sugar.")
+
+    answer, similarity = answers.get("doc", [2 * x for x in unit(10)])
+    assert answer == "Photosynthesis turns light into sugar."
+    assert similarity == pytest.approx(math.cos(math.radians(10)))
+
+    # cos(20°) is below 0.95
+    assert answers.get("doc", unit(20)) == (None, pytest.approx(math.cos(math.radians(20))))
+    assert answers.get("other-doc", unit(0)) == (None, 0.0)
+
+
+def test_semantic_cache_returns_the_closest_unexpired_answer(clock):
+    answers = SemanticAnswerCache(threshold=0.9, ttl=60, max_answers=2)
+    answers.set("doc", unit(0), "old")
+    clock.now = 30
+    answers.set("doc", unit(5), "new")
+
+    assert answers.get("doc", unit(4))[0] == "new"
+    clock.now = 60
+    assert answers.get("doc", unit(0))[0] == "new"
+
+    # the expired answer and then the oldest one make room for new answers
+    answers.set("doc", unit(90), "third")
+    answers.set("doc", unit(180), "fourth")
+    assert answers.get("doc", unit(5))[0] is None
+    assert answers.get("doc", unit(90))[0] == "third"
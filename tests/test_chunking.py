@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from src.chunking import TOKEN, content_defined_chunks, token_chunks
+
+
+def random_text(seed):
+    """Paragraphs of sentences of varied length, with every word unique so a chunk is found at exactly one offset."""
+    rng = random.Random(seed)
+    words = (f"w{i}" for i in range(10**6))
+    paragraphs = []
+    for _ in range(rng.randint(1, 6)):
+        sentences = []
+        for _ in range(rng.randint(1, 8)):
+            length = rng.choice([1, 3, 8, 15, 40])
+            sentence = " ".join(next(words) + rng.choice(["", "", "", ","]) for _ in range(length))
+            sentences.append(sentence.rstrip(",") + rng.choice([".", "!", "?"]))
+        paragraphs.append(rng.choice([" ", "  ", "\n"]).join(sentences))
+    return rng.choice(["", "  "]) + "\n\n".join(paragraphs) + rng.choice(["", "\n"])
+
+
+def spans(text, chunks):
+    """Offsets of each chunk in `text`, which must be slices of it in order."""
+    found = []
+    for chunk in chunks:
+        start = text.find(chunk, found[-1][0] + 1 if found else 0)
+        assert start >= 0, chunk
+        found.append((start, start + len(chunk)))
+    return found
+
+
+def covered(text, found):
+    in_chunk = [False] * len(text)
+    for start, end in found:
+        in_chunk[start:end] = [True] * (end - start)
+    return all(in_chunk[i] for i, char in enumerate(text) if not char.isspace())
+
+
+def count_tokens(text):
+    return len(TOKEN.findall(text))
+
+
+@pytest.mark.parametrize("seed", range(30))
+@pytest.mark.parametrize("max_tokens,overlap_tokens", [(20, 0), (50, 10), (12, 11)])
+def test_token_chunks_respect_budget_and_overlap_and_cover_the_text(seed, max_tokens, overlap_tokens):
+    text = random_text(seed)
+
+    chunks = token_chunks(text, max_tokens, overlap_tokens)
+    found = spans(text, chunks)
+
+    assert chunks and all(chunk == chunk.strip() for chunk in chunks)
+    assert all(count_tokens(chunk) <= max_tokens for chunk in chunks)
+    assert covered(text, found)
+    for (previous_start, previous_end), (start, end) in zip(found, found[1:]):
+        assert start > previous_start and end > previous_end
+        assert count_tokens(text[start:previous_end]) <= overlap_tokens
+
+
+def test_token_chunks_end_at_paragraph_breaks():
+    paragraph = " ".join(f"Sentence {i} here." for i in range(4))
+    text = f"{paragraph}\n\n{paragraph}\n\n{paragraph}"
+
+    # a paragraph is 16 tokens, so a budget of 24 would also fit half of the next one
+    assert token_chunks(text, 24) == [paragraph] * 3
+    assert token_chunks(text, 40) == [f"{paragraph}\n\n{paragraph}", paragraph]
+
+
+def test_token_chunks_overlap_whole_sentences():
+    text = "One two three. Four five six. Seven eight nine. Ten eleven twelve."
+
+    assert token_chunks(text, 8, overlap_tokens=4) == [
+        "One two three. Four five six.",
+        "Four five six. Seven eight nine.",
+        "Seven eight nine. Ten eleven twelve.",
+    ]
+    with pytest.raises(ValueError):
+        token_chunks(text, 8, overlap_tokens=8)
+
+
+def test_empty_text_has_no_chunks():
+    assert token_chunks(" \n\n ", 10) == []
+    assert content_defined_chunks(" \n\n ", 10, 100) == []
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_content_defined_chunks_are_bounded_and_cover_the_text(seed):
+    text = random_text(seed)
+
+    chunks = content_defined_chunks(text, min_chars=100, max_chars=400)
+    found = spans(text, chunks)
+
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert covered(text, found)
+    # content-defined chunks never overlap
+    assert all(end <= start for (_, end), (start, _) in zip(found, found[1:]))
+
+
+def test_content_defined_chunks_only_change_around_an_edit():
+    sentences = [f"Sentence number {i} talks about topic {i * 7 % 13}." for i in range(200)]
+    edited = list(sentences)
+    edited[100] = "This sentence was rewritten entirely."
+
+    before = content_defined_chunks(" ".join(sentences), min_chars=200, max_chars=800)
+    after = content_defined_chunks(" ".join(edited), min_chars=200, max_chars=800)
+
+    assert len(before) > 10
+    assert len(set(before) - set(after)) <= 2
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import threading
+
+import pytest
+import requests
+from cohere.error import CohereConnectionError
+
+from src import clients
+from src.clients import get_async_cohere_client, override_clients, shared
+from src.cohere_client import PooledCohereClient
+
+
+def test_shared_creates_each_client_once(monkeypatch):
+    monkeypatch.setattr(clients, "_clients", {})
+    created = []
+
+    def create():
+        created.append(object())
+        return created[-1]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(shared("test", create))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(result is created[0] for result in results)
+
+    override_clients(test="stub")
+    assert shared("test", create) == "stub"
+
+
+def json_response(body, status=200):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode("utf-8")
+    return response
+
+
+def test_pooled_client_sends_every_request_through_one_session(monkeypatch):
+    client = PooledCohereClient("key", check_api_key=False, max_retries=2, pool_size=5)
+    sent = []
+
+    def request(method, url, **kwargs):
+        sent.append((method, url, kwargs["headers"]["Authorization"]))
+        return json_response({"embeddings": [[0.5]]})
+
+    monkeypatch.setattr(client._session, "request", request)
+
+    assert client._request("embed", json={"texts": ["a"]}) == {"embeddings": [[0.5]]}
+    client._request("embed", json={"texts": ["b"]})
+
+    assert sent == [("POST", f"{client.api_url}/{client.api_version}/embed", "BEARER key")] * 2
+    adapter = client._session.get_adapter(client.api_url)
+    assert adapter._pool_maxsize == 5
+    # 429s are left to `src.outbound`, which backs off with jitter
+    assert adapter.max_retries.total == 2 and 429 not in adapter.max_retries.status_forcelist
+
+
+def test_pooled_client_wraps_connection_errors(monkeypatch):
+    client = PooledCohereClient("key", check_api_key=False)
+
+    def request(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("refused")
+
+    monkeypatch.setattr(client._session, "request", request)
+
+    with pytest.raises(CohereConnectionError, match="refused"):
+        client._request("embed", json={})
+
+
+def test_each_event_loop_gets_its_own_async_client():
+    async def twice():
+        return get_async_cohere_client(), get_async_cohere_client()
+
+    first, same = asyncio.run(twice())
+    second, _ = asyncio.run(twice())
+
+    assert first is same
+    assert second is not first
@@ -0,0 +1,218 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import concurrency
+from src.concurrency import EndpointBusyError, EndpointLimiter, MicroBatcher, RateLimiter
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+class GatedProcess:
+    """Records every batch and holds it until `gate` is set, so the next items pile up."""
+
+    def __init__(self, results=lambda items: [item.upper() for item in items]):
+        self.results = results
+        self.batches = []
+        self.gate = threading.Event()
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        self.gate.wait(5)
+        return self.results(items)
+
+
+def test_items_arriving_while_busy_share_one_batch_without_duplicates():
+    process = GatedProcess()
+    batcher = MicroBatcher(process, max_batch_size=10, max_wait=0.5, max_concurrent_batches=1)
+
+    first = batcher.submit("a")
+    # the idle batcher sends the first item right away
+    wait_until(lambda: process.batches == [["a"]])
+    futures = [batcher.submit(item) for item in ["b", "c", "b", "d"]]
+    process.gate.set()
+
+    assert first.result(5) == "A"
+    assert [future.result(5) for future in futures] == ["B", "C", "B", "D"]
+    assert process.batches == [["a"], ["b", "c", "d"]]
+
+
+def test_batches_hold_at_most_max_batch_size_items():
+    process = GatedProcess()
+    batcher = MicroBatcher(process, max_batch_size=2, max_wait=0.5, max_concurrent_batches=1)
+
+    batcher.submit("a")
+    wait_until(lambda: len(process.batches) == 1)
+    futures = [batcher.submit(item) for item in "bcdef"]
+    process.gate.set()
+
+    assert [future.result(5) for future in futures] == list("BCDEF")
+    assert process.batches == [["a"], ["b", "c"], ["d", "e"], ["f"]]
+
+
+def test_an_error_reaches_every_caller_of_the_batch():
+    process = GatedProcess(results=lambda items: 1 / 0)
+    batcher = MicroBatcher(process, max_batch_size=10, max_wait=0.5, max_concurrent_batches=1)
+
+    futures = [batcher.submit("a")]
+    wait_until(lambda: len(process.batches) == 1)
+    futures += [batcher.submit(item) for item in "bb"]
+    process.gate.set()
+
+    errors = [future.exception(5) for future in futures]
+    assert all(isinstance(error, ZeroDivisionError) for error in errors)
+    assert errors[1] is errors[2]
+
+
+def test_a_result_per_item_is_required():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=10, max_wait=0, name="embed-batch")
+
+    with pytest.raises(RuntimeError, match="embed-batch returned 0 results for 1 items"):
+        batcher("a")
+
+
+def test_submit_blocks_while_the_queue_is_full():
+    process = GatedProcess()
+    batcher = MicroBatcher(process, max_batch_size=1, max_wait=0, max_concurrent_batches=1, max_queue_size=1)
+
+    batcher.submit("a")
+    wait_until(lambda: len(process.batches) == 1)
+    # taken off the queue by the collector, which then waits for the busy batch
+    batcher.submit("b")
+    wait_until(lambda: batcher._queue.qsize() == 0)
+    batcher.submit("c")
+    blocked = threading.Thread(target=batcher.submit, args=("d",))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+
+    process.gate.set()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    wait_until(lambda: len(process.batches) == 4)
+
+
+def hold_slot(limiter):
+    """Runs a call holding one of the limiter's slots until the returned event is set."""
+    release = threading.Event()
+    thread = threading.Thread(target=limiter.wrap(release.wait), args=(5,))
+    thread.start()
+    return release, thread
+
+
+def test_a_full_endpoint_rejects_calls_without_waiting():
+    limiter = EndpointLimiter("search", max_concurrency=1, max_waiting=1)
+    release, running = hold_slot(limiter)
+    wait_until(lambda: limiter.running == 1)
+    waiter = threading.Thread(target=limiter.wrap(lambda: None))
+    waiter.start()
+    wait_until(lambda: limiter.waiting == 1)
+
+    started = time.perf_counter()
+    with pytest.raises(EndpointBusyError, match="The search service is busy"):
+        limiter.wrap(lambda: None)()
+    assert time.perf_counter() - started < 0.5
+
+    release.set()
+    running.join(5)
+    waiter.join(5)
+    assert limiter.stats()["rejected"] == 1
+    assert (limiter.running, limiter.waiting) == (0, 0)
+    assert len(limiter.wait_times) == 2
+
+
+def test_the_busy_error_can_be_replaced():
+    limiter = EndpointLimiter("summarize", max_concurrency=1, max_waiting=0, busy_error=ValueError)
+    release, running = hold_slot(limiter)
+    wait_until(lambda: limiter.running == 1)
+
+    with pytest.raises(ValueError):
+        limiter.wrap(lambda: None)()
+
+    release.set()
+    running.join(5)
+
+
+def test_a_generator_holds_its_slot_until_it_is_exhausted():
+    limiter = EndpointLimiter("generate", max_concurrency=1, max_waiting=0)
+
+    @limiter.wrap
+    def stream(tokens):
+        yield from tokens
+
+    first = stream(["a", "b"])
+    # the slot is taken when the generator starts, not when it is created
+    assert limiter.running == 0
+    assert next(first) == "a"
+    assert limiter.running == 1
+    with pytest.raises(EndpointBusyError):
+        next(stream(["c"]))
+
+    assert list(first) == ["b"]
+    assert limiter.running == 0
+    assert list(stream(["c"])) == ["c"]
+
+
+def test_a_generator_closed_early_gives_its_slot_back():
+    limiter = EndpointLimiter("generate", max_concurrency=1, max_waiting=0)
+    stream = limiter.wrap(lambda: (yield from "abc"))
+
+    tokens = stream()
+    next(tokens)
+    tokens.close()
+
+    assert limiter.running == 0
+    assert list(stream()) == ["a", "b", "c"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(concurrency, "time", SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    return clock
+
+
+def test_rate_limiter_allows_a_burst_then_spaces_calls_out(clock):
+    limiter = RateLimiter(rate=2, burst=2)
+
+    # the burst starts right away, and callers behind it queue up half a second apart
+    assert [limiter.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+
+    clock.now = 1.0
+    # the two tokens refilled in the second are already promised to the queued callers
+    assert limiter.reserve() == 0.5
+
+    clock.now = 100.0
+    # a quiet period refills the bucket up to the burst, not beyond it
+    assert [limiter.reserve() for _ in range(3)] == [0.0, 0.0, 0.5]
+
+
+def test_rate_limiter_acquire_sleeps_for_its_reservation(clock):
+    limiter = RateLimiter(rate=4)
+
+    assert [limiter.acquire() for _ in range(3)] == [0.0, 0.25, 0.5]
+    assert clock.sleeps == [0.25, 0.5]
+
+
+def test_rate_limiter_needs_a_positive_rate():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
@@ -0,0 +1,122 @@
+import html
+import random
+import re
+
+import pytest
+
+from src.diff import _matching_pairs, _myers, diff_html, diff_words
+
+HIGHLIGHT = re.compile(r"<span style='background-color:lime;'>(.*?)</span>")
+
+
+def lcs_length(a, b):
+    lengths = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            lengths[i + 1][j + 1] = lengths[i][j] + 1 if x == y else max(lengths[i][j + 1], lengths[i + 1][j])
+    return lengths[-1][-1]
+
+
+def assert_valid_matches(matches, a, b):
+    assert all(a[i] == b[j] for i, j in matches)
+    assert all(i1 < i2 and j1 < j2 for (i1, j1), (i2, j2) in zip(matches, matches[1:]))
+
+
+def random_edit(rng, a, alphabet):
+    b = list(a)
+    for _ in range(rng.randint(0, 8)):
+        position = rng.randint(0, len(b))
+        operation = rng.choice(["insert", "delete", "replace"])
+        if operation == "insert" or not b:
+            b.insert(position, rng.choice(alphabet))
+        elif operation == "delete":
+            del b[min(position, len(b) - 1)]
+        else:
+            b[min(position, len(b) - 1)] = rng.choice(alphabet)
+    return b
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_myers_finds_a_longest_common_subsequence(seed):
+    rng = random.Random(seed)
+    a = [rng.randrange(4) for _ in range(rng.randint(0, 30))]
+    b = random_edit(rng, a, range(4))
+
+    matches = sorted(_myers(a, b, 0, len(a), 0, len(b), max_cost=100))
+
+    assert_valid_matches(matches, a, b)
+    assert len(matches) == lcs_length(a, b)
+
+
+def test_myers_gives_up_beyond_its_edit_budget():
+    assert _myers([1, 2, 3], [4, 5, 6], 0, 3, 0, 3, max_cost=5) is None
+    assert sorted(_myers([1, 2, 3], [1, 5, 3], 0, 3, 0, 3, max_cost=2)) == [(0, 0), (2, 2)]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_patience_anchors_agree_with_myers(seed):
+    rng = random.Random(seed)
+    # with every token unique, the patience anchors alone are a longest common subsequence
+    a = rng.sample(range(100), rng.randint(0, 40))
+    b = random_edit(rng, a, range(100, 200))
+    matches = _matching_pairs(a, b, max_cost=500)
+    assert_valid_matches(matches, a, b)
+    assert len(matches) == lcs_length(a, b) == len(_myers(a, b, 0, len(a), 0, len(b), max_cost=500))
+
+    # with repeated tokens the anchors are a heuristic, but the matches stay valid and close to optimal
+    a = [rng.randrange(6) for _ in range(rng.randint(0, 40))]
+    b = random_edit(rng, a, range(6))
+    matches = _matching_pairs(a, b, max_cost=500)
+    assert_valid_matches(matches, a, b)
+    assert len(matches) >= lcs_length(a, b) - 3
+
+
+def apply_opcodes(opcodes, a, b):
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            assert a[i1:i2] == b[j1:j2]
+            result += a[i1:i2]
+        else:
+            result += b[j1:j2]
+    return result
+
+
+@pytest.mark.parametrize("autojunk", [True, False])
+@pytest.mark.parametrize("seed", range(20))
+def test_opcodes_rebuild_the_revised_text(seed, autojunk):
+    rng = random.Random(seed)
+    words = ["the", "a", "of", "river", "Niger", "flows", "through", "Lokoja", ",", "."]
+    a = [rng.choice(words) for _ in range(rng.randint(0, 60))]
+    b = random_edit(rng, a, words)
+
+    opcodes, starts, ends = diff_words(" ".join(a), " ".join(b), autojunk=autojunk)
+
+    assert len(starts) == len(ends) == len(b)
+    assert apply_opcodes(opcodes, a, b) == b
+    assert [(i1, j1) for _, i1, _, j1, _ in opcodes] == [(0, 0)] + [(i2, j2) for _, _, i2, _, j2 in opcodes[:-1]]
+
+
+def test_diff_html_escapes_the_text_and_highlights_changes():
+    original = "if a < b then <b>bold</b>"
+    revised = "if a <= b then <b>bold</b> & done"
+
+    rendered = diff_html(original, revised)
+
+    assert "<b>" not in HIGHLIGHT.sub("", rendered)
+    assert html.unescape(HIGHLIGHT.sub(r"\1", rendered)) == revised
+    assert [html.unescape(change) for change in HIGHLIGHT.findall(rendered)] == ["=", "& done"]
+
+
+def test_diff_html_of_identical_texts_has_no_highlights():
+    text = "Lagos is the largest city in Nigeria.\n\nIt lies on the coast."
+
+    assert diff_html(text, text) == html.escape(text)
+
+
+def test_autojunk_merges_edits_separated_by_short_common_words():
+    original = "The king of Oyo ruled wisely."
+    revised = "The queen of Ife ruled wisely."
+
+    assert HIGHLIGHT.findall(diff_html(original, revised)) == ["queen of Ife"]
+    assert HIGHLIGHT.findall(diff_html(original, revised, autojunk=False)) == ["queen", "Ife"]
@@ -0,0 +1,77 @@
+import threading
+
+from src.document_index import DOCUMENT_PREFIX, DocumentIndexCache, split_document
+
+
+def counting_embed(calls, started=None, release=None):
+    def embed_texts(texts):
+        calls.append(list(texts))
+        if started is not None:
+            started.set()
+            release.wait(5)
+        return [[float(i), 1.0] for i in range(len(texts))]
+
+    return embed_texts
+
+
+DOCUMENT = "\n\n".join(" ".join(f"Paragraph {p} sentence {s}." for s in range(40)) for p in range(5))
+
+
+def test_a_document_is_split_and_embedded_once():
+    documents = DocumentIndexCache()
+    calls = []
+
+    index = documents.get_or_build(DOCUMENT, counting_embed(calls))
+
+    assert documents.get_or_build(DOCUMENT, counting_embed(calls)) is index
+    assert calls == [split_document(DOCUMENT)]
+    assert len(index) == len(calls[0]) > 1
+    match = index.query([0.0, 1.0], top_k=1, include_metadata=True)["matches"][0]
+    assert match["metadata"]["text"] in calls[0]
+
+
+def test_each_document_gets_its_own_index():
+    documents = DocumentIndexCache()
+    calls = []
+
+    first = documents.get_or_build(DOCUMENT, counting_embed(calls))
+    second = documents.get_or_build("Another, shorter document.", counting_embed(calls))
+
+    assert first is not second
+    assert calls[1] == ["Another, shorter document."]
+    assert all(name.startswith(DOCUMENT_PREFIX) for name in documents.namespaces._namespaces)
+
+
+def test_concurrent_questions_about_a_new_document_build_it_once():
+    documents = DocumentIndexCache()
+    calls = []
+    started, release = threading.Event(), threading.Event()
+    embed_texts = counting_embed(calls, started, release)
+    indexes = []
+
+    def ask():
+        with documents.use(DOCUMENT, embed_texts) as index:
+            indexes.append(index)
+
+    threads = [threading.Thread(target=ask) for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(indexes) == 4 and all(index is indexes[0] for index in indexes)
+
+
+def test_the_least_recently_used_document_is_evicted():
+    documents = DocumentIndexCache(maxsize=1)
+    calls = []
+
+    documents.get_or_build("First document.", counting_embed(calls))
+    documents.get_or_build("Second document.", counting_embed(calls))
+    documents.get_or_build("First document.", counting_embed(calls))
+
+    assert calls == [["First document."], ["Second document."], ["First document."]]
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from benchmarks.stubs import stub_embedding
+from src.constants import EXAMPLE_SUMMARY_EXTRACTIVENESS, EXAMPLE_SUMMARY_TEMPERATURE
+from src.document_index import split_document
+from src.examples import ExampleArtifacts, build_example_artifacts
+
+
+def test_built_artifacts_read_back_like_live_results(stub_services, tmp_path):
+    built = build_example_artifacts()
+    path = str(tmp_path / "examples.bin")
+    built.save(path)
+    loaded = ExampleArtifacts.load(path)
+
+    assert len(loaded.examples) == len(built.examples) > 0
+    for i in range(len(loaded.examples)):
+        document, question = loaded.document(i)
+
+        embedding = loaded.question_embedding(question)
+        # plain lists, like live embeddings, so request keys and the answer cache see the values
+        assert isinstance(embedding, list) and all(isinstance(value, float) for value in embedding)
+        assert embedding == pytest.approx(stub_embedding(question), abs=1e-6)
+        assert json.dumps(embedding)
+
+        chunks = split_document(document)
+        chunk_embeddings = loaded.chunk_embeddings(chunks)
+        assert isinstance(chunk_embeddings, list) and len(chunk_embeddings) == len(chunks)
+        for chunk, vector in zip(chunks, chunk_embeddings):
+            assert isinstance(vector, list)
+            assert vector == pytest.approx(stub_embedding(chunk), abs=1e-6)
+
+        assert loaded.answer(document, f"  {question.upper()} ") == built.examples[i]["answer"]
+        summary = loaded.summary(document, "short", "bullets", EXAMPLE_SUMMARY_EXTRACTIVENESS, EXAMPLE_SUMMARY_TEMPERATURE)
+        assert summary == built.examples[i]["summaries"]["short/bullets"]
+        assert loaded.questions(document) == built.examples[i]["questions"]
+
+
+def test_lookups_miss_for_other_inputs():
+    artifacts = ExampleArtifacts([{"document": "A text.", "question": "What?", "answer": "This."}])
+
+    assert artifacts.answer("A text.", "Why?") is None
+    assert artifacts.answer("Another text.", "What?") is None
+    assert artifacts.question_embedding("What?") is None
+    assert artifacts.chunk_embeddings(["A text."]) is None
+    assert artifacts.summary("A text.", "short", "bullets", "low", 0.3) is None
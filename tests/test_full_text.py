@@ -0,0 +1,45 @@
+import pytest
+
+from src.full_text import FullTextIndex, reciprocal_rank_fusion
+
+ScoredVector = pytest.importorskip("pinecone.core.client.model.scored_vector").ScoredVector
+
+
+def article(title, text, lang="en"):
+    return {"title": title, "text": text, "url": f"https://{lang}.wikipedia.org/wiki/{title}", "lang": lang}
+
+
+def test_fusion_accepts_pinecone_matches():
+    word_matches = [
+        {"id": "en-1", "score": 3.2, "metadata": article("Lagos", "Lagos is a city.")},
+        {"id": "en-2", "score": 1.1, "metadata": article("Abuja", "Abuja is the capital.")},
+    ]
+    vector_matches = [
+        ScoredVector(id="en-2", score=0.9, metadata=article("Abuja", "Abuja is the capital.")),
+        ScoredVector(id="en-3", score=0.8, metadata=article("Kano", "Kano is a city.")),
+    ]
+    fused = reciprocal_rank_fusion([word_matches, vector_matches], k=60)
+
+    assert [match["id"] for match in fused] == ["en-2", "en-1", "en-3"]
+    assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[2]["metadata"]["title"] == "Kano"
+    assert all(isinstance(match, dict) for match in fused)
+
+
+def test_fusion_of_matches_without_metadata():
+    fused = reciprocal_rank_fusion([[ScoredVector(id="en-1", score=0.5)], [{"id": "en-1", "score": 2.0}]])
+
+    assert fused == [{"id": "en-1", "score": pytest.approx(2 / 61), "metadata": None}]
+
+
+def test_full_text_query_ranks_matching_articles_first():
+    index = FullTextIndex()
+    index.upsert(
+        [
+            ("en-1", article("Photosynthesis", "Plants turn light into chemical energy.")),
+            ("en-2", article("Lagos", "Lagos is the largest city in Nigeria.")),
+        ]
+    )
+    matches = index.query("light energy plants", top_k=2, include_metadata=True)["matches"]
+
+    assert matches[0]["id"] == "en-1"
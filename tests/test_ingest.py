@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+import requests
+
+from src.ingest import Checkpoint, ingest, with_retries
+from src.vector_index import LocalVectorIndex
+
+
+def make_records(count):
+    return [{"id": str(i), "url": f"https://wiki/{i}", "title": f"Article {i}", "text": f"Text {i}."} for i in range(count)]
+
+
+def test_checkpoints_wait_for_the_batches_in_flight(tmp_path):
+    running = 0
+    lock = threading.Lock()
+    saves = []
+
+    def embed_texts(texts):
+        nonlocal running
+        with lock:
+            running += 1
+        try:
+            return [[1.0, float(len(text))] for text in texts]
+        finally:
+            with lock:
+                running -= 1
+
+    index = LocalVectorIndex()
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+
+    def on_checkpoint():
+        saves.append((running, len(index), checkpoint.offset))
+
+    indexed = ingest(
+        make_records(50), "yo", index, checkpoint, embed_texts, batch_size=4, on_checkpoint=on_checkpoint,
+        checkpoint_interval=0,
+    )
+
+    assert indexed == 50
+    assert len(saves) > 2
+    # nothing was embedding and the index held exactly the checkpointed records whenever it was saved
+    assert all(running == 0 and size == offset for running, size, offset in saves)
+    assert Checkpoint(checkpoint.path).offset == 50
+
+
+def test_ingest_resumes_after_the_checkpoint(tmp_path):
+    index = LocalVectorIndex()
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    checkpoint.offset = 30
+
+    indexed = ingest(make_records(50), "yo", index, checkpoint, lambda texts: [[1.0, 0.0]] * len(texts), batch_size=8)
+
+    assert indexed == 20
+    assert len(index) == 20
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+@pytest.mark.parametrize("error", [http_error(503), http_error(429), requests.ConnectionError(), TimeoutError()])
+def test_with_retries_retries_transient_errors(error):
+    calls = []
+
+    def upsert(vectors):
+        calls.append(vectors)
+        if len(calls) == 1:
+            raise error
+        return {"upserted_count": len(vectors)}
+
+    assert with_retries(upsert, [1, 2], backoff=0) == {"upserted_count": 2}
+    assert len(calls) == 2
+
+
+def test_with_retries_raises_client_errors_right_away():
+    calls = []
+
+    def upsert(vectors):
+        calls.append(vectors)
+        raise http_error(400)
+
+    with pytest.raises(requests.HTTPError):
+        with_retries(upsert, [1, 2], backoff=0)
+    assert len(calls) == 1
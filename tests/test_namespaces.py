@@ -0,0 +1,90 @@
+import time
+
+from src.namespaces import NamespaceRegistry
+
+
+def make_registry(ttl=None, maxsize=None, stored=()):
+    deleted = []
+    namespaces = NamespaceRegistry(
+        "test",
+        ttl,
+        maxsize,
+        delete_namespaces=deleted.extend,
+        list_namespaces=lambda: list(stored),
+        prefix="doc-",
+    )
+    return namespaces, deleted
+
+
+def test_acquire_creates_only_when_asked():
+    namespaces, _ = make_registry()
+
+    assert namespaces.acquire("doc-a") is None
+    namespace = namespaces.acquire("doc-a", create=lambda index: index)
+
+    assert namespace.refs == 1
+    assert "doc-a" in namespaces
+    assert namespaces.acquire("doc-a") is namespace
+    assert namespace.refs == 2
+
+
+def test_hold_releases_at_the_end_of_the_block():
+    namespaces, _ = make_registry()
+
+    with namespaces.hold("doc-a", create=lambda index: index) as namespace:
+        assert namespace.refs == 1
+    assert namespace.refs == 0
+
+
+def test_sweep_deletes_expired_namespaces_only_once_released():
+    namespaces, deleted = make_registry(ttl=60)
+    held = namespaces.acquire("doc-held", create=lambda index: index)
+    with namespaces.hold("doc-released", create=lambda index: index):
+        pass
+    with namespaces.hold("doc-recent", create=lambda index: index):
+        pass
+    for name in ("doc-held", "doc-released"):
+        namespaces._namespaces[name].last_used = time.monotonic() - 61
+
+    assert namespaces.sweep() == ["doc-released"]
+    assert deleted == ["doc-released"]
+    assert "doc-held" in namespaces and "doc-recent" in namespaces
+
+    namespaces.release(held)
+    held.last_used = time.monotonic() - 61
+    assert namespaces.sweep() == ["doc-held"]
+
+
+def test_maxsize_evicts_the_least_recently_used_unused_namespace():
+    namespaces, deleted = make_registry(maxsize=2)
+    for name in ("doc-a", "doc-b"):
+        with namespaces.hold(name, create=lambda index: index):
+            pass
+    namespaces.acquire("doc-a")
+
+    namespaces.acquire("doc-c", create=lambda index: index)
+
+    assert deleted == ["doc-b"]
+    assert len(namespaces) == 2
+
+
+def test_remove_keeps_namespaces_in_use():
+    namespaces, deleted = make_registry()
+    namespace = namespaces.acquire("doc-a", create=lambda index: index)
+
+    namespaces.remove("doc-a")
+    assert "doc-a" in namespaces
+
+    namespaces.release(namespace)
+    namespaces.remove("doc-a")
+    assert "doc-a" not in namespaces
+    assert deleted == ["doc-a"]
+
+
+def test_delete_orphans_only_deletes_unknown_prefixed_namespaces():
+    namespaces, deleted = make_registry(stored=["", "doc-live", "doc-orphan", "upload-other"])
+    namespaces.acquire("doc-live", create=lambda index: index)
+
+    assert namespaces.delete_orphans() == ["doc-orphan"]
+    assert deleted == ["doc-orphan"]
+
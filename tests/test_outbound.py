@@ -0,0 +1,200 @@
+import asyncio
+import io
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+import requests
+from cohere.responses.generation import StreamingGenerations
+
+from src import clients, document_utils, outbound
+from src.outbound import SingleFlight, acall, call, rate_limiter, set_rate_limits
+
+
+class HTTPError(Exception):
+    """Mimics the Cohere SDK's errors, which carry their status and headers."""
+
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.http_status = status
+        self.headers = headers or {}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_BACKOFF", 0.0)
+    monkeypatch.setattr(outbound, "_limiters", {})
+
+
+def flaky(failures, error):
+    calls = []
+
+    def fn(*args, **kwargs):
+        calls.append((args, kwargs))
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+
+    return fn, calls
+
+
+def test_call_retries_429_until_it_succeeds():
+    fn, calls = flaky(2, HTTPError(429))
+
+    assert call("test-model", fn, "text", model="x") == "ok"
+    assert calls == [(("text",), {"model": "x"})] * 3
+
+
+def test_call_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_MAX_RETRIES", 2)
+    fn, calls = flaky(10, HTTPError(429))
+
+    with pytest.raises(HTTPError):
+        call("test-model", fn)
+    assert len(calls) == 3
+
+
+def test_call_does_not_retry_other_errors():
+    fn, calls = flaky(1, HTTPError(400))
+
+    with pytest.raises(HTTPError):
+        call("test-model", fn)
+    assert len(calls) == 1
+
+
+def test_429s_from_requests_are_retried():
+    response = requests.Response()
+    response.status_code = 429
+    fn, calls = flaky(1, requests.HTTPError(response=response))
+
+    assert call("test-model", fn) == "ok"
+    assert len(calls) == 2
+
+
+def test_backoff_is_jittered_and_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_BACKOFF", 0.5)
+    monkeypatch.setattr(outbound, "OUTBOUND_MAX_BACKOFF", 10.0)
+
+    delays = [outbound._backoff(HTTPError(429), attempt=2) for _ in range(200)]
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert len(set(delays)) > 1
+    assert all(delay <= 10.0 for delay in (outbound._backoff(HTTPError(429), attempt=20) for _ in range(50)))
+
+    assert outbound._backoff(HTTPError(429, {"Retry-After": "3"}), attempt=0) >= 3
+    assert outbound._backoff(HTTPError(429, {"Retry-After": "3600"}), attempt=0) == 10.0
+    assert outbound._backoff(HTTPError(429, {"Retry-After": "soon"}), attempt=0) <= 0.5
+
+
+def test_rate_limits_are_per_model(monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_RATE_LIMITS", outbound.OUTBOUND_RATE_LIMITS)
+    monkeypatch.setattr(outbound, "OUTBOUND_DEFAULT_RATE_LIMIT", outbound.OUTBOUND_DEFAULT_RATE_LIMIT)
+    set_rate_limits({"embed-model": (20, 40)}, default=(1, 2))
+
+    embed, other = rate_limiter("embed-model"), rate_limiter("other-model")
+
+    assert (embed.rate, embed.burst) == (20, 40)
+    assert (other.rate, other.burst) == (1, 2)
+    assert rate_limiter("embed-model") is embed
+    # the default limiter's burst is used up by two calls, and the third waits for a token
+    assert [other.reserve() > 0 for _ in range(3)] == [False, False, True]
+
+
+def test_concurrent_identical_keys_make_one_call(monkeypatch):
+    callers = 5
+    joined = threading.Semaphore(0)
+    monkeypatch.setattr(outbound, "single_flight", SingleFlight(on_shared=lambda key: joined.release()))
+    calls = []
+
+    def embed(texts):
+        calls.append(texts)
+        # the request stays in flight until every other caller has joined it
+        for _ in range(callers - 1):
+            assert joined.acquire(timeout=5)
+        return [len(text) for text in texts]
+
+    results = [None] * callers
+
+    def search(i):
+        results[i] = call("test-model", embed, ["query"], key="embed:query")
+
+    threads = [threading.Thread(target=search, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [["query"]]
+    assert results == [[5]] * callers
+
+
+def test_single_flight_shares_exceptions_and_forgets_finished_calls():
+    joined = threading.Event()
+    flight = SingleFlight(on_shared=lambda key: joined.set())
+    errors = []
+
+    def fail():
+        # fails only once the second caller shares the call
+        joined.wait(5)
+        raise RuntimeError("boom")
+
+    def caller():
+        try:
+            flight.do("key", fail)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_acall_coalesces_identical_keys():
+    calls = []
+
+    async def embed(texts):
+        calls.append(texts)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(*(acall("test-model", embed, ["q"], key="k") for _ in range(4)))
+
+    assert asyncio.run(main()) == [1, 1, 1, 1]
+    assert len(calls) == 1
+
+
+def streamed_response(status, tokens=()):
+    response = requests.Response()
+    response.status_code = status
+    response.url = "https://api.cohere.ai/generate"
+    lines = [json.dumps({"text": token, "is_finished": False}) for token in tokens]
+    response.raw = io.BytesIO("\n".join(lines).encode("utf-8"))
+    return StreamingGenerations(response)
+
+
+def test_streamed_generate_retries_a_429_before_streaming(monkeypatch):
+    statuses = [429, 200]
+    requests_sent = []
+
+    def generate(stream=False, **kwargs):
+        requests_sent.append(kwargs["prompt"])
+        return streamed_response(statuses[len(requests_sent) - 1], ["Lagos", " is", " big"])
+
+    monkeypatch.setattr(clients, "_clients", {**clients._clients, "cohere": SimpleNamespace(generate=generate)})
+
+    assert list(document_utils._stream_generate("prompt", model="test-model")) == ["Lagos", "Lagos is", "Lagos is big"]
+    assert requests_sent == ["prompt", "prompt"]
+
+
+def test_streamed_generate_raises_client_errors(monkeypatch):
+    generate = lambda stream=False, **kwargs: streamed_response(401)
+    monkeypatch.setattr(clients, "_clients", {**clients._clients, "cohere": SimpleNamespace(generate=generate)})
+
+    with pytest.raises(requests.HTTPError):
+        list(document_utils._stream_generate("prompt", model="test-model"))
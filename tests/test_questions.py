@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src import clients, document_utils
+from src.questions import NoQuestionsError, format_questions, is_duplicate, parse_questions, question_bank
+
+
+def test_parse_questions_tolerates_the_usual_formats():
+    text = """Question 1: What is the capital of Nigeria?
+Answer: Abuja
+
+**Q2.** Who founded the Oyo Empire?
+**A2:** Oranyan
+
+3) Which river flows through Lokoja? Answer: Niger
+Question: Which city was the
+capital before 1991?
+Ans - Lagos
+Question 5: (question_5)
+Answer: (answer_5)
+Question 6: What has no answer?"""
+
+    assert parse_questions(text) == [
+        ("What is the capital of Nigeria?", "Abuja"),
+        ("Who founded the Oyo Empire?", "Oranyan"),
+        ("Which river flows through Lokoja?", "Niger"),
+        ("Which city was the capital before 1991?", "Lagos"),
+    ]
+
+
+def test_is_duplicate_compares_content_words():
+    questions = ["What is the capital of Nigeria?"]
+
+    assert is_duplicate("what is the CAPITAL of nigeria", questions)
+    assert is_duplicate("Which is the capital city of Nigeria?", questions, threshold=0.6)
+    assert not is_duplicate("What is the capital of Ghana?", questions)
+    assert not is_duplicate("Anything?", [])
+
+
+def test_question_bank_spreads_questions_across_levels():
+    candidates = {
+        "easy": [("Easy one?", "a"), ("Easy two?", "b"), ("Easy three?", "c")],
+        "medium": [("Medium one?", "d")],
+        "hard": [("Hard one?", "e"), ("Hard two?", "f")],
+    }
+
+    bank = question_bank(candidates, size=5)
+
+    # round robin over the levels, with the short medium level leaving its turns to the others, easy to hard
+    assert bank == [
+        ("easy", "Easy one?", "a"),
+        ("easy", "Easy two?", "b"),
+        ("medium", "Medium one?", "d"),
+        ("hard", "Hard one?", "e"),
+        ("hard", "Hard two?", "f"),
+    ]
+
+
+def test_question_bank_drops_duplicates_across_levels():
+    candidates = {
+        "easy": [("What is the capital of Nigeria?", "Abuja")],
+        "medium": [("What is the capital of Nigeria", "Abuja"), ("How are Lagos and Abuja related?", "Capitals")],
+        "hard": [],
+    }
+
+    bank = question_bank(candidates, size=5)
+
+    assert [question for _, question, _ in bank] == ["What is the capital of Nigeria?", "How are Lagos and Abuja related?"]
+    assert format_questions(bank) == (
+        "Question 1: What is the capital of Nigeria?\nAnswer: Abuja\n\n"
+        "Question 2: How are Lagos and Abuja related?\nAnswer: Capitals"
+    )
+
+
+def test_question_bank_without_questions_is_a_readable_error(monkeypatch):
+    client = SimpleNamespace(
+        generate=lambda **kwargs: SimpleNamespace(generations=[SimpleNamespace(text="I cannot write questions.")])
+    )
+    monkeypatch.setattr(clients, "_clients", {**clients._clients, "cohere": client})
+
+    with pytest.raises(NoQuestionsError, match="No practice questions could be generated"):
+        list(document_utils.stream_question_bank("A document no question could be written about."))
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from src.rerank import mmr, rerank
+
+ScoredVector = pytest.importorskip("pinecone.core.client.model.scored_vector").ScoredVector
+
+
+def test_mmr_drops_near_duplicates():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([[0.9, 0.1, 0.0], [0.9, 0.12, 0.0], [0.7, 0.0, 0.7]])
+
+    assert mmr(query, candidates, k=3, lambda_=0.7, duplicate_threshold=0.99) == [0, 2]
+
+
+def test_mmr_by_relevance_only_keeps_the_query_order():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[0.2, 1.0], [1.0, 0.1], [0.7, 0.7]])
+
+    assert mmr(query, candidates, k=3, lambda_=1.0) == [1, 2, 0]
+
+
+def test_rerank_accepts_pinecone_matches():
+    matches = [
+        ScoredVector(id="en-1", score=0.9, values=[1.0, 0.0], metadata={"title": "Lagos", "lang": "en"}),
+        ScoredVector(id="yo-1", score=0.89, values=[0.99, 0.01], metadata={"title": "Èkó", "lang": "yo"}),
+        ScoredVector(id="en-2", score=0.5, values=[0.6, 0.8], metadata={"title": "Kano", "lang": "en"}),
+    ]
+    reranked = rerank([1.0, 0.0], matches, k=3, duplicate_threshold=0.95)
+
+    assert reranked == [
+        {"id": "en-1", "score": 0.9, "metadata": {"title": "Lagos", "lang": "en"}},
+        {"id": "en-2", "score": 0.5, "metadata": {"title": "Kano", "lang": "en"}},
+    ]
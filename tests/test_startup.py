@@ -0,0 +1,75 @@
+import logging
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from src import startup
+from src.startup import ImportTimer, startup_report, warm_up
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_defers_the_heavy_libraries():
+    # pandas is left out, as gradio itself imports it
+    script = "import sys, app; print(sorted({'cohere', 'langchain', 'pinecone', 'pypdf'} & set(sys.modules)))"
+
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script], cwd=REPOSITORY, capture_output=True, text=True, timeout=120
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+
+def test_import_times_exclude_nested_imports(tmp_path, monkeypatch):
+    (tmp_path / "startup_outer.py").write_text(
+        textwrap.dedent(
+            """
+            import time
+            import startup_inner
+            time.sleep(0.02)
+            """
+        )
+    )
+    (tmp_path / "startup_inner.py").write_text("import time\ntime.sleep(0.1)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    timer = ImportTimer()
+    timer.install()
+    try:
+        import startup_outer  # noqa: F401
+    finally:
+        timer.uninstall()
+        sys.modules.pop("startup_outer", None)
+        sys.modules.pop("startup_inner", None)
+
+    assert timer not in sys.meta_path
+    assert timer.times["startup_inner"] >= 0.1
+    assert 0.02 <= timer.times["startup_outer"] < 0.1
+
+
+def test_modules_are_grouped_by_package_except_the_apps_own():
+    assert startup._group("langchain.llms.cohere") == "langchain"
+    assert startup._group("src.wiki_search") == "src.wiki_search"
+    assert startup._group("src") == "src"
+
+
+def test_warm_up_times_every_task_and_skips_failures(monkeypatch, caplog):
+    monkeypatch.setattr(startup, "import_timer", ImportTimer())
+    monkeypatch.setattr(startup, "init_times", {})
+    ran = []
+
+    def fail():
+        raise ConnectionError("index unreachable")
+
+    with caplog.at_level(logging.INFO, logger="src.startup"):
+        warm_up({"client": lambda: ran.append("client"), "index": fail, "cache": lambda: ran.append("cache")}).join(5)
+
+    assert ran == ["client", "cache"]
+    assert list(startup.init_times) == ["client", "index", "cache"]
+    assert "warm-up of index failed" in caplog.text
+    report = startup_report()
+    assert "warm-up:" in report and "index" in report
+    assert report in caplog.text
@@ -0,0 +1,61 @@
+from src import document_utils
+from src.document_utils import (
+    paraphrase,
+    question_answer,
+    stream_generate_questions,
+    stream_paraphrase,
+    stream_question_answer,
+)
+
+DOCUMENT = "\n\n".join(
+    f"Lagos is a city in Nigeria. It had {i} million people in {1990 + i}. Its markets sell fabric {i}."
+    for i in range(10)
+)
+
+
+def assert_growing(outputs):
+    assert len(outputs) > 1
+    assert all(later.startswith(earlier) for earlier, later in zip(outputs, outputs[1:]))
+
+
+def test_answers_stream_token_by_token_and_are_cached_once_finished(stub_services):
+    history = [["How many people live in Lagos?", None]]
+
+    outputs = list(stream_question_answer(DOCUMENT, history))
+
+    assert_growing(outputs)
+    # a question answered in full is served from the answer cache, in one piece
+    assert list(stream_question_answer(DOCUMENT, history)) == [outputs[-1]]
+    assert question_answer(DOCUMENT, history) == outputs[-1]
+
+
+def test_an_abandoned_answer_is_not_cached(stub_services):
+    history = [["Which markets are in Lagos?", None]]
+
+    answers = stream_question_answer(DOCUMENT, history)
+    first = next(answers)
+    answers.close()
+
+    assert list(stream_question_answer(DOCUMENT, history))[0] == first
+
+
+def test_paraphrase_diffs_are_refreshed_every_few_tokens(stub_services, monkeypatch):
+    monkeypatch.setattr(document_utils, "PARAPHRASE_DIFF_EVERY", 2)
+    text = "Lagos is the largest city in Nigeria and a busy port"
+
+    outputs = list(stream_paraphrase(text))
+
+    # the stand-in model answers with the words of the prompt reversed, one token per word
+    tokens = len(f"Rephrase this sentence in a different way: {text}".split())
+    assert len(outputs) == tokens // 2 + 1
+    assert outputs[-1] == paraphrase(text)
+
+
+def test_questions_stream_as_they_are_generated(stub_services, monkeypatch):
+    monkeypatch.setattr(document_utils, "QUESTION_GENERATION_MODE", "single")
+
+    outputs = list(stream_generate_questions(DOCUMENT))
+
+    assert_growing(outputs)
+    assert outputs[-1].startswith("Question 1: What is item 1?")
+    assert outputs[-1].count("Question") == 5
@@ -0,0 +1,77 @@
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import clients, document_utils
+from src.document_utils import split_for_summary, stream_summarize, summarize
+
+
+def first_sentence(text):
+    return re.split(r"(?<=\.)\s+", text.strip())[0]
+
+
+class SlowSummarizer:
+    """Summarizes a text by its first sentence after a random delay, so parallel chunks finish out of order."""
+
+    def __init__(self):
+        self.texts = []
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+
+    def summarize(self, text, **kwargs):
+        with self._lock:
+            self.texts.append(text)
+            delay = self._random.uniform(0, 0.02)
+        time.sleep(delay)
+        return SimpleNamespace(summary="Summary: " + first_sentence(text))
+
+
+@pytest.fixture
+def summarizer(stub_services, monkeypatch):
+    summarizer = SlowSummarizer()
+    monkeypatch.setattr(clients, "_clients", {**clients._clients, "cohere": summarizer})
+    monkeypatch.setattr(document_utils, "SUMMARY_CHUNK_CHARS", 300)
+    monkeypatch.setattr(document_utils, "SUMMARY_MIN_CHARS", 50)
+    return summarizer
+
+
+DOCUMENT = " ".join(f"Section {i // 4} sentence {i % 4} about topic {i * 7 % 11}." for i in range(40))
+
+
+def test_chunk_summaries_are_reduced_in_document_order(summarizer):
+    chunks = split_for_summary(DOCUMENT)
+    assert len(chunks) > 3
+
+    outputs = list(stream_summarize(DOCUMENT, "short", "paragraph"))
+
+    chunk_summaries = ["Summary: " + first_sentence(chunk) for chunk in chunks]
+    # chunk summaries are shown as they complete, always in document order
+    assert outputs[:-1] == ["\n\n".join(chunk_summaries[: i + 1]) for i in range(len(chunks))]
+    assert sorted(summarizer.texts[:-1]) == sorted(chunks)
+    assert summarizer.texts[-1] == "\n\n".join(chunk_summaries)
+    assert outputs[-1] == summarize(DOCUMENT, "short", "paragraph")
+    assert outputs[-1] == "Summary: Summary: Section 0 sentence 0 about topic 0."
+
+
+def test_editing_a_document_only_summarizes_the_changed_chunks_again(summarizer):
+    summarize(DOCUMENT, "short", "paragraph")
+    summarizer.texts.clear()
+    edited = DOCUMENT.replace("Section 5 sentence 1 about topic 4.", "Section 5 goes on differently.")
+    assert edited != DOCUMENT
+
+    summarize(edited, "short", "paragraph")
+
+    changed = set(split_for_summary(edited)) - set(split_for_summary(DOCUMENT))
+    assert 0 < len(changed) < len(split_for_summary(edited))
+    assert set(summarizer.texts[:-1]) == changed
+
+
+def test_short_documents_are_summarized_in_one_call(summarizer):
+    assert list(stream_summarize("A short note. It has two sentences.", "short", "paragraph")) == [
+        "Summary: A short note."
+    ]
+    assert summarizer.texts == ["A short note. It has two sentences."]
@@ -0,0 +1,113 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from src import telemetry
+from src.telemetry import DEFAULT_BUCKETS, Histogram, MetricsRegistry, configure_tracing, span, start_metrics_server
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(telemetry, "registry", registry)
+    return registry
+
+
+def test_histogram_buckets_include_their_upper_bound():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in [0.05, 0.1, 0.5, 1.0, 3.0]:
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 2, 1]
+    assert (histogram.count, histogram.sum) == (5, pytest.approx(4.65))
+
+
+def test_render_uses_the_prometheus_text_format(registry):
+    registry.observe("omowe_stage_duration_seconds", 0.003, stage="embed")
+    registry.observe("omowe_stage_duration_seconds", 20.0, stage="embed")
+    registry.increment("omowe_stage_cache_requests_total", stage="embed", outcome="hit")
+    registry.increment("omowe_stage_cache_requests_total", stage="embed", outcome="hit")
+    registry.register_gauge("omowe_endpoint_running", "Calls running.", lambda: {(("endpoint", "search"),): 2})
+
+    lines = registry.render().splitlines()
+
+    assert lines[:2] == [
+        "# HELP omowe_stage_duration_seconds Duration of each pipeline stage.",
+        "# TYPE omowe_stage_duration_seconds histogram",
+    ]
+    buckets = lines[2 : 3 + len(DEFAULT_BUCKETS)]
+    assert buckets[DEFAULT_BUCKETS.index(0.0025)] == 'omowe_stage_duration_seconds_bucket{stage="embed",le="0.0025"} 0'
+    assert buckets[DEFAULT_BUCKETS.index(0.005)] == 'omowe_stage_duration_seconds_bucket{stage="embed",le="0.005"} 1'
+    assert buckets[DEFAULT_BUCKETS.index(30.0)] == 'omowe_stage_duration_seconds_bucket{stage="embed",le="30.0"} 2'
+    assert buckets[-1] == 'omowe_stage_duration_seconds_bucket{stage="embed",le="+Inf"} 2'
+    assert lines[3 + len(DEFAULT_BUCKETS) :] == [
+        'omowe_stage_duration_seconds_sum{stage="embed"} 20.003',
+        'omowe_stage_duration_seconds_count{stage="embed"} 2',
+        "# HELP omowe_stage_cache_requests_total Cache lookups of each pipeline stage, by outcome.",
+        "# TYPE omowe_stage_cache_requests_total counter",
+        'omowe_stage_cache_requests_total{outcome="hit",stage="embed"} 2',
+        "# HELP omowe_endpoint_running Calls running.",
+        "# TYPE omowe_endpoint_running gauge",
+        'omowe_endpoint_running{endpoint="search"} 2',
+    ]
+
+
+def test_label_values_are_escaped(registry):
+    registry.increment("omowe_stage_errors_total", stage='say "hi"\\now')
+
+    assert 'omowe_stage_errors_total{stage="say \\"hi\\"\\\\now"} 1' in registry.render().splitlines()
+
+
+def test_spans_record_duration_payload_cache_outcome_and_errors(registry, tmp_path):
+    path = tmp_path / "trace.jsonl"
+    configure_tracing(str(path))
+    try:
+        with span("embed", payload_size=12) as record:
+            record["cache_hit"] = False
+        with pytest.raises(ValueError):
+            with span("embed", payload_size=3):
+                raise ValueError("bad input")
+    finally:
+        configure_tracing(None)
+
+    rendered = registry.render()
+    assert 'omowe_stage_duration_seconds_count{stage="embed"} 2' in rendered
+    assert 'omowe_stage_payload_chars_total{stage="embed"} 15' in rendered
+    assert 'omowe_stage_cache_requests_total{outcome="miss",stage="embed"} 1' in rendered
+    assert 'omowe_stage_errors_total{stage="embed"} 1' in rendered
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(s["span"], s["payload_size"], s.get("error")) for s in spans] == [
+        ("embed", 12, None),
+        ("embed", 3, "ValueError"),
+    ]
+
+
+def test_a_generator_closed_early_is_not_an_error(registry):
+    def stream():
+        with span("generate"):
+            yield "token"
+            yield "token"
+
+    tokens = stream()
+    next(tokens)
+    tokens.close()
+
+    assert "omowe_stage_errors_total" not in registry.render()
+
+
+def test_metrics_are_served_over_http(registry):
+    registry.increment("omowe_stage_errors_total", stage="embed")
+    server = start_metrics_server(0, host="127.0.0.1")
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode("utf-8") == registry.render()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,66 @@
+import random
+import threading
+import time
+
+import pytest
+
+from src import clients, translation
+from src.translation import prefetch, translate
+
+
+class SlowTranslator:
+    """Upper-cases text after a random delay, so parallel chunks finish out of order."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+
+    def translate(self, text, target_language="en"):
+        with self._lock:
+            self.calls.append(text)
+            delay = self._random.uniform(0, 0.02)
+        time.sleep(delay)
+        return f"{target_language}:{text.upper()}"
+
+
+@pytest.fixture
+def translator(stub_services, monkeypatch):
+    translator = SlowTranslator()
+    monkeypatch.setattr(clients, "_clients", {**clients._clients, "translator": translator})
+    monkeypatch.setattr(translation, "TRANSLATION_CHUNK_CHARS", 40)
+    return translator
+
+
+def test_chunks_are_translated_in_parallel_and_stitched_back_in_order(translator):
+    paragraphs = [" ".join(f"Sentence {p}.{s} is here." for s in range(12)) for p in range(3)]
+    text = "\n".join(paragraphs[:2]) + "\n\n" + paragraphs[2]
+
+    translated = translate(text, target_language="fr")
+
+    assert len(translator.calls) > 3
+    assert all(len(chunk) <= 40 for chunk in translator.calls)
+    expected = [
+        " ".join(f"fr:{chunk.upper()}" for chunk in translation.group_sentences(paragraph, 40))
+        for paragraph in text.split("\n")
+    ]
+    assert translated == "\n".join(expected)
+
+
+def test_translations_are_cached_per_target_language(translator):
+    text = "Eko ni ilu nla julo ni Naijiria."
+
+    assert translate(text) == translate(text) == "en:" + text.upper()
+    assert translate(text, target_language="fr") == "fr:" + text.upper()
+    assert translator.calls == [text, text]
+
+
+def test_a_prefetched_translation_is_not_requested_again(translator):
+    text = "Abuja ni olu ilu Naijiria."
+
+    prefetch([text, ""])
+    assert translate(text) == f"en:{text.upper()}"
+
+    assert translator.calls == [text]
+    prefetch([text])
+    assert translator.calls == [text]
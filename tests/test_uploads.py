@@ -0,0 +1,118 @@
+import zipfile
+
+import pytest
+
+from src.uploads import (
+    UploadIndex,
+    build_upload_index,
+    extract_pages,
+    get_upload,
+    read_docx_pages,
+    read_text_pages,
+    start_upload,
+)
+
+DOCX_TEMPLATE = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>{}</w:body></w:document>"""
+
+
+def write_docx(path, paragraphs):
+    """Writes a minimal .docx; a `None` paragraph is an explicit page break."""
+    body = "".join(
+        '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+        if text is None
+        else f"<w:p><w:r><w:t>{text[:5]}</w:t></w:r><w:r><w:t>{text[5:]}</w:t></w:r></w:p>"
+        for text in paragraphs
+    )
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", DOCX_TEMPLATE.format(body))
+
+
+def fake_embed(calls):
+    def embed_texts(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    return embed_texts
+
+
+def test_text_pages_are_cut_at_paragraphs(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("First paragraph,\nstill first.\n\nSecond.\n\n\nThird paragraph.\n\n" + "x" * 25, encoding="utf-8")
+
+    # a line without breaks is read 20 characters at a time
+    assert list(read_text_pages(str(path), page_chars=20)) == [
+        "First paragraph,\nstill first.",
+        "Second.\n\nThird paragraph.",
+        "x" * 20,
+        "x" * 5,
+    ]
+
+
+def test_docx_pages_follow_page_breaks(tmp_path):
+    path = tmp_path / "notes.docx"
+    write_docx(path, ["Chapter one.", "It begins.", None, "Chapter two.", None, None, "The end."])
+
+    assert list(read_docx_pages(str(path))) == ["Chapter one.\n\nIt begins.", "Chapter two.", "The end."]
+    assert list(extract_pages(str(path))) == list(read_docx_pages(str(path)))
+
+
+def test_unsupported_files_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="unsupported file type: .png"):
+        extract_pages(str(tmp_path / "scan.png"))
+
+
+def test_the_first_page_is_indexed_first_and_pages_count_once_fully_indexed():
+    upload = UploadIndex("book.txt")
+    progress = []
+    add = upload.add
+
+    def record_progress(chunks, vectors, pages_indexed):
+        add(chunks, vectors, pages_indexed)
+        progress.append(pages_indexed)
+
+    upload.add = record_progress
+    calls = []
+    long_page = " ".join(f"Sentence {i} is here." for i in range(300))
+
+    build_upload_index(upload, ["Page one.", long_page, "", "Page four."], fake_embed(calls), batch_size=2)
+
+    # the first page is embedded alone, then the long page's chunks two at a time
+    assert calls[0] == ["Page one."]
+    assert all(len(batch) == 2 for batch in calls[1:])
+    # page 2 only counts as indexed with its last chunk, which shares a batch with page 4
+    assert progress == [1] + [1] * (len(calls) - 2) + [4]
+    assert calls[-1][-1] == "Page four."
+    assert upload.done and upload.error is None
+    assert upload.status() == "book.txt is ready: 4 pages indexed."
+    matches = upload.index.query([1.0, 0.0], top_k=len(upload), include_metadata=True)["matches"]
+    assert sorted(match["metadata"]["page"] for match in matches) == [1] + [2] * (len(upload) - 2) + [4]
+
+
+def test_a_failing_file_reports_how_far_it_got():
+    def pages():
+        yield "Page one."
+        yield "Page two."
+        raise OSError("truncated file")
+
+    upload = UploadIndex("broken.pdf")
+    build_upload_index(upload, pages(), fake_embed([]), batch_size=10)
+
+    assert upload.done
+    assert upload.status() == "Could not read broken.pdf after 1 pages: OSError: truncated file"
+    # the first page was indexed before the error, so questions can still be answered from it
+    assert upload.wait_for_chunks(timeout=0)
+
+
+def test_start_upload_indexes_in_the_background_and_reuses_the_index(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("Lagos is on the coast.\n\nAbuja is the capital.\n", encoding="utf-8")
+    calls = []
+
+    key = start_upload(str(path), fake_embed(calls))
+    upload = get_upload(key)
+
+    assert upload.wait_for_chunks(timeout=5)
+    assert start_upload(str(path), fake_embed(calls)) == key
+    assert get_upload(key) is upload
+    assert get_upload(None) is None
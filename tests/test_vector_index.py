@@ -0,0 +1,109 @@
+import threading
+
+import numpy as np
+import pytest
+
+from src.vector_index import LocalVectorIndex
+
+
+def random_records(count, dimension=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    langs = ["en", "yo", "ig", "ha"]
+    return [(f"id-{i}", vector, {"lang": langs[i % 4], "title": f"Article {i}"}) for i, vector in enumerate(vectors)]
+
+
+def top_ids(index, vector, top_k=10, **kwargs):
+    return [match["id"] for match in index.query(vector, top_k=top_k, **kwargs)["matches"]]
+
+
+def test_exact_search_returns_the_best_dot_products_in_order():
+    records = random_records(200)
+    index = LocalVectorIndex(mode="exact")
+    index.upsert(records)
+    query = records[7][1]
+
+    vectors = np.array([vector for _, vector, _ in records])
+    expected = [f"id-{i}" for i in np.argsort(-(vectors @ query))[:5]]
+
+    assert top_ids(index, query, top_k=5) == expected
+    assert index.describe_index_stats()["mode"] == "exact"
+
+
+def test_ivf_recall_against_exact_search():
+    records = random_records(2000)
+    exact = LocalVectorIndex(mode="exact")
+    ivf = LocalVectorIndex(mode="ivf", n_probe=8)
+    exact.upsert(records)
+    ivf.upsert(records)
+    queries = [vector for _, vector, _ in random_records(50, seed=1)]
+
+    recall = np.mean([len(set(top_ids(ivf, q)) & set(top_ids(exact, q))) / 10 for q in queries])
+
+    assert ivf.describe_index_stats()["mode"] == "ivf"
+    assert recall >= 0.8
+
+
+@pytest.mark.parametrize("mode", ["exact", "ivf"])
+def test_filters_only_return_matching_records(mode):
+    records = random_records(500)
+    index = LocalVectorIndex(mode=mode)
+    index.upsert(records)
+    query = records[0][1]
+
+    for condition, allowed in [
+        ("yo", {"yo"}),
+        ({"$in": ["yo", "ig"]}, {"yo", "ig"}),
+        ({"$nin": ["en"]}, {"yo", "ig", "ha"}),
+        ({"$ne": "ha"}, {"en", "yo", "ig"}),
+    ]:
+        matches = index.query(query, top_k=20, include_metadata=True, filter={"lang": condition})["matches"]
+        assert matches
+        assert {match["metadata"]["lang"] for match in matches} <= allowed
+
+
+def test_upsert_replaces_existing_ids():
+    index = LocalVectorIndex(mode="exact")
+    index.upsert([("a", [1.0, 0.0], {"title": "old"}), ("b", [0.0, 1.0], {})])
+    index.query([1.0, 0.0])
+    index.upsert([("a", [0.0, -1.0], {"title": "new"})])
+
+    matches = index.query([0.0, -1.0], top_k=1, include_metadata=True)["matches"]
+
+    assert len(index) == 2
+    assert matches == [{"id": "a", "score": 1.0, "metadata": {"title": "new"}}]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    records = random_records(300)
+    index = LocalVectorIndex(mode="exact")
+    index.upsert(records)
+    path = str(tmp_path / "index.npz")
+
+    index.save(path)
+    loaded = LocalVectorIndex.load(path, mode="exact")
+
+    assert len(loaded) == len(index)
+    np.testing.assert_array_equal(loaded.vectors, index.vectors)
+    query = records[3][1]
+    assert loaded.query(query, top_k=5, include_metadata=True) == index.query(query, top_k=5, include_metadata=True)
+
+
+def test_an_upsert_during_a_query_does_not_mix_up_rows(monkeypatch):
+    index = LocalVectorIndex(mode="exact")
+    index.upsert([("a", [1.0, 0.0], {"lang": "yo"}), ("b", [0.0, 1.0], {"lang": "en"})])
+    candidate_rows = index._candidate_rows
+
+    def upsert_meanwhile(*args):
+        # another thread's upsert lands between the query's reads of the index
+        writer = threading.Thread(target=index.upsert, args=([("c", [0.0, 5.0], {"lang": "yo"})],))
+        writer.start()
+        writer.join()
+        return candidate_rows(*args)
+
+    monkeypatch.setattr(index, "_candidate_rows", upsert_meanwhile)
+    matches = index.query([0.0, 1.0], top_k=3, include_metadata=True, filter={"lang": "yo"})["matches"]
+
+    assert matches == [{"id": "a", "score": 0.0, "metadata": {"lang": "yo"}}]
+    assert [match["id"] for match in index.query([0.0, 1.0], top_k=1)["matches"]] == ["c"]
@@ -0,0 +1,52 @@
+import pytest
+
+from src import clients, wiki_search
+from src.wiki_search import SearchResult, cross_lingual_document_search, document_source, search
+
+
+@pytest.fixture
+def index_queries(stub_services, monkeypatch):
+    """Records the filters of the queries that reach the wiki index."""
+    index = clients._clients["wiki_index"]
+    query = index.query
+    filters = []
+
+    def counted_query(**kwargs):
+        filters.append(kwargs["filter"])
+        return query(**kwargs)
+
+    monkeypatch.setattr(index, "query", counted_query)
+    return filters
+
+
+def test_search_returns_structured_results(index_queries):
+    results = search("Lagos history", num_results=3, languages=["Yoruba"])
+
+    assert len(results) == 3
+    assert all(isinstance(result, SearchResult) for result in results)
+    assert {result.lang for result in results} == {"yo"}
+    assert all(result.url.startswith("https://yo.wikipedia.org/") for result in results)
+    assert [result.score for result in results] == sorted((result.score for result in results), reverse=True)
+    assert index_queries == [{"lang": {"$in": ["yo"]}}]
+
+
+def test_one_retrieval_serves_the_results_their_sources_and_repeated_queries(index_queries):
+    texts = cross_lingual_document_search("Lagos history", 2, ["Yoruba", "Hausa"], False)
+    sources = document_source("  lagos   HISTORY ", 2, ["Hausa", "Yoruba"], False)
+
+    assert len(index_queries) == 1
+    results = search("Lagos history", 2, ["Yoruba", "Hausa"])
+    assert texts == [f"{r.title}\n{r.text}" for r in results] + [f"{r.url}\n\n" for r in results]
+    assert sources == [result.url for result in results]
+    assert search("Lagos history", 2, ["Yoruba", "Hausa"]) is results
+
+
+def test_other_search_settings_are_separate_retrievals(index_queries):
+    search("Lagos history", 2, ["Yoruba"])
+    search("Lagos history", 3, ["Yoruba"])
+    search("Lagos history", 2, [])
+    search("Lagos history", 2, ["Yoruba"], text_match=True)
+
+    assert len(wiki_search.search_results) == 4
+    assert index_queries[:3] == [{"lang": {"$in": ["yo"]}}, {"lang": {"$in": ["yo"]}}, None]
+